@@ -159,7 +159,7 @@ class SpectraFtCV(SpectraCv):
         return self.dump_dir is not None and self.job_name is not None
 
     def oper_prepare(self, omega):
-        identity = Mpo.identity(self.model).scale(omega)
+        identity = self.identity_mpo.scale(omega)
         self.a_oper = identity.add(self.h_mpo.scale(-1, inplace=False))
 
     def optimize_cv(self, lr_group, isite, percent=0):
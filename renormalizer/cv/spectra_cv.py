@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 # Author: Tong Jiang <tongjiang1000@gmail.com>
 # correction vector base
+import os
+
 import numpy as np
 from multiprocessing import Pool
 import multiprocessing
 from renormalizer.mps import Mpo
 from renormalizer.utils import Quantity, CompressCriteria, CompressConfig
+from renormalizer.utils.trajectory import atomic_save
 from renormalizer.utils.elementop import construct_e_op_dict, ph_op_matrix
 import importlib.util
 import logging
@@ -14,39 +17,89 @@ from typing import List
 
 logger = logging.getLogger(__name__)
 
-def batch_run(freq_reg, cores, obj, filename=None):
+_cv_obj = None
+
+
+def _init_worker(obj):
+    # the shared pieces (b vector, Hamiltonian, initial guess) are passed to each
+    # worker once. With the ``fork`` start method they are not even pickled.
+    global _cv_obj
+    _cv_obj = obj
+
+
+def _solve_chunk(chunk):
+    # frequencies in a chunk are sorted, so each point is warm started from
+    # the converged correction vector of its neighbour
+    return [(i, _cv_obj.cv_solve(omega)) for i, omega in chunk]
+
+
+def _checkpoint_path(filename):
+    if filename.endswith(".npy"):
+        return filename
+    return filename + ".npy"
+
+
+def batch_run(freq_reg, cores, obj, filename=None, chunk_size=None):
     """
     batch run of cv calculation
     freq_reg: list object, frequecny windown
     cores: number of cores to be used in multiprocessing calculation
     obj: SpectraZtCV or SpectraFtCV
+    filename: the file to checkpoint the results. Frequency points not yet
+        calculated are saved as ``nan``. If the file already exists, the
+        finished points are loaded and skipped.
+    chunk_size: number of neighbouring frequency points solved in sequence
+        by a worker. Within a chunk each point starts from the converged
+        correction vector of the previous one. Defaults to spread the
+        frequencies in 4 chunks per core.
+
+    The frequencies are solved in ascending order and the results are
+    returned in the order of ``freq_reg``.
     """
     logger.info(f"{len(freq_reg)} total frequency points to do")
-    spectra = []
+    assert cores >= 1
     obj.batch_run = True
 
+    spectra = np.full(len(freq_reg), np.nan)
+    if filename is not None and os.path.exists(_checkpoint_path(filename)):
+        try:
+            previous = np.load(_checkpoint_path(filename))
+        except Exception:
+            logger.warning(f"Failed to load the results in {filename}. Starting from scratch", exc_info=True)
+        else:
+            if previous.shape == spectra.shape:
+                spectra = previous.astype(float)
+                logger.info(f"{np.sum(~np.isnan(spectra))} frequency points loaded from {filename}")
+            else:
+                logger.warning(f"Shape of the results in {filename} does not match. Starting from scratch")
+
+    todo = [(i, freq_reg[i]) for i in np.argsort(freq_reg) if np.isnan(spectra[i])]
+    if chunk_size is None:
+        chunk_size = max(1, int(np.ceil(len(todo) / (4 * cores))))
+    chunks = [todo[i:i+chunk_size] for i in range(0, len(todo), chunk_size)]
+
+    def checkpoint(results):
+        for i, res in results:
+            spectra[i] = res
+        if filename is not None:
+            # write to a temporary file first in case the job is killed during writing
+            atomic_save(_checkpoint_path(filename), lambda f: np.save(f, spectra))
+
     if cores > 1:
         # multiprocessing
         if importlib.util.find_spec("cupy"):
             multiprocessing.set_start_method('forkserver', force=True)
-        pool = Pool(processes=cores)
         logger.info(f"{cores} multiprocess parallelization activated")
-        for i_spec in pool.imap(obj.cv_solve, freq_reg):
-            spectra.append(i_spec)
-            if filename is not None:
-                np.save(f"{filename}", spectra)
-        pool.close()
-        pool.join()
-    elif cores == 1:
-        # single process
-        for omega in freq_reg:
-            spectra.append(obj.cv_solve(omega))
-            if filename is not None:
-                np.save(f"{filename}", spectra)
+        with Pool(processes=cores, initializer=_init_worker, initargs=(obj,)) as pool:
+            for results in pool.imap_unordered(_solve_chunk, chunks):
+                checkpoint(results)
     else:
-        assert False
+        # single process. The object is reused and the frequencies are
+        # warm started across the chunks
+        for chunk in chunks:
+            checkpoint([(i, obj.cv_solve(omega)) for i, omega in chunk])
 
-    return spectra
+    return spectra.tolist()
 
 
 class SpectraCv(object):
@@ -78,6 +131,8 @@ class SpectraCv(object):
             self.h_mpo = Mpo(model)
         else:
             self.h_mpo = h_mpo
+        # shifted by the frequency in ``oper_prepare``. Built once and shared by all the frequencies
+        self.identity_mpo = Mpo.identity(model)
 
         assert method in ["1site", "2site"]
         self.method = method
@@ -46,3 +46,26 @@ def test_ft_abs(model):
                           10, 5.e-3, T, h_mpo, rtol=1e-3)
     result = batch_run(test_freq, 1, spectra)
     assert np.allclose(result, standard_value, rtol=1.e-2)
+
+
+def test_batch_run_checkpoint(tmp_path):
+    freq_reg = [0.09, 0.085, 0.095]
+    spectra = SpectraZtCV(holstein_model, "abs", 10, 5.e-3, rtol=1e-3)
+    fname = str(tmp_path / "spectra")
+    result = batch_run(freq_reg, 1, spectra, filename=fname, chunk_size=2)
+    assert np.allclose(np.load(fname + ".npy"), result)
+    # finished points are loaded and not recalculated
+    partial = np.array(result)
+    partial[1] = np.nan
+    np.save(fname, partial)
+    spectra.cv_solve = lambda omega: 0.
+    result2 = batch_run(freq_reg, 1, spectra, filename=fname)
+    assert np.allclose(result2, [result[0], 0, result[2]])
+    # a truncated checkpoint is discarded
+    with open(fname + ".npy", "rb") as f:
+        data = f.read()
+    with open(fname + ".npy", "wb") as f:
+        f.write(data[:len(data) // 2])
+    result3 = batch_run(freq_reg, 1, spectra, filename=fname)
+    assert np.allclose(result3, 0)
+    assert not os.path.exists(fname + ".npy.tmp")
@@ -122,7 +122,7 @@ class SpectraZtCV(SpectraCv):
 
     def oper_prepare(self, omega):
         # set up a_oper = (H_0 - e0 - omega)
-        identity = Mpo.identity(self.model).scale(-self.e0 - omega)
+        identity = self.identity_mpo.scale(-self.e0 - omega)
         self.a_oper = self.h_mpo.add(identity)
     
     def optimize_cv(self, lr_group, isite, percent=0.0):
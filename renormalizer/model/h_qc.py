@@ -69,6 +69,26 @@ def int_to_h(h, eri):
     return sh, aseri
 
 
+def permute_integrals(sh, aseri, ordering):
+    """
+    permute the spin-orbital integrals returned by ``read_fcidump`` or ``int_to_h``
+    so that the new orbital ``i`` is the original orbital ``ordering[i]``.
+    The model constructed by ``qc_model`` from the permuted integrals has
+    the Jordan-Wigner strings along the new ordering.
+    For ``conserve_qn=True``, the even/odd (alpha/beta) spin orbitals should be permuted in pairs.
+    """
+    ordering = np.array(ordering)
+    nsorb = len(sh)
+    assert sorted(ordering) == list(range(nsorb))
+    new_sh = sh[np.ix_(ordering, ordering)]
+    # recover the full antisymmetric 2-e integral. aseri only has p<q and r<s elements
+    full = aseri - aseri.transpose(1, 0, 2, 3) - aseri.transpose(0, 1, 3, 2) + aseri.transpose(1, 0, 3, 2)
+    full = full[np.ix_(ordering, ordering, ordering, ordering)]
+    mask = np.triu(np.ones((nsorb, nsorb), dtype=bool), k=1)
+    new_aseri = full * mask[:, :, None, None] * mask[None, None, :, :]
+    return new_sh, new_aseri
+
+
 def generate_ladder_operator(norbs):
     # construct electronic creation/annihilation operators by Jordan-Wigner transformation
     a_ops = []
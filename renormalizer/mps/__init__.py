@@ -1,6 +1,6 @@
 from renormalizer.mps.backend import backend
 from renormalizer.mps.mpo import Mpo, StackedMpo
-from renormalizer.mps.mps import Mps, BraKetPair
+from renormalizer.mps.mps import Mps, BraKetPair, ExpectationPlan
 from renormalizer.mps.mpdm import MpDm
 from renormalizer.mps.thermalprop import ThermalProp, load_thermal_state
 from renormalizer.mps.gs import optimize_mps, DmrgFCISolver
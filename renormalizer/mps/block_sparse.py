@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Block-sparse tensors keyed by the quantum numbers of each leg.
+
+With a conserved quantity (such as the exciton number in the Holstein model)
+the elements of the active site tensor are non-zero only if the quantum numbers
+of all of its legs add up to ``mp.qntot``. The dense representation used by
+:class:`~renormalizer.mps.matrix.Matrix` keeps all of the symmetry-forbidden
+elements and the contractions in ``hop_expr`` touch all of them.
+:class:`BlockSparseTensor` stores only the allowed blocks and
+:class:`BlockSparseHop` applies the effective Hamiltonian block by block,
+skipping pairs of blocks connected by vanishing environment or MPO slices.
+
+The site tensors, the environments and :mod:`~renormalizer.mps.svd_qn` work with
+dense arrays, so :func:`~renormalizer.mps.hop_expr.hop_expr` does not dispatch to
+:class:`BlockSparseHop`: converting the dense tensors to blocks at every matrix-vector
+product costs more than the skipped blocks save.
+"""
+
+import logging
+from itertools import product
+from typing import Dict, List, Tuple
+
+import opt_einsum as oe
+
+from renormalizer.mps.backend import np, xp, OE_BACKEND
+from renormalizer.mps.matrix import asxp
+from renormalizer.mps.hop_expr import _cached_expression
+
+logger = logging.getLogger(__name__)
+
+
+def get_sectors(qn: np.ndarray) -> List[Tuple[Tuple, np.ndarray]]:
+    """
+    Group the indices of a leg by their quantum numbers.
+
+    Parameters
+    ----------
+    qn : np.ndarray
+        Quantum numbers of the leg with shape ``(dim, qn_size)``.
+
+    Returns
+    -------
+    sectors : list
+        A list of ``(qn, indices)`` tuples sorted by ``qn``.
+    """
+    qn = np.asarray(qn)
+    assert qn.ndim == 2
+    sectors = {}
+    for i, q in enumerate(map(tuple, qn)):
+        sectors.setdefault(q, []).append(i)
+    return [(q, np.array(sectors[q])) for q in sorted(sectors)]
+
+
+def get_allowed_keys(sectors: List[List[Tuple[Tuple, np.ndarray]]], qntot) -> List[Tuple]:
+    """
+    Enumerate the combinations of sectors (one for each leg) whose quantum numbers
+    add up to ``qntot``.
+    """
+    qntot = np.asarray(qntot)
+    keys = []
+    for key in product(*[range(len(leg)) for leg in sectors]):
+        qn_sum = sum(np.array(sectors[ileg][isec][0]) for ileg, isec in enumerate(key))
+        if np.all(qn_sum == qntot):
+            keys.append(key)
+    return keys
+
+
+class BlockSparseTensor:
+    r"""
+    A tensor that stores only the symmetry-allowed blocks.
+
+    Parameters
+    ----------
+    blocks : dict
+        Maps a tuple of sector indices (one for each leg) to the dense block.
+    sectors : list
+        The sectors of each leg, as returned by :func:`get_sectors`.
+    qntot : np.ndarray
+        The total quantum number of the tensor.
+    """
+
+    def __init__(self, blocks: Dict[Tuple, np.ndarray], sectors: List, qntot):
+        self.blocks = blocks
+        self.sectors = sectors
+        self.qntot = np.asarray(qntot)
+
+    @classmethod
+    def from_dense(cls, array, qn_list=None, qntot=None, sectors=None, keys=None):
+        """
+        Construct the block-sparse tensor from a dense tensor.
+        Elements outside of the allowed blocks are discarded.
+
+        Parameters
+        ----------
+        array : np.ndarray
+            The dense tensor.
+        qn_list : list of np.ndarray
+            Quantum numbers of each leg. Not necessary if ``sectors`` is provided.
+        qntot : np.ndarray
+            The total quantum number.
+        sectors : list, optional
+            Precomputed sectors of each leg.
+        keys : list, optional
+            Precomputed allowed keys.
+        """
+        if sectors is None:
+            sectors = [get_sectors(qn) for qn in qn_list]
+        assert len(sectors) == array.ndim
+        if keys is None:
+            keys = get_allowed_keys(sectors, qntot)
+        blocks = {}
+        for key in keys:
+            idx = [sectors[ileg][isec][1] for ileg, isec in enumerate(key)]
+            blocks[key] = array[xp.ix_(*idx)] if isinstance(array, xp.ndarray) else array[np.ix_(*idx)]
+        return cls(blocks, sectors, qntot)
+
+    @property
+    def shape(self) -> Tuple[int]:
+        return tuple(sum(len(s[1]) for s in leg) for leg in self.sectors)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.sectors)
+
+    @property
+    def dtype(self):
+        return np.result_type(*[b.dtype for b in self.blocks.values()])
+
+    @property
+    def nnz(self) -> int:
+        """
+        Number of elements stored in the blocks.
+        """
+        return sum(b.size for b in self.blocks.values())
+
+    @property
+    def density(self) -> float:
+        """
+        Ratio between the stored elements and the elements of the dense tensor.
+        """
+        return self.nnz / np.prod(self.shape)
+
+    def todense(self, xp_array=False):
+        array_module = xp if xp_array else np
+        res = array_module.zeros(self.shape, dtype=self.dtype)
+        for key, block in self.blocks.items():
+            idx = [self.sectors[ileg][isec][1] for ileg, isec in enumerate(key)]
+            if array_module is np and not isinstance(block, np.ndarray):
+                block = xp.asnumpy(block)
+            res[array_module.ix_(*idx)] = block
+        return res
+
+    def conj(self):
+        return self.__class__({k: b.conj() for k, b in self.blocks.items()}, self.sectors, self.qntot)
+
+    def norm(self) -> float:
+        return float(np.sqrt(sum(float(xp.linalg.norm(b)) ** 2 for b in self.blocks.values())))
+
+    def __repr__(self):
+        return f"BlockSparseTensor(shape={self.shape}, nblocks={len(self.blocks)}, density={self.density:.3f})"
+
+
+class BlockSparseHop:
+    r"""
+    Block-sparse application of the effective Hamiltonian for
+    the 1-site and 2-site algorithms. Has the same calling convention
+    as the expression returned by :func:`~renormalizer.mps.hop_expr.hop_expr`,
+    i.e. accepts and returns dense tensors.
+
+    Parameters
+    ----------
+    ltensor : xp.ndarray
+        The left environment.
+    rtensor : xp.ndarray
+        The right environment.
+    cmo : list of xp.ndarray
+        The MPO of the active sites.
+    qn_list : list of np.ndarray
+        Quantum numbers of each leg of the active site tensor.
+        See :meth:`~renormalizer.mps.mp.MatrixProduct._get_qn_list`.
+    qntot : np.ndarray
+        The total quantum number.
+    """
+
+    def __init__(self, ltensor, rtensor, cmo, qn_list, qntot):
+        nsite = len(cmo)
+        assert nsite in [1, 2]
+        assert len(qn_list) == nsite + 2
+        ltensor = asxp(ltensor)
+        rtensor = asxp(rtensor)
+        cmo = [asxp(mo) for mo in cmo]
+        if nsite == 1:
+            subscripts = "abc, bdef, lfk, cek -> adl"
+        else:
+            subscripts = "abc, bdef, fghj, ljk, cehk -> adgl"
+
+        self.sectors = [get_sectors(qn) for qn in qn_list]
+        self.keys = get_allowed_keys(self.sectors, qntot)
+        self.qntot = np.asarray(qntot)
+        self.shape = tuple(len(qn) for qn in qn_list)
+
+        def indices(ileg, isec):
+            return asxp(self.sectors[ileg][isec][1])
+
+        slice_cache = {}
+
+        def get_slice(name, tensor, ileg, isec_out, isec_in):
+            # the slices are shared by many pairs of blocks
+            cache_key = (name, isec_out, isec_in)
+            if cache_key not in slice_cache:
+                idx_out, idx_in = indices(ileg, isec_out), indices(ileg, isec_in)
+                if name in ["L", "R"]:
+                    s = tensor[idx_out][:, :, idx_in]
+                else:
+                    s = tensor[:, idx_out][:, :, idx_in]
+                if not xp.any(s):
+                    s = None
+                slice_cache[cache_key] = s
+            return slice_cache[cache_key]
+
+        # all pairs of the output and input block with non-vanishing operator slices
+        self.tasks: List[Tuple[Tuple, Tuple, "oe.contract.ContractExpression"]] = []
+        for key_out, key_in in product(self.keys, self.keys):
+            operands = [get_slice("L", ltensor, 0, key_out[0], key_in[0])]
+            for i in range(nsite):
+                operands.append(get_slice(f"W{i}", cmo[i], i+1, key_out[i+1], key_in[i+1]))
+            operands.append(get_slice("R", rtensor, nsite+1, key_out[-1], key_in[-1]))
+            if any(o is None for o in operands):
+                continue
+            block_shape = tuple(len(self.sectors[ileg][isec][1]) for ileg, isec in enumerate(key_in))
+            # the path only depends on the shapes of the blocks and is shared with the dense hops
+            expr = _cached_expression(subscripts, operands, block_shape)
+            self.tasks.append((key_out, key_in, expr))
+
+        n_total = len(self.keys) ** 2
+        logger.debug(f"block sparse hop: {len(self.tasks)} of {n_total} block pairs are contracted")
+
+    def __call__(self, cstruct):
+        input_block_sparse = isinstance(cstruct, BlockSparseTensor)
+        if input_block_sparse:
+            c = cstruct
+        else:
+            c = BlockSparseTensor.from_dense(asxp(cstruct), sectors=self.sectors, keys=self.keys)
+        out_blocks = {}
+        for key_out, key_in, expr in self.tasks:
+            res = expr(c.blocks[key_in], backend=OE_BACKEND)
+            if key_out in out_blocks:
+                out_blocks[key_out] += res
+            else:
+                out_blocks[key_out] = res
+        out = BlockSparseTensor(out_blocks, self.sectors, self.qntot)
+        if input_block_sparse:
+            return out
+        if len(out_blocks) == 0:
+            return xp.zeros(self.shape, dtype=cstruct.dtype)
+        return out.todense(xp_array=True)
@@ -23,6 +23,7 @@ from renormalizer.mps.backend import xp, OE_BACKEND, primme, IMPORT_PRIMME_EXCEP
 from renormalizer.mps.matrix import multi_tensor_contract, tensordot, asnumpy, asxp
 from renormalizer.mps.hop_expr import  hop_expr
 from renormalizer.mps.svd_qn import get_qn_mask
+from renormalizer.mps.sparse_mpo import SparseMo
 from renormalizer.mps import Mpo, Mps, StackedMpo
 from renormalizer.mps.lib import Environ, cvec2cmat
 from renormalizer.utils import Quantity, CompressConfig, CompressCriteria
@@ -108,20 +109,25 @@ def optimize_mps(mps: Mps, mpo: Union[Mpo, StackedMpo], omega: float = None) ->
             raise NotImplementedError("StackedMPO + omega is not implemented yet")
         identity = Mpo.identity(mpo.model)
         mpo = mpo.add(identity.scale(-omega))
-        environ = Environ(mps, [mpo, mpo], env)
-    else:
-        if isinstance(mpo, StackedMpo):
-            environ = [Environ(mps, item, env) for item in mpo.mpos]
-        else:
-            environ = Environ(mps, mpo, env)
+    environ = _construct_environ(mps, mpo, omega, env)
+
+    # mixed-precision sweeps. The MPO in each precision
+    # and the precision of the current sweep
+    mpo_precision = {"fp64": mpo}
+    current_precision = "fp64"
+    dtype_bk = mps.dtype
 
     macro_iteration_result = []
+    macro_iteration_precision = []
     # Idx of the active site with lowest energy for each sweep
     # determines the index of active site of the returned mps
     opt_e_idx: int = None
     res_mps: Union[Mps, List[Mps]] = None
-    for isweep, (compress_config, percent) in enumerate(mps.optimize_config.procedure):
+    for isweep, (compress_config, percent, *precision) in enumerate(mps.optimize_config.procedure):
         logger.debug(f"isweep: {isweep}")
+        precision = precision[0] if precision else "fp64"
+        if precision not in ["fp32", "fp64"]:
+            raise ValueError(f"Unknown precision in the procedure: {precision}")
 
         if isinstance(compress_config, CompressConfig):
             mps.compress_config = compress_config
@@ -132,20 +138,33 @@ def optimize_mps(mps: Mps, mpo: Union[Mpo, StackedMpo], omega: float = None) ->
             assert False
         logger.debug(f"compress config in current loop: {compress_config}, percent: {percent}")
 
+        if precision == "fp32" and mps.compress_config.ofs is not None:
+            raise NotImplementedError("OFS with single precision sweeps is not implemented yet")
+        if precision != current_precision:
+            logger.debug(f"switch to {precision} sweeps")
+            if precision not in mpo_precision:
+                mpo_precision[precision] = _mpo_astype(mpo, precision)
+            mpo = mpo_precision[precision]
+            mps = mps.astype(precision if precision == "fp32" else dtype_bk)
+            environ = _construct_environ(mps, mpo, omega, "R" if mps.to_right else "L")
+            current_precision = precision
+
         logger.debug(f"{mps}")
 
         micro_iteration_result, res_mps, mpo = single_sweep(mps, mpo, environ, omega, percent, opt_e_idx)
 
         opt_e = min(micro_iteration_result)
         macro_iteration_result.append(opt_e[0])
+        macro_iteration_precision.append(precision)
         opt_e_idx = opt_e[1]
 
         logger.debug(
             f"{isweep+1} sweeps are finished, lowest energy = {min(macro_iteration_result)}"
         )
-        # check if convergence
-        if isweep > 0 and percent == 0:
-            v1, v2 = sorted(macro_iteration_result)[:2]
+        # check if convergence. Only the double precision sweeps are considered
+        e_fp64 = [e for e, p in zip(macro_iteration_result, macro_iteration_precision) if p == "fp64"]
+        if len(e_fp64) > 1 and percent == 0 and precision == "fp64":
+            v1, v2 = sorted(e_fp64)[:2]
             if np.allclose(
                 v1, v2, rtol=mps.optimize_config.e_rtol, atol=mps.optimize_config.e_atol
             ):
@@ -156,6 +175,12 @@ def optimize_mps(mps: Mps, mpo: Union[Mpo, StackedMpo], omega: float = None) ->
         logger.info(f"The lowest two energies: {sorted(macro_iteration_result)[:2]}.")
 
     assert res_mps is not None
+    if current_precision != "fp64":
+        logger.warning("The last sweep is not in double precision")
+        if isinstance(res_mps, list):
+            res_mps = [mp.astype(dtype_bk) for mp in res_mps]
+        else:
+            res_mps = res_mps.astype(dtype_bk)
     # remove the redundant basis near the edge
     # and restore the original compress_config of the input mps
     if mps.optimize_config.nroots == 1:
@@ -171,6 +196,20 @@ def optimize_mps(mps: Mps, mpo: Union[Mpo, StackedMpo], omega: float = None) ->
     return macro_iteration_result, res_mps
 
 
+def _construct_environ(mps: Mps, mpo: Union[Mpo, StackedMpo], omega: float, env: str):
+    if omega is not None:
+        return Environ(mps, [mpo, mpo], env)
+    if isinstance(mpo, StackedMpo):
+        return [Environ(mps, item, env) for item in mpo.mpos]
+    return Environ(mps, mpo, env)
+
+
+def _mpo_astype(mpo: Union[Mpo, StackedMpo], precision: str):
+    if isinstance(mpo, StackedMpo):
+        return StackedMpo([item.astype(precision) for item in mpo.mpos])
+    return mpo.astype(precision)
+
+
 def single_sweep(
     mps: Mps,
     mpo: Union[Mpo, StackedMpo],
@@ -182,6 +221,10 @@ def single_sweep(
 
     method = mps.optimize_config.method
     nroots = mps.optimize_config.nroots
+    # the subspace expansion is only performed in the sweeps with nonzero percent
+    expansion_alpha = mps.optimize_config.expansion_alpha if percent != 0 else 0
+    if expansion_alpha != 0 and omega is not None:
+        raise NotImplementedError("Subspace expansion with omega is not implemented yet")
 
     # in state-averaged calculation, contains C of each state for better initial guess
     averaged_ms = []
@@ -231,6 +274,13 @@ def single_sweep(
             ltensor = environ.GetLR("L", lidx, mps, operator, itensor=None, method=lmethod)
             rtensor = environ.GetLR("R", ridx, mps, operator, itensor=None, method=rmethod)
 
+        # load the environment of the next site in advance if it is on the disk
+        for environ_item in (environ if isinstance(environ, list) else [environ]):
+            if mps.to_right:
+                environ_item.prefetch("R", ridx + 1)
+            else:
+                environ_item.prefetch("L", lidx - 1)
+
         # get the quantum number pattern
         qnbigl, qnbigr, qnmat = mps._get_big_qn(cidx)
         qn_mask = get_qn_mask(qnmat, mps.qntot)
@@ -274,7 +324,13 @@ def single_sweep(
             cguess.extend(
                 [np.random.rand(guess_dim) - 0.5 for i in range(len(cguess), nroots)]
             )
-            e, c = eigh_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega, cguess)
+            if omega is not None:
+                sparse_mo = None
+            elif isinstance(mpo, StackedMpo):
+                sparse_mo = [mpo_item.get_sparse_mo(cidx) for mpo_item in mpo.mpos]
+            else:
+                sparse_mo = mpo.get_sparse_mo(cidx)
+            e, c = eigh_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega, cguess, sparse_mo)
 
         # if multi roots, both davidson and primme return np.ndarray
         if nroots > 1:
@@ -296,7 +352,14 @@ def single_sweep(
                         cstruct[iroot], cidx, qnbigl, qnbigr, percent
                     )
 
-        averaged_ms = mps._update_mps(cstruct, cidx, qnbigl, qnbigr, percent)
+        at_edge = (mps.to_right and imps == mps.site_num - 1) or ((not mps.to_right) and imps == 0)
+        if method == "1site" and expansion_alpha != 0 and not at_edge:
+            ddm_perturbation = subspace_expansion_ddm(
+                mps.to_right, ltensor, rtensor, cmo, cstruct, expansion_alpha
+            )
+        else:
+            ddm_perturbation = None
+        averaged_ms = mps._update_mps(cstruct, cidx, qnbigl, qnbigr, percent, ddm_perturbation)
         if mps.compress_config.ofs is not None:
             mpo.try_swap_site(mps.model, mps.compress_config.ofs_swap_jw)
 
@@ -304,6 +367,75 @@ def single_sweep(
     return micro_iteration_result, res_mps, mpo
 
 
+def subspace_expansion_ddm(
+    to_right: bool,
+    ltensor: Union[xp.ndarray, List[xp.ndarray]],
+    rtensor: Union[xp.ndarray, List[xp.ndarray]],
+    cmo: Union[List[xp.ndarray], List[List[xp.ndarray]]],
+    cstruct: Union[np.ndarray, List[np.ndarray]],
+    alpha: float,
+):
+    r""" The perturbation to the reduced density matrix in the single-site DMRG with
+    subspace expansion (DMRG3S, Phys. Rev. B 91, 155115 (2015)).
+
+    The perturbation term :math:`P = \hat L \hat W C` (:math:`P = \hat W \hat R C` if sweeping to the left)
+    is the active site tensor contracted with the environment and the MPO of the system side, with the
+    MPO bond left open. Expanding the active site tensor to :math:`[C, \sqrt{\alpha} P]` and
+    padding the next site with zeros, as in the original algorithm,
+    yields the same renormalized basis as the eigenvectors of
+    :math:`\rho = C C^\dagger + \alpha P P^\dagger`. Only the second term is returned.
+    The perturbation is normalized so that the trace of the returned matrix is ``alpha``.
+
+    Parameters
+    ----------
+    to_right : bool
+        The direction of the sweep.
+    ltensor, rtensor : xp.ndarray or list of xp.ndarray
+        The environments of the active site. A list for :class:`~renormalizer.mps.StackedMpo`.
+    cmo : list
+        The MPO of the active site. A list of lists for :class:`~renormalizer.mps.StackedMpo`.
+    cstruct : np.ndarray or list of np.ndarray
+        The optimized active site tensor. A list for the state-averaged algorithm.
+    alpha : float
+        The mixing factor.
+
+    Returns
+    -------
+    ddm : np.ndarray
+        The perturbation to the reduced density matrix of the super-L-block
+        (super-R-block if ``to_right`` is ``False``).
+    """
+    if not isinstance(ltensor, list):
+        ltensor, rtensor, cmo = [ltensor], [rtensor], [cmo]
+    if not isinstance(cstruct, list):
+        cstruct = [cstruct]
+    ddm = 0
+    norm2 = 0
+    for ltensor_item, rtensor_item, cmo_item in zip(ltensor, rtensor, cmo):
+        for c in cstruct:
+            c = asxp(c)
+            if to_right:
+                # S-a
+                #     d
+                # O-b-O-f
+                #     e
+                # S-c---S-k
+                p = oe.contract("abc, bdef, cek -> adfk", ltensor_item, cmo_item[0], c, backend=OE_BACKEND)
+                ddm += oe.contract("adfk, ADfk -> adAD", p, p.conj(), backend=OE_BACKEND)
+            else:
+                #       l-S
+                #     d
+                #   b-O-f-O
+                #     e
+                # c-S---S-k
+                p = oe.contract("bdef, lfk, cek -> bcdl", cmo_item[0], rtensor_item, c, backend=OE_BACKEND)
+                ddm += oe.contract("bcdl, bcDL -> dlDL", p, p.conj(), backend=OE_BACKEND)
+            norm2 += xp.linalg.norm(p) ** 2
+    if norm2 == 0:
+        return None
+    return asnumpy(ddm) * (alpha / float(norm2))
+
+
 def get_ham_direct(
     mps: Mps,
     qn_mask: np.ndarray,
@@ -414,6 +546,7 @@ def get_ham_iterative(
     rtensor: Union[xp.ndarray, List[xp.ndarray]],
     cmo: List[xp.ndarray],
     omega: float,
+    sparse_mo: List[SparseMo] = None,
 ):
     # iterative algorithm
     method = mps.optimize_config.method
@@ -473,7 +606,7 @@ def get_ham_iterative(
 
     # contraction expression
     cshape = qn_mask.shape
-    expr = hop_expr(ltensor, rtensor, cmo, cshape, omega is not None)
+    expr = hop_expr(ltensor, rtensor, cmo, cshape, omega is not None, sparse_mo)
     return hdiag, expr
 
 
@@ -491,23 +624,32 @@ def eigh_iterative(
     cmo: List[xp.ndarray],
     omega: float,
     cguess: List[np.ndarray],
+    sparse_mo: Union[List[SparseMo], List[List[SparseMo]]] = None,
 ):
     # iterative algorithm
     inverse = mps.optimize_config.inverse
     if isinstance(ltensor, list):
         assert isinstance(rtensor, list)
         assert len(ltensor) == len(rtensor)
-        ham = [get_ham_iterative(mps, qn_mask, ltensor_item, rtensor_item, cmo_item, omega) for ltensor_item, rtensor_item, cmo_item in zip(ltensor, rtensor, cmo)]
+        if sparse_mo is None:
+            sparse_mo = [None] * len(ltensor)
+        ham = [get_ham_iterative(mps, qn_mask, ltensor_item, rtensor_item, cmo_item, omega, sparse_mo_item)
+               for ltensor_item, rtensor_item, cmo_item, sparse_mo_item in zip(ltensor, rtensor, cmo, sparse_mo)]
         hdiag = sum([hdiag_item for hdiag_item, expr_item in ham])
         expr = func_sum([expr_item for hdiag_item, expr_item in ham])
     else:
-        hdiag, expr = get_ham_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega)
+        hdiag, expr = get_ham_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega, sparse_mo)
 
     count = 0
+    # in single precision sweeps the eigensolver works in double precision
+    # and the contraction with the environments is in single precision
+    single_precision = mps.dtype in (np.float32, np.complex64)
 
     def hop(x):
         nonlocal count
         count += 1
+        if single_precision:
+            x = x.astype(np.complex64 if np.iscomplexobj(x) else np.float32)
         clist = []
         if x.ndim == 1:
             clist.append(x)
@@ -1,11 +1,67 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
 import opt_einsum as oe
 
 from renormalizer.mps.matrix import asxp
+from renormalizer.mps.sparse_mpo import SparseMpoHop
+
+
+#: Maximum number of the cached contraction plans of :func:`hop_expr`.
+HOP_EXPR_CACHE_SIZE = 1024
+
+HopExprCacheInfo = namedtuple("HopExprCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+# (equation, shapes) -> contraction path. LRU.
+_plan_cache = OrderedDict()
+_plan_cache_lock = Lock()
+_plan_cache_stats = {"hits": 0, "misses": 0}
+
+
+def hop_expr_cache_info() -> HopExprCacheInfo:
+    """
+    Statistics of the contraction plan cache of :func:`hop_expr`, in the same form as ``functools.lru_cache``.
+    """
+    with _plan_cache_lock:
+        return HopExprCacheInfo(_plan_cache_stats["hits"], _plan_cache_stats["misses"],
+                                HOP_EXPR_CACHE_SIZE, len(_plan_cache))
 
 
-def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
+def clear_hop_expr_cache():
+    """
+    Clear the contraction plan cache of :func:`hop_expr` and the statistics.
+    """
+    with _plan_cache_lock:
+        _plan_cache.clear()
+        _plan_cache_stats["hits"] = _plan_cache_stats["misses"] = 0
+
+
+def _cached_expression(eq, constants, cshape):
+    # equivalent to ``oe.contract_expression(eq, *constants, cshape, constants=[0, 1, ...])``.
+    # The contraction path depends only on the shapes and is found once for each distinct shape tuple.
+    # Building the expression with a given path is cheap
+    shapes = tuple(tuple(t.shape) for t in constants) + (tuple(cshape),)
+    key = (eq, shapes)
+    with _plan_cache_lock:
+        path = _plan_cache.get(key)
+        if path is None:
+            _plan_cache_stats["misses"] += 1
+        else:
+            _plan_cache_stats["hits"] += 1
+            _plan_cache.move_to_end(key)
+    if path is None:
+        path = oe.contract_path(eq, *shapes, shapes=True)[0]
+        with _plan_cache_lock:
+            _plan_cache[key] = path
+            while len(_plan_cache) > HOP_EXPR_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+    return oe.contract_expression(eq, *constants, cshape, constants=list(range(len(constants))), optimize=path)
+
+
+def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False, sparse_mo=None):
+    # ``sparse_mo`` is the sparse representation of ``cmo``, see ``Mpo.get_sparse_mo``
 
     nsite = len(cmo)
     # whether have the ancilla
@@ -13,6 +69,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
     if not ancilla:
         assert nsite + 2 == len(cshape)
 
+    if sparse_mo is not None and not twolayer and not ancilla and nsite in [1, 2]:
+        return SparseMpoHop(ltensor, rtensor, sparse_mo)
+
     ltensor = asxp(ltensor)
     rtensor = asxp(rtensor)
     for i in range(len(cmo)):
@@ -33,10 +92,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #   |   f   |
             #   O-c-O-i-O
             #   S-d h k-S
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abcd, befg, cfhi, jgik, aej -> dhk",
-                ltensor, cmo[0], cmo[0], rtensor, cshape,
-                constants=[0, 1, 2, 3]
+                [ltensor, cmo[0], cmo[0], rtensor], cshape,
             )
         else:
             #   S-a e   j o-S
@@ -44,10 +102,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #   |   f   k   |
             #   O-c-O-i-O-n-O
             #   S-d h   m p-S
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abcd, befg, cfhi, gjkl, ikmn, olnp, aejo -> dhmp",
-                ltensor, cmo[0], cmo[0], cmo[1], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3, 4, 5],
+                [ltensor, cmo[0], cmo[0], cmo[1], cmo[1], rtensor], cshape,
             )
         # early return
         return expr
@@ -61,10 +118,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
         # O-b - b-O
         #
         # S-c   k-S
-        expr = oe.contract_expression(
+        expr = _cached_expression(
             "abc, lbk, ck -> al",
-            ltensor, rtensor, cshape,
-            constants=[0, 1],
+            [ltensor, rtensor], cshape,
         )
     elif nsite == 1:
         if not ancilla:
@@ -73,10 +129,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             # O-b-O-f-O
             #     e
             # S-c   k-S
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abc, bdef, lfk, cek -> adl",
-                ltensor, cmo[0], rtensor, cshape,
-                constants=[0, 1, 2],
+                [ltensor, cmo[0], rtensor], cshape,
             )
         else:
             # S-a   l-S
@@ -85,10 +140,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #     e
             # S-c   k-S
             #     g
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abc, bdef, lfk, cegk -> adgl",
-                ltensor, cmo[0], rtensor, cshape,
-                constants=[0, 1, 2],
+                [ltensor, cmo[0], rtensor], cshape,
             )
     else:
         if not ancilla:
@@ -97,10 +151,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             # O-b-O-f-O-j-O
             #     e   h
             # S-c       k-S
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abc, bdef, fghj, ljk, cehk -> adgl",
-                ltensor, cmo[0], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3],
+                [ltensor, cmo[0], cmo[1], rtensor], cshape,
             )
         else:
             # S-a       l-S
@@ -109,10 +162,9 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #     e   h
             # S-c       k-S
             #     m   n
-            expr = oe.contract_expression(
+            expr = _cached_expression(
                 "abc, bdef, fghj, ljk, cemhnk -> admgnl",
-                ltensor, cmo[0], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3],
+                [ltensor, cmo[0], cmo[1], rtensor], cshape,
             )
 
     return expr
\ No newline at end of file
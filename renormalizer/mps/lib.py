@@ -1,28 +1,186 @@
 # -*- coding: utf-8 -*-
 # Author: Jiajun Ren <jiajunren0522@gmail.com>
 
+import os
+import shutil
+import tempfile
+import threading
+import logging
 from functools import reduce
-from collections import deque
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from renormalizer.mps.backend import np, backend, xp
+from renormalizer.mps.backend import np, xp
 from renormalizer.mps.matrix import (Matrix, multi_tensor_contract, asxp,
     asnumpy, tensordot)
+from renormalizer.utils.configs import parse_memory_limit
+
+
+logger = logging.getLogger(__name__)
+
+
+class EnvironStore:
+    """
+    The default in-memory store of the environment blocks.
+    """
+    def __init__(self):
+        self._data = {}
+
+    def write(self, key, array: np.ndarray):
+        self._data[key] = array
+
+    def read(self, key) -> np.ndarray:
+        return self._data[key]
+
+    def prefetch(self, key):
+        # everything is in memory
+        pass
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def close(self):
+        self._data.clear()
+
+
+class DiskEnvironStore(EnvironStore):
+    """
+    Environment store with a memory budget. The least recently used blocks beyond the budget are
+    spilled to ``.npy`` files in ``dump_dir`` by a background thread, and blocks on the disk
+    are loaded back in advance by :meth:`prefetch` or memory-mapped upon :meth:`read`.
+
+    Parameters
+    ----------
+    memory_limit : int or float or str
+        The memory budget in bytes. Strings such as ``"2 GB"`` are also accepted.
+    dump_dir : str
+        The directory to create the temporary directory for the spilled blocks.
+    """
+    def __init__(self, memory_limit, dump_dir="./"):
+        super().__init__()
+        self.memory_limit = parse_memory_limit(memory_limit)
+        # blocks in memory, the order is the access order
+        self._data = OrderedDict()
+        self._nbytes = 0
+        # key -> path of blocks on the disk
+        self._dumped = {}
+        # key -> future. Blocks being written. The entry is removed once the writing finishes
+        self._spilling = {}
+        self._spilling_lock = threading.Lock()
+        # key -> future. Blocks being loaded
+        self._prefetching = {}
+        # one worker so that the loading of a block always happens after its writing
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._dump_dir = tempfile.mkdtemp(prefix="environ_", dir=dump_dir)
+
+    def _discard(self, key):
+        if key in self._data:
+            self._nbytes -= self._data.pop(key).nbytes
+        self._prefetching.pop(key, None)
+        with self._spilling_lock:
+            self._spilling.pop(key, None)
+        path = self._dumped.pop(key, None)
+        if path is not None:
+            # remove after the pending writing finishes
+            self._executor.submit(_remove_file, path)
+
+    def _put(self, key, array):
+        self._data[key] = array
+        self._nbytes += array.nbytes
+        # spill the least recently used blocks. The newest one always stays in memory
+        while self._nbytes > self.memory_limit and len(self._data) > 1:
+            old_key, old_array = self._data.popitem(last=False)
+            self._nbytes -= old_array.nbytes
+            if old_key in self._dumped:
+                # unchanged since last loaded from the disk
+                continue
+            path = os.path.join(self._dump_dir, f"{old_key[0]}_{old_key[1]}.npy")
+            future = self._executor.submit(np.save, path, old_array)
+            with self._spilling_lock:
+                self._spilling[old_key] = future
+            self._dumped[old_key] = path
+            # release the reference to the array held by `_spilling`
+            future.add_done_callback(lambda f, k=old_key: self._spilling_done(k, f))
+
+    def _spilling_done(self, key, future):
+        with self._spilling_lock:
+            if self._spilling.get(key) is future:
+                del self._spilling[key]
+
+    def write(self, key, array: np.ndarray):
+        self._discard(key)
+        self._put(key, array)
+
+    def read(self, key) -> np.ndarray:
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+        if key in self._prefetching:
+            array = self._prefetching.pop(key).result()
+            self._put(key, array)
+            return array
+        with self._spilling_lock:
+            future = self._spilling.get(key)
+        if future is not None:
+            # wait for the writing to finish
+            future.result()
+        return np.load(self._dumped[key], mmap_mode="r")
+
+    def prefetch(self, key):
+        if key in self._data or key in self._prefetching or key not in self._dumped:
+            return
+        # the loading is carried out after the pending writing by the single worker
+        self._prefetching[key] = self._executor.submit(_load_file, self._dumped[key])
+
+    def __contains__(self, key):
+        return key in self._data or key in self._dumped
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._data.clear()
+        self._spilling.clear()
+        self._prefetching.clear()
+        self._dumped.clear()
+        shutil.rmtree(self._dump_dir, ignore_errors=True)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _load_file(path):
+    return np.load(path)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 class Environ:
-    def __init__(self, mps, mpo, domain=None, mps_conj=None):
-        # todo: real disk and other backend
+    def __init__(self, mps, mpo, domain=None, mps_conj=None, store: EnvironStore=None):
         # todo: contract_one_site_multi_mpo could generalize contract_one_site,
         # we could unify them in the future.
 
         # idx indicates the exact position of L or R, like
         # L(idx-1) - mpo(idx) - R(idx+1)
-        self._virtual_disk = {}
+        if store is None:
+            memory_limit = parse_memory_limit(mps.compress_config.environ_memory_limit)
+            if memory_limit == float("inf"):
+                store = EnvironStore()
+            else:
+                store = DiskEnvironStore(memory_limit, mps.compress_config.dump_matrix_dir)
+        self._store = store
         if type(mpo) is list:
             ndim = len(mpo) + 2
         else:
             ndim = 3
-        self.sentinel = xp.ones([1,]*ndim, dtype=backend.real_dtype)
+        # the precision of the environment follows the MPS
+        self.sentinel = xp.ones([1,]*ndim, dtype=np.finfo(mps.dtype).dtype)
         self._construct(mps, mpo, domain, mps_conj)
 
     def _construct(self, mps, mpo, domain=None, mps_conj=None):
@@ -112,10 +270,17 @@ class Environ:
         return itensor
 
     def write(self, domain, siteidx, tensor):
-        self._virtual_disk[(domain, siteidx)] = asnumpy(tensor)
+        self._store.write((domain, siteidx), asnumpy(tensor))
 
     def read(self, domain: str, siteidx: int):
-        return asxp(self._virtual_disk[(domain, siteidx)])
+        return asxp(self._store.read((domain, siteidx)))
+
+    def prefetch(self, domain: str, siteidx: int):
+        """
+        Hint that the environment will be read soon.
+        Blocks spilled to the disk are loaded in the background.
+        """
+        self._store.prefetch((domain, siteidx))
 
 
 def contract_one_site_multi_mpo(environ, ms, mos, domain, ms_conj=None):
@@ -19,7 +19,10 @@ class Matrix:
             # forbid unchecked casting
             assert not np.iscomplexobj(array)
         if dtype is None:
-            if np.iscomplexobj(array):
+            if getattr(array, "dtype", None) in (np.float32, np.complex64):
+                # keep the single precision of mixed-precision calculations
+                dtype = array.dtype
+            elif np.iscomplexobj(array):
                 dtype = backend.complex_dtype
             else:
                 dtype = backend.real_dtype
@@ -53,7 +56,7 @@ class Matrix:
         return self.array.dtype
 
     def astype(self, dtype):
-        assert not (self.dtype == backend.complex_dtype and dtype == backend.real_dtype)
+        assert not (np.iscomplexobj(self.array) and not np.issubdtype(dtype, np.complexfloating))
         self.array = np.asarray(self.array, dtype=dtype)
         return self
 
@@ -94,10 +97,11 @@ class Matrix:
         """
         check L-orthogonal
         """
+        default_rtol, default_atol = canonical_tol(self.dtype)
         if atol is None:
-            atol = backend.canonical_atol
+            atol = default_atol
         if rtol is None:
-            rtol = backend.canonical_rtol
+            rtol = default_rtol
         tensm = asxp(self.array.reshape([np.prod(self.shape[:-1]), self.shape[-1]]))
         s = tensm.T.conj() @ tensm
         return xp.allclose(s, xp.eye(s.shape[0]), rtol=rtol, atol=atol)
@@ -106,10 +110,11 @@ class Matrix:
         """
         check R-orthogonal
         """
+        default_rtol, default_atol = canonical_tol(self.dtype)
         if atol is None:
-            atol = backend.canonical_atol
+            atol = default_atol
         if rtol is None:
-            rtol = backend.canonical_rtol
+            rtol = default_rtol
         tensm = asxp(self.array.reshape([self.shape[0], np.prod(self.shape[1:])]))
         s = tensm @ tensm.T.conj()
         return xp.allclose(s, xp.eye(s.shape[0]), rtol=rtol, atol=atol)
@@ -117,7 +122,12 @@ class Matrix:
     def to_complex(self):
         # `xp.array` always creates new array, so to_complex means copy, which is
         # in accordance with NumPy
-        return np.array(self.array, dtype=backend.complex_dtype)
+        # single precision is kept
+        if self.array.dtype in (np.float32, np.complex64):
+            dtype = np.complex64
+        else:
+            dtype = backend.complex_dtype
+        return np.array(self.array, dtype=dtype)
 
     def copy(self):
         new = self.__class__(self.array.copy(), self.array.dtype)
@@ -126,7 +136,7 @@ class Matrix:
         return new
 
     def nearly_zero(self):
-        if backend.is_32bits:
+        if backend.is_32bits or self.dtype in (np.float32, np.complex64):
             atol = 1e-10
         else:
             atol = 1e-20
@@ -185,6 +195,15 @@ class Matrix:
         return self.array.__complex__()
 
 
+def canonical_tol(dtype):
+    r""" The relative and absolute tolerance to check the canonical form of matrices with ``dtype``.
+    The tolerance of the single precision backend is used for single precision matrices.
+    """
+    if dtype in (np.float32, np.complex64):
+        return max(backend.canonical_rtol, 1e-2), max(backend.canonical_atol, 1e-4)
+    return backend.canonical_rtol, backend.canonical_atol
+
+
 def zeros(shape, dtype=None):
     if dtype is None:
         dtype = backend.real_dtype
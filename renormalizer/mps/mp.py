@@ -4,6 +4,8 @@
 import logging
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import List, Union
 
 from renormalizer.model import Model, HolsteinModel
@@ -31,6 +33,64 @@ from renormalizer.utils import sizeof_fmt, CompressConfig, CompressCriteria, OFS
 logger = logging.getLogger(__name__)
 
 
+# background I/O of the matrices dumped according to ``CompressConfig.dump_matrix_size``.
+# Only one worker so that the operations on the same file are carried out in order.
+_dump_executor: ThreadPoolExecutor = None
+# path -> (future, matrix). The matrices being written to the disk. Still accessible in memory.
+_pending_writes = {}
+# path -> future. The matrices being loaded from the disk in advance.
+_prefetched = {}
+# maximum number of the pending writes before the computation has to wait for the disk
+MAX_PENDING_WRITES = 4
+
+
+def _get_dump_executor() -> ThreadPoolExecutor:
+    global _dump_executor
+    if _dump_executor is None:
+        _dump_executor = ThreadPoolExecutor(max_workers=1)
+    return _dump_executor
+
+
+def _write_done(path, future):
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        # the matrix is kept in memory
+        logger.error(f"Save matrix to {path} failed. Working with the matrix in memory.", exc_info=future.exception())
+        return
+    # the path might have been reused by another write
+    if _pending_writes.get(path, (None, None))[0] is future:
+        _pending_writes.pop(path, None)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # the dump dir has been removed
+        pass
+    except OSError:
+        logger.exception(f"Remove {path} failed")
+
+
+def _wait_pending_writes(max_pending: int=0):
+    # wait until the number of unfinished writes is no more than ``max_pending``
+    unfinished = [future for future, _ in list(_pending_writes.values()) if not future.done()]
+    for future in unfinished[:max(len(unfinished) - max_pending, 0)]:
+        try:
+            future.result()
+        except Exception:
+            # already logged in ``_write_done``
+            pass
+
+
+def flush_dump():
+    """
+    Wait until all of the dumped matrices are written to the disk.
+    """
+    _wait_pending_writes(0)
+
+
 class MatrixProduct:
 
     @classmethod
@@ -103,7 +163,7 @@ class MatrixProduct:
 
     @property
     def is_complex(self):
-        return self.dtype == backend.complex_dtype
+        return np.issubdtype(self.dtype, np.complexfloating)
 
     @property
     def bond_dims(self) -> List:
@@ -337,6 +397,29 @@ class MatrixProduct:
         qnmat = add_outer(qnbigl, qnbigr)
         return qnbigl, qnbigr, qnmat
 
+    def _get_qn_list(self, cidx: List[int]):
+        r""" get the quantum number of each leg of the active site tensor.
+        The quantum numbers of all legs add up to ``self.qntot``
+        for the symmetry-allowed elements.
+
+        Parameters
+        ----------
+        cidx : list
+            a list of center(active) site index.
+
+        Returns
+        -------
+        qn_list : list of np.ndarray
+            L-block, physical bonds of the active sites and R-block quantum number.
+            ``None`` if the physical bonds have more than one leg (e.g. MPDM).
+        """
+        cidx = sorted(cidx)
+        assert self.qnidx in cidx
+        sigmaqn = [np.array(self._get_sigmaqn(idx)) for idx in cidx]
+        if any(qn.ndim != 2 for qn in sigmaqn):
+            return None
+        return [np.array(self.qn[cidx[0]])] + sigmaqn + [np.array(self.qn[cidx[-1]+1])]
+
     @property
     def mp_norm(self) -> float:
         # the fast version in the comment rarely makes sense because in a lot of cases
@@ -411,10 +494,10 @@ class MatrixProduct:
         else:
             assert False
 
-        # assert self.qnidx == other.qnidx
+        # the quantum numbers of self follow the convention of other.qnidx after moving
         new_mps.move_qnidx(other.qnidx)
         new_mps.to_right = other.to_right
-        new_mps.qn = [np.concatenate([qn1, qn2]) for qn1, qn2 in zip(self.qn, other.qn)]
+        new_mps.qn = [np.concatenate([qn1, qn2]) for qn1, qn2 in zip(new_mps.qn, other.qn)]
         # qn at the boundary should have dimension 1
         new_mps.qn[0] = np.zeros((1, new_mps.qn[0].shape[1]), dtype=int)
         new_mps.qn[-1] = np.zeros((1, new_mps.qn[0].shape[1]), dtype=int)
@@ -450,6 +533,12 @@ class MatrixProduct:
         for idx in self.iter_idx_list(full=False):
             mt: Matrix = self[idx]
             qnbigl, qnbigr, _ = self._get_big_qn([idx])
+            if temp_m_trunc is not None:
+                rank = temp_m_trunc
+            else:
+                rank = self.compress_config.max_m_trunc(idx, self.to_right)
+            if not self.compress_config.randomized_svd:
+                rank = None
             u, sigma, qnlset, v, sigma, qnrset = svd_qn.svd_qn(
                 mt.array,
                 qnbigl,
@@ -457,12 +546,15 @@ class MatrixProduct:
                 self.qntot,
                 system=system,
                 full_matrices=False,
+                rank=rank,
             )
             vt = v.T
             s_list.append(sigma)
             if temp_m_trunc is None:
+                # the singular values could be partial if ``rank`` is set
+                sigma_norm = None if rank is None else np.linalg.norm(mt.array)
                 m_trunc = self.compress_config.compute_m_trunc(
-                    sigma, idx, self.to_right
+                    sigma, idx, self.to_right, sigma_norm=sigma_norm
                 )
             else:
                 m_trunc = min(temp_m_trunc, len(sigma))
@@ -617,7 +709,7 @@ class MatrixProduct:
 
         return mps
 
-    def _update_mps(self, cstruct, cidx, qnbigl, qnbigr, percent=0):
+    def _update_mps(self, cstruct, cidx, qnbigl, qnbigr, percent=0, ddm_perturbation=None):
         r"""update mps with basis selection algorithm of J. Chem. Phys. 120,
         3172 (2004).
 
@@ -637,6 +729,12 @@ class MatrixProduct:
             values. ``percent`` is defined in ``procedure`` of
             `renormalizer.utils.configs.OptimizeConfig` and ``vprocedure`` of
             `renormalizer.utils.configs.CompressConfig`.
+        ddm_perturbation : ndarray, optional
+            The perturbation added to the reduced density matrix of the super-L-block
+            (super-R-block if sweeping to the left) in the 1site method. The renormalized basis
+            is then selected from the eigenvectors of the perturbed density matrix
+            and the bond dimension could grow, see ``expansion_alpha`` of
+            `renormalizer.utils.configs.OptimizeConfig`.
 
         Returns
         -------
@@ -651,6 +749,13 @@ class MatrixProduct:
 
         system = "L" if self.to_right else "R"
 
+        single_state = type(cstruct) is not list
+        if ddm_perturbation is not None:
+            assert len(cidx) == 1 and self.compress_config.ofs is None
+            # go through the density matrix route
+            if single_state:
+                cstruct = [cstruct]
+
         if self.compress_config.bonddim_should_set:
             self.compress_config.set_bonddim(len(self)+1)
 
@@ -765,9 +870,11 @@ class MatrixProduct:
                         cstruct[iroot],
                         axes=(range(qnbigl.ndim-1), range(qnbigl.ndim-1)),
                     )
-            ddm /= len(cstruct)
+            ddm = asnumpy(ddm) / len(cstruct)
+            if ddm_perturbation is not None:
+                ddm = ddm + asnumpy(ddm_perturbation)
             Uset, Sset, qnnew = svd_qn.eigh_qn(
-                asnumpy(ddm), qnbigl, qnbigr, self.qntot, system=system
+                ddm, qnbigl, qnbigr, self.qntot, system=system
             )
 
             if self.to_right:
@@ -851,7 +958,7 @@ class MatrixProduct:
             if type(cstruct) is list:
                 averaged_ms = rotated_c
             self.qn[cidx[1]] = msqn
-        if type(cstruct) is list:
+        if not single_state:
             return averaged_ms
         else:
             return None
@@ -967,7 +1074,10 @@ class MatrixProduct:
             new_mp = self
         else:
             new_mp = self.metacopy()
-        new_mp.dtype = backend.complex_dtype
+        if self.dtype in (np.float32, np.complex64):
+            new_mp.dtype = np.complex64
+        else:
+            new_mp.dtype = backend.complex_dtype
         for i, mt in enumerate(self):
             if mt is None:
                 # dummy mt after metacopy. Bad idea. Remove the dummy thing when feasible
@@ -975,6 +1085,36 @@ class MatrixProduct:
             new_mp[i] = mt.to_complex()
         return new_mp
 
+    def astype(self, dtype) -> "MatrixProduct":
+        r""" Return a copy with the matrices cast to ``dtype``.
+        Casting from complex to real is not allowed.
+
+        Parameters
+        ----------
+        dtype : str or np.dtype
+            The target data type. ``"fp32"`` and ``"fp64"`` are accepted for
+            single and double precision with the complexity of the matrix product retained,
+            e.g., ``"fp32"`` is ``np.complex64`` for a complex matrix product.
+
+        Returns
+        -------
+        new_mp : MatrixProduct
+            The new matrix product. A copy is made even if the data type does not change.
+        """
+        if dtype in ["fp32", "fp64"]:
+            if self.is_complex:
+                dtype = {"fp32": np.complex64, "fp64": np.complex128}[dtype]
+            else:
+                dtype = {"fp32": np.float32, "fp64": np.float64}[dtype]
+        dtype = np.dtype(dtype).type
+        if self.is_complex and not np.issubdtype(dtype, np.complexfloating):
+            raise ValueError(f"Can not cast complex matrix product to {dtype}")
+        new_mp = self.metacopy()
+        new_mp.dtype = dtype
+        for i in range(len(self)):
+            new_mp[i] = self[i].array.astype(dtype)
+        return new_mp
+
     def distance(self, other) -> float:
         l1 = self.conj().dot(self)
         l2 = other.conj().dot(other)
@@ -1035,15 +1175,16 @@ class MatrixProduct:
                     logger.exception("Creating dump dir failed. Working with the matrix in memory.")
                     break
             dump_name = os.path.join(dir_with_id, f"{idx}.npy")
-            try:
-                array = mt.array
-                if not array.flags.c_contiguous and not array.flags.f_contiguous:
-                    # for faster dump (3x). Costs more memory.
-                    array = np.ascontiguousarray(array)
-                np.save(dump_name, array)
-            except:
-                logger.exception("Save matrix to disk failed. Working with the matrix in memory.")
-                break
+            array = mt.array
+            if not array.flags.c_contiguous and not array.flags.f_contiguous:
+                # for faster dump (3x). Costs more memory.
+                array = np.ascontiguousarray(array)
+            # bound the memory held by the pending writes
+            _wait_pending_writes(MAX_PENDING_WRITES - 1)
+            # write behind the computation. The matrix is accessible in memory before the writing finishes
+            future = _get_dump_executor().submit(np.save, dump_name, array)
+            _pending_writes[dump_name] = (future, mt)
+            future.add_done_callback(partial(_write_done, dump_name))
             return dump_name
 
         return mt
@@ -1126,25 +1267,48 @@ class MatrixProduct:
                     # the dump mechanism pointless
                     raise IndexError("Can't slice on dump matrices.")
         if isinstance(mt_or_str_or_list, str):
-            try:
-                mt = Matrix(np.load(mt_or_str_or_list), dtype=self.dtype)
-                mt.sigmaqn = self._get_sigmaqn(item)
-            except:
-                logger.exception(f"Can't load matrix from {mt_or_str_or_list}")
-                raise RuntimeError("MPS internal structure corrupted.")
+            pending = _pending_writes.get(mt_or_str_or_list)
+            if pending is not None:
+                mt = pending[1]
+            else:
+                try:
+                    future = _prefetched.pop(mt_or_str_or_list, None)
+                    if future is not None:
+                        array = future.result()
+                    else:
+                        # copy-on-write memory map. Only the accessed part is read
+                        array = np.load(mt_or_str_or_list, mmap_mode="c")
+                    mt = Matrix(array, dtype=self.dtype)
+                    mt.sigmaqn = self._get_sigmaqn(item)
+                except:
+                    logger.exception(f"Can't load matrix from {mt_or_str_or_list}")
+                    raise RuntimeError("MPS internal structure corrupted.")
+            self._prefetch_dumped(item)
         else:
             if not isinstance(mt_or_str_or_list, (Matrix, type(None))):
                 raise RuntimeError(f"Unknown matrix type: {type(mt_or_str_or_list)}")
             mt = mt_or_str_or_list
         return mt
 
+    def _prefetch_dumped(self, idx: int):
+        # the sites to be accessed next in the sweep are loaded in the background
+        nsites = self.compress_config.dump_matrix_prefetch
+        if idx < 0:
+            idx += len(self._mp)
+        step = 1 if self.to_right else -1
+        for i in range(idx + step, idx + step * (nsites + 1), step):
+            if not 0 <= i < len(self._mp):
+                break
+            path = self._mp[i]
+            if isinstance(path, str) and path not in _pending_writes and path not in _prefetched:
+                _prefetched[path] = _get_dump_executor().submit(np.load, path)
+
     def __setitem__(self, key, array):
         old_mt = self._mp[key]
         if isinstance(old_mt, str):
-            try:
-                os.remove(old_mt)
-            except:
-                logger.exception(f"Remove {old_mt} failed")
+            _prefetched.pop(old_mt, None)
+            # after the pending writing of the file
+            _get_dump_executor().submit(_remove_file, old_mt)
         new_mt = self._array2mt(array, key)
         self._mp[key] = new_mt
 
@@ -1176,6 +1340,18 @@ class MatrixProduct:
     def __del__(self):
         dir_with_id = os.path.join(self.compress_config.dump_matrix_dir, str(id(self)))
         if os.path.exists(dir_with_id):
+            # the directory could be reused by another object with the same id,
+            # so wait for the background I/O before removing it
+            for path in list(_pending_writes.keys()) + list(_prefetched.keys()):
+                if os.path.dirname(path) != dir_with_id:
+                    continue
+                _prefetched.pop(path, None)
+                pending = _pending_writes.pop(path, None)
+                if pending is not None and not pending[0].cancel():
+                    try:
+                        pending[0].result()
+                    except Exception:
+                        pass
             try:
                 shutil.rmtree(dir_with_id)
             except OSError:
@@ -1,20 +1,24 @@
 import logging
 import itertools
+import os
 from copy import deepcopy
 from typing import List, Union
 
 import numpy as np
+import opt_einsum as oe
 import scipy
 import scipy.sparse
 
 from renormalizer.model import Model, HolsteinModel
 from renormalizer.mps.backend import xp
-from renormalizer.mps.matrix import moveaxis, tensordot
+from renormalizer.mps.matrix import moveaxis, tensordot, asnumpy, asxp
 from renormalizer.mps.mp import MatrixProduct
 from renormalizer.mps.svd_qn import add_outer
 from renormalizer.mps import svd_qn
 from renormalizer.mps.lib import update_cv
-from renormalizer.mps.symbolic_mpo import construct_symbolic_mpo, _terms_to_table, symbolic_mo_to_numeric_mo, swap_site
+from renormalizer.mps.sparse_mpo import SparseMo
+from renormalizer.mps.symbolic_mpo import construct_symbolic_mpo_template, cached_construct_symbolic_mpo_template, \
+    evaluate_symbolic_mpo_template, table_to_int, _terms_to_table, symbolic_mo_to_numeric_mo, swap_site
 from renormalizer.utils import Quantity
 from renormalizer.model.op import Op
 from renormalizer.utils.elementop import (
@@ -24,6 +28,10 @@ from renormalizer.utils.elementop import (
 
 logger = logging.getLogger(__name__)
 
+#: The default directory of the on-disk symbolic MPO cache, set by the environment variable
+#: ``RENO_MPO_CACHE_DIR``. ``None`` means the cache is disabled.
+MPO_CACHE_DIR = os.environ.get("RENO_MPO_CACHE_DIR")
+
 
 class Mpo(MatrixProduct):
     """
@@ -247,10 +255,30 @@ class Mpo(MatrixProduct):
         mpo.build_empty_qn()
         return mpo
 
-    def __init__(self, model: Model = None, terms: Union[Op, List[Op]] = None, offset: Quantity = Quantity(0), ):
+    def __init__(self, model: Model = None, terms: Union[Op, List[Op]] = None, offset: Quantity = Quantity(0),
+                 cache_dir: str = None):
 
         """
-        todo: document
+        Construct the MPO of ``terms`` by the symbolic MPO algorithm.
+
+        Parameters
+        ----------
+        model : :class:`~renormalizer.model.Model`
+            The model. If ``None``, an empty MPO is returned.
+        terms : :class:`~renormalizer.model.Op` or list of :class:`~renormalizer.model.Op`
+            The operator terms. Default is the Hamiltonian of the model.
+        offset : :class:`~renormalizer.utils.Quantity`
+            The constant subtracted from the operator.
+        cache_dir : str
+            The directory of the on-disk cache of the symbolic MPO. Jobs with the same
+            basis ordering and terms load the symbolic MPO instead of constructing it.
+            The factors of the terms are not part of the key, so parameter scans share the cache.
+            The numerical site tensors are always evaluated with ``model.basis``.
+            Default is :data:`MPO_CACHE_DIR`.
+
+        See Also
+        --------
+        refresh_factors : construct the MPO with different factors of the terms by the same symbolic MPO.
         """
         super(Mpo, self).__init__()
         # leave the possibility to construct MPO by hand
@@ -275,7 +303,18 @@ class Mpo(MatrixProduct):
 
         self.dtype = factor.dtype
 
-        mpo_symbol, self.qn, self.qntot, self.qnidx, self.symbolic_out_ops_list, self.primary_ops = construct_symbolic_mpo(table, factor)
+        if cache_dir is None:
+            cache_dir = MPO_CACHE_DIR
+        if cache_dir is None:
+            template = construct_symbolic_mpo_template(table)
+        else:
+            template = cached_construct_symbolic_mpo_template(table, cache_dir)
+        symbolic_mpo, term_inverse, unique_table = template
+        _, self.qn, self.qntot, self.qnidx, out_ops_template, self.primary_ops = symbolic_mpo
+        mpo_symbol, self.symbolic_out_ops_list = \
+            evaluate_symbolic_mpo_template(out_ops_template, self.primary_ops, factor, term_inverse)
+        # the template is not modified afterwards and is shared by the copies
+        self.symbolic_template = (out_ops_template, term_inverse, unique_table)
         # print(_format_symbolic_mpo(mpo_symbol))
         self.model = model
         self.to_right = False
@@ -287,6 +326,115 @@ class Mpo(MatrixProduct):
             mo_mat = symbolic_mo_to_numeric_mo(model.basis[impo], mo, self.dtype)
             self.append(mo_mat)
 
+    def refresh_factors(self, model: Model = None, terms: Union[Op, List[Op]] = None, offset: Quantity = None) -> "Mpo":
+        r"""
+        Construct the MPO of ``terms`` that differ from the terms of this MPO only by the factors,
+        such as the points of a parameter scan. The symbolic MPO is reused
+        and only the numerical site tensors are evaluated, which is much cheaper than constructing a new MPO.
+
+        Parameters
+        ----------
+        model : :class:`~renormalizer.model.Model`
+            The model with the new parameters. The ordering of the basis should be the same.
+            The numerical site tensors are evaluated with ``model.basis``.
+            Default is the model of this MPO.
+        terms : :class:`~renormalizer.model.Op` or list of :class:`~renormalizer.model.Op`
+            The operator terms with the new factors, in the same order as the terms of this MPO.
+            Default is the Hamiltonian of ``model``.
+        offset : :class:`~renormalizer.utils.Quantity`
+            The constant subtracted from the operator. Default is the offset of this MPO.
+
+        Returns
+        -------
+        mpo : :class:`Mpo`
+            The new MPO.
+
+        Raises
+        ------
+        ValueError
+            If the operator structure of ``terms`` is different from the terms of this MPO,
+            for example a term is added or a factor becomes 0 and the term is dropped.
+        """
+        if getattr(self, "symbolic_template", None) is None:
+            raise ValueError("The MPO is not constructed from operator terms or the sites have been swapped.")
+        if model is None:
+            model = self.model
+        if terms is None:
+            terms = model.ham_terms
+        elif isinstance(terms, Op):
+            terms = [terms]
+        if offset is None:
+            offset = Quantity(self.offset)
+        if not isinstance(offset, Quantity):
+            raise ValueError(f"offset must be Quantity object. Got {offset} of {type(offset)}.")
+
+        terms = model.check_operator_terms(terms)
+        table, factor = _terms_to_table(model, terms, -offset.as_au())
+        out_ops_template, term_inverse, unique_table = self.symbolic_template
+        if len(table) != len(term_inverse) or \
+                not np.array_equal(table_to_int(table, self.primary_ops), unique_table[term_inverse]):
+            raise ValueError("The operator structure of the terms is different from the MPO. Construct a new MPO.")
+
+        mpo_symbol, out_ops_list = \
+            evaluate_symbolic_mpo_template(out_ops_template, self.primary_ops, factor, term_inverse)
+        new_mpo = self.metacopy()
+        new_mpo.model = model
+        new_mpo.offset = offset.as_au()
+        new_mpo.dtype = factor.dtype
+        new_mpo.symbolic_out_ops_list = out_ops_list
+        for impo, mo in enumerate(mpo_symbol):
+            new_mpo[impo] = symbolic_mo_to_numeric_mo(model.basis[impo], mo, new_mpo.dtype)
+        return new_mpo
+
+    def with_offset(self, offset: Quantity, inplace: bool = False) -> "Mpo":
+        r"""
+        The MPO with a different ``offset``, equivalent to ``Mpo(model, terms, offset)``
+        but without constructing the symbolic MPO again.
+        Only one element of the identity channel of the site tensors is modified.
+
+        Parameters
+        ----------
+        offset : :class:`~renormalizer.utils.Quantity`
+            The new constant subtracted from the operator.
+        inplace : bool
+            Whether modify this MPO in place. Default is ``False``.
+
+        Returns
+        -------
+        mpo : :class:`Mpo`
+            The MPO with the new offset.
+
+        Raises
+        ------
+        ValueError
+            If no channel of the MPO is identity on both sides of a site.
+        """
+        if not isinstance(offset, Quantity):
+            raise ValueError(f"offset must be Quantity object. Got {offset} of {type(offset)}.")
+        assert np.all(self.qntot == 0)
+        new_mpo = self if inplace else self.copy()
+        shift = getattr(self, "offset", 0) - offset.as_au()
+        new_mpo.offset = offset.as_au()
+        if shift == 0:
+            return new_mpo
+        # the shifts by successive calls are added to the same element,
+        # which is no longer identity after the first shift
+        offset_site = getattr(self, "_offset_site", None)
+        if offset_site is None:
+            offset_site = _find_identity_channel(self)
+        new_mpo._offset_site = offset_site
+        # the total shift relative to the symbolic MPO, restored after swapping sites
+        new_mpo._offset_shift = getattr(self, "_offset_shift", 0) + shift
+        new_mpo._add_identity(offset_site, shift)
+        return new_mpo
+
+    def _add_identity(self, offset_site, shift):
+        idx, lchannel, rchannel = offset_site
+        if np.iscomplexobj(shift) and not self.is_complex:
+            self.to_complex(inplace=True)
+        mo = self[idx].array.copy()
+        mo[lchannel, :, :, rchannel] += shift * np.eye(mo.shape[1], dtype=mo.dtype)
+        self[idx] = mo
 
     def _get_sigmaqn(self, idx):
         array_up = self.model.basis[idx].sigmaqn
@@ -307,12 +455,56 @@ class Mpo(MatrixProduct):
     def metacopy(self):
         new = super().metacopy()
         # some mpo may not have these things
-        attrs = ["scheme", "offset", "symbolic_out_ops_list", "primary_ops"]
+        attrs = ["scheme", "offset", "symbolic_out_ops_list", "primary_ops", "sparse", "_offset_site", "_offset_shift"]
         for attr in attrs:
             if hasattr(self, attr):
                 setattr(new, attr, deepcopy(getattr(self, attr)))
+        new.symbolic_template = getattr(self, "symbolic_template", None)
         return new
 
+    def to_sparse(self, inplace=True):
+        r""" Switch to the sparse storage mode for the effective Hamiltonian.
+        In this mode the nonzero ``(left bond, right bond, local operator)`` entries of
+        each site are kept (see :class:`~renormalizer.mps.sparse_mpo.SparseMo`) and
+        the effective Hamiltonian in the ground state and TDVP algorithms
+        sums only over these entries.
+        The dense site tensors are retained for the other operations.
+
+        Parameters
+        ----------
+        inplace : bool
+            Whether switch the mode in place. Default is ``True``.
+
+        Returns
+        -------
+        mpo : Mpo
+            The MPO in the sparse mode.
+        """
+        mpo = self if inplace else self.copy()
+        mpo.sparse = True
+        for idx in range(len(mpo)):
+            mpo._get_sparse_mo(idx)
+        densities = [mpo._sparse_mo_cache[idx][1].density for idx in range(len(mpo))]
+        logger.debug(f"Density of the sparse MPO sites: {np.round(densities, 3)}")
+        return mpo
+
+    def _get_sparse_mo(self, idx) -> SparseMo:
+        mt = self._mp[idx]
+        if not hasattr(self, "_sparse_mo_cache"):
+            self._sparse_mo_cache = {}
+        # the sparse site is invalidated when the matrix is replaced by ``__setitem__``
+        if idx not in self._sparse_mo_cache or self._sparse_mo_cache[idx][0] is not mt:
+            self._sparse_mo_cache[idx] = (mt, SparseMo(self[idx].array))
+        return self._sparse_mo_cache[idx][1]
+
+    def get_sparse_mo(self, cidx: List[int]) -> Union[List[SparseMo], None]:
+        r""" Get the sparse representation of the active sites. ``None`` if the MPO
+        is not in the sparse mode (see :meth:`to_sparse`).
+        """
+        if not getattr(self, "sparse", False):
+            return None
+        return [self._get_sparse_mo(idx) for idx in cidx]
+
     @property
     def dummy_qn(self):
         return [np.zeros((dim, self.model.qn_size), dtype=int) for dim in self.bond_dims]
@@ -386,15 +578,27 @@ class Mpo(MatrixProduct):
             new_mps.canonicalise()
         return new_mps
 
-    def contract(self, mps, algo="svd"):
+    def contract(self, mps, algo=None):
         r""" an approximation of mpo @ mps/mpdm/mpo
 
         Parameters
         ----------
         mps : `Mps`, `Mpo`, `MpDm`
         algo: str, optional
-            The algorithm to compress mpo @ mps/mpdm/mpo.  It could be ``svd``
-            (default) and ``variational``.
+            The algorithm to compress mpo @ mps/mpdm/mpo.  It could be ``svd``,
+            ``variational``, ``zipup`` and ``density_matrix``. Default is ``None``
+            which means ``mps.compress_config.contract_algo`` is used.
+
+            - ``svd``: form the full product by `Mpo.apply`, then canonicalise and compress.
+            - ``variational``: variational compression with an initial guess.
+            - ``zipup``: the zip-up algorithm. The product is truncated site by site by SVD
+              from left to right, followed by a compression sweep from right to left.
+            - ``density_matrix``: the density matrix algorithm. The renormalized basis
+              are the eigenvectors of the reduced density matrices of the product
+              from left to right.
+
+            The last two algorithms never form the full product,
+            see New J. Phys. 12, 055026 (2010).
 
         Returns
         -------
@@ -410,6 +614,8 @@ class Mpo(MatrixProduct):
 
 
         """
+        if algo is None:
+            algo = mps.compress_config.contract_algo
         if algo == "svd":
             # mapply->canonicalise->compress
             new_mps = self.apply(mps)
@@ -417,11 +623,87 @@ class Mpo(MatrixProduct):
             new_mps.compress()
         elif algo == "variational":
             new_mps = mps.variational_compress(self)
+        elif algo in ["zipup", "density_matrix"]:
+            new_mps = self._contract_sweep(mps, algo)
         else:
             assert False
 
         return new_mps
 
+    def _contract_sweep(self, mps, algo):
+        # zip-up and density matrix algorithm of mpo @ mps/mpdm/mpo. The result is left-canonical.
+        assert self.site_num == mps.site_num
+        if algo == "zipup":
+            # the local truncation is reasonable only if the mps is right-canonical
+            mps = mps.copy().ensure_right_canonical()
+        new_mps = mps.metacopy()
+        new_mps.dtype = np.result_type(self.dtype, mps.dtype)
+        new_mps.qntot = self.qntot + mps.qntot
+        compress_config = new_mps.compress_config
+        if compress_config.bonddim_should_set:
+            compress_config.set_bonddim(len(new_mps) + 1)
+
+        # the L-block quantum number of the bonds of the full product
+        mpo_qn = _left_block_qn(self)
+        mps_qn = _left_block_qn(mps)
+
+        ancilla = mps[0].ndim == 4
+        if not ancilla:
+            # k-S-m-S-n
+            #       q
+            # w-O---O-v
+            #       p
+            product_expr = "kwm, wpqv, mqn -> kpvn"
+        else:
+            product_expr = "kwm, wpqv, mqrn -> kprvn"
+
+        if algo == "density_matrix":
+            renv = _contract_dm_environ(self, mps, ancilla)
+
+        # the projection of the product onto the renormalized basis of the L-block
+        c = xp.ones((1, 1, 1))
+        qnl = np.zeros((1, self.qntot.shape[0]), dtype=int)
+        for i in range(self.site_num):
+            t = oe.contract(product_expr, c, asxp(self[i]), asxp(mps[i]))
+            if i == self.site_num - 1:
+                new_mps[i] = asnumpy(t).reshape(t.shape[:-2] + (1,))
+                break
+            qnbigl = add_outer(qnl, np.array(new_mps._get_sigmaqn(i)))
+            qnbigr = new_mps.qntot - add_outer(mpo_qn[i+1], mps_qn[i+1])
+            lshape = t.shape[:-2]
+            t_mat = t.reshape(np.prod(lshape), -1)
+            if algo == "zipup":
+                u, sigma, qnlnew, _, _, _ = svd_qn.svd_qn(
+                    asnumpy(t), qnbigl, qnbigr, new_mps.qntot, full_matrices=False
+                )
+                # relaxed truncation during the zip. The final compression sweep does the rest
+                m_trunc = min(2 * compress_config.compute_m_trunc(sigma, i, True), len(sigma))
+            else:
+                # k-T-v-R-V-T-K
+                #   p n    N P
+                dm = oe.contract("kv, vV, KV -> kK",
+                                 t_mat, renv[i+1].reshape(t_mat.shape[1], -1), t_mat.conj())
+                u, sigma, qnlnew = svd_qn.eigh_qn(
+                    asnumpy(dm), qnbigl, qnbigr, new_mps.qntot, system="L"
+                )
+                # the rank of the density matrix is no more than the dimension of the R-block
+                order = np.argsort(sigma)[::-1][:t_mat.shape[1]]
+                u, sigma, qnlnew = u[:, order], sigma[order], np.array(qnlnew)[order]
+                m_trunc = compress_config.compute_m_trunc(sigma, i, True)
+            u = u[:, :m_trunc]
+            new_mps[i] = u.reshape(lshape + (m_trunc,))
+            qnl = np.array(qnlnew[:m_trunc])
+            new_mps.qn[i+1] = qnl
+            c = (asxp(u).T.conj() @ t_mat).reshape((m_trunc,) + t.shape[-2:])
+
+        new_mps.qn[0] = np.zeros_like(new_mps.qn[0])
+        new_mps.qn[-1] = np.zeros_like(new_mps.qn[-1])
+        new_mps.qnidx = new_mps.site_num - 1
+        new_mps.to_right = False
+        if algo == "zipup":
+            new_mps.compress()
+        return new_mps
+
     def try_swap_site(self, new_model: Model, swap_jw: bool):
         # in place swapping.
         # if swap_jw is set to True, then self.primary_ops is modified in place
@@ -439,6 +721,8 @@ class Mpo(MatrixProduct):
         # although usually the `model` of MPO does not store `mpos`
         new_model.mpos.clear()
 
+        # the template is no longer consistent with the swapped sites
+        self.symbolic_template = None
         out_ops2, out_ops3, mo1, mo2, qn = swap_site(self.symbolic_out_ops_list[i:i+3], self.primary_ops, swap_jw)
 
         self.symbolic_out_ops_list[i+1] = out_ops2
@@ -448,6 +732,11 @@ class Mpo(MatrixProduct):
 
         for impo, mo in zip([i, j], [mo1, mo2]):
             self[impo] = symbolic_mo_to_numeric_mo(new_model.basis[impo], mo, self.dtype)
+        offset_site = getattr(self, "_offset_site", None)
+        if offset_site is not None and offset_site[0] in (i, j):
+            # the shift by `with_offset` is lost in the new site tensors
+            self._offset_site = _find_identity_channel(self)
+            self._add_identity(self._offset_site, self._offset_shift)
         logger.debug(self)
 
     def conj_trans(self):
@@ -489,3 +778,79 @@ class StackedMpo:
     """
     def __init__(self, mpos: List[Mpo]):
         self.mpos = mpos
+
+    @property
+    def offset(self):
+        return sum(getattr(mpo, "offset", 0) for mpo in self.mpos)
+
+    def with_offset(self, offset: Quantity, inplace: bool = False) -> "StackedMpo":
+        r"""
+        The stacked MPO with a different total ``offset``. The offset difference is absorbed
+        in the first MPO by :meth:`Mpo.with_offset`.
+        """
+        if not isinstance(offset, Quantity):
+            raise ValueError(f"offset must be Quantity object. Got {offset} of {type(offset)}.")
+        first_offset = Quantity(offset.as_au() - self.offset + getattr(self.mpos[0], "offset", 0))
+        first_mpo = self.mpos[0].with_offset(first_offset, inplace=inplace)
+        if inplace:
+            return self
+        return StackedMpo([first_mpo] + self.mpos[1:])
+
+
+def _find_identity_channel(mpo: Mpo):
+    # find a site and the channels on its left and right bonds, such that the operator of the
+    # left channel on the L-block and the operator of the right channel on the R-block are both identity.
+    # A channel is identity if it is connected to exactly one identity channel by the identity operator.
+    def is_identity(op):
+        return np.allclose(op, np.eye(op.shape[0]))
+
+    l_channels = [{0}]
+    for mo in mpo:
+        mo = asnumpy(mo)
+        channels = set()
+        for k in range(mo.shape[-1]):
+            j_list = np.nonzero(np.any(mo[..., k] != 0, axis=(1, 2)))[0]
+            if len(j_list) == 1 and j_list[0] in l_channels[-1] and is_identity(mo[j_list[0], :, :, k]):
+                channels.add(k)
+        l_channels.append(channels)
+
+    r_channels = [{0}]
+    for idx in range(mpo.site_num - 1, -1, -1):
+        mo = asnumpy(mpo[idx])
+        channels = set()
+        for j in range(mo.shape[0]):
+            k_list = np.nonzero(np.any(mo[j] != 0, axis=(0, 1)))[0]
+            if len(k_list) == 1 and k_list[0] in r_channels[-1] and is_identity(mo[j, :, :, k_list[0]]):
+                channels.add(j)
+        r_channels.append(channels)
+    r_channels = r_channels[::-1]
+
+    for idx in range(mpo.site_num):
+        if l_channels[idx] and r_channels[idx+1]:
+            return idx, min(l_channels[idx]), min(r_channels[idx+1])
+    raise ValueError("The identity channel is not found in the MPO. Construct a new MPO with the offset.")
+
+
+def _left_block_qn(mp: MatrixProduct) -> List[np.ndarray]:
+    # the L-block quantum number of all bonds regardless of ``qnidx``
+    return [np.array(qn) if i <= mp.qnidx else mp.qntot - np.array(qn) for i, qn in enumerate(mp.qn)]
+
+
+def _contract_dm_environ(mpo: Mpo, mps: MatrixProduct, ancilla: bool) -> List:
+    # the R-block environments of the density matrix (mpo @ mps)(mpo @ mps)^\dagger
+    # in which the physical bonds are traced out
+    #  w-O-v-
+    #  m-S-n-R
+    #  W-O-V-
+    #  M-S-N-
+    if not ancilla:
+        expr = "wpqv, mqn, vnVN, WpQV, MQN -> wmWM"
+    else:
+        expr = "wpqv, mqrn, vnVN, WpQV, MQrN -> wmWM"
+    renv = [None] * (mpo.site_num + 1)
+    renv[-1] = xp.ones((1, 1, 1, 1))
+    for i in range(mpo.site_num - 1, 0, -1):
+        mo = asxp(mpo[i])
+        ms = asxp(mps[i])
+        renv[i] = oe.contract(expr, mo, ms, renv[i+1], mo.conj(), ms.conj())
+    return renv
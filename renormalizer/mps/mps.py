@@ -1,12 +1,14 @@
 # -*- encoding: utf-8 -*-
 
 import logging
-from collections import Counter, deque
+from collections import Counter, deque, OrderedDict
 from functools import wraps, reduce
 from typing import Union, List, Dict
 import itertools
+import weakref
 
 
+import opt_einsum as oe
 import scipy
 from scipy import stats
 
@@ -38,7 +40,7 @@ from renormalizer.utils import (
     EvolveConfig,
     EvolveMethod
 )
-from renormalizer.utils.utils import calc_vn_entropy
+from renormalizer.utils.utils import calc_vn_entropy, thread_map
 
 logger = logging.getLogger(__name__)
 
@@ -479,48 +481,20 @@ class Mps(MatrixProduct):
             return np.array([self.expectation(mpo, self_conj) for mpo in mpos])
 
         # optimized way, cache for intermediates
-        # hash is used as indices of the matrices.
-        # The chance for collision (the same hash for two different matrices) is
-        # about 1-0.99999999999997 in 1000 matrices.
-        # In which case a RuntimeError is raised and rerun the job should solve the problem
-        hash_to_obj = dict()
-        mpos_hash: List[List] = []
-        for mpo in mpos:
-            mpo_hash = []
-            for m in mpo:
-                m_hash = hash(m)
-                if m_hash not in hash_to_obj:
-                    hash_to_obj[m_hash] = m
-                else:
-                    if not np.allclose(hash_to_obj[m_hash], m.array):
-                        raise RuntimeError("Rare hash collision")
-                mpo_hash.append(m_hash)
-            mpos_hash.append(mpo_hash)
+        if isinstance(mpos, ExpectationPlan):
+            plan = mpos
+        else:
+            plan = _get_expectation_plan(mpos)
 
         if self_conj is None:
             self_conj = self._expectation_conj()
-        l_environ_dict = _construct_freq_environ(mpos_hash, hash_to_obj, self, "L", self_conj)
-        r_environ_dict = _construct_freq_environ(mpos_hash, hash_to_obj, self, "R", self_conj)
-        results = []
-        for mpo in mpos:
-            l_environ, l_idx = _get_freq_environ(l_environ_dict, mpo, "L", np.inf)
-            r_environ, r_idx = _get_freq_environ(r_environ_dict, mpo, "R", len(mpo)-l_idx-1)
-            for i in range(l_idx+1, r_idx):
-                l_environ = contract_one_site(l_environ, self[i], mpo[i], "L", self_conj[i])
-            results.append(complex(l_environ.flatten() @ r_environ.flatten()))  # cast to python type
-
-        results = np.array(results)
+        results = plan.evaluate(self, self_conj)
         if np.allclose(results.imag, 0):
             return results.real
         else:
             return results
 
-    @property
-    def ph_occupations(self):
-        r"""
-        phonon occupations :math:`b^\dagger_i b_i` for each electronic DoF.
-        The order is defined by :attr:`~renormalizer.model.model.v_dofs`.
-        """
+    def _ph_occupations_mpos(self) -> List[Mpo]:
         key = "ph_occupations"
         # ph_occupations is actually the occupation of the basis
         if key not in self.model.mpos:
@@ -530,15 +504,9 @@ class Mps(MatrixProduct):
             self.model.mpos[key] = mpos
         else:
             mpos = self.model.mpos[key]
+        return mpos
 
-        return self.expectations(mpos)
-
-    @property
-    def e_occupations(self):
-        r"""
-        Electronic occupations :math:`a^\dagger_i a_i` for each electronic DoF.
-        The order is defined by :attr:`~renormalizer.model.model.e_dofs`.
-        """
+    def _e_occupations_mpos(self) -> List[Mpo]:
         key = "e_occupations"
         if key not in self.model.mpos:
             mpos = []
@@ -547,7 +515,39 @@ class Mps(MatrixProduct):
             self.model.mpos[key] = mpos
         else:
             mpos = self.model.mpos[key]
-        return self.expectations(mpos)
+        return mpos
+
+    @property
+    def ph_occupations(self):
+        r"""
+        phonon occupations :math:`b^\dagger_i b_i` for each electronic DoF.
+        The order is defined by :attr:`~renormalizer.model.model.v_dofs`.
+        """
+        return self.expectations(self._ph_occupations_mpos())
+
+    @property
+    def e_occupations(self):
+        r"""
+        Electronic occupations :math:`a^\dagger_i a_i` for each electronic DoF.
+        The order is defined by :attr:`~renormalizer.model.model.e_dofs`.
+        """
+        return self.expectations(self._e_occupations_mpos())
+
+    def calc_occupations(self):
+        r"""
+        Calculate :attr:`e_occupations` and :attr:`ph_occupations` in one pass.
+
+        Returns
+        -------
+        e_occupations : np.ndarray
+            Electronic occupations.
+        ph_occupations : np.ndarray
+            Phonon occupations.
+        """
+        e_mpos = self._e_occupations_mpos()
+        ph_mpos = self._ph_occupations_mpos()
+        res = self.expectations(e_mpos + ph_mpos)
+        return res[:len(e_mpos)], res[len(e_mpos):]
 
     def metacopy(self) -> "Mps":
         new: Mps = super().metacopy()
@@ -584,15 +584,21 @@ class Mps(MatrixProduct):
 
     def evolve(self, mpo, evolve_dt, normalize=True) -> "Mps":
 
+        if self.evolve_config.precision == "fp32":
+            return self._evolve_single_precision(mpo, evolve_dt, normalize)
+        assert self.evolve_config.precision == "fp64"
+
         method = {
             EvolveMethod.prop_and_compress: self._evolve_prop_and_compress,
             EvolveMethod.prop_and_compress_tdrk4: self._evolve_prop_and_compress_tdrk4,
             EvolveMethod.prop_and_compress_tdrk: self._evolve_prop_and_compress_tdrk,
+            EvolveMethod.krylov: self._evolve_krylov,
             EvolveMethod.tdvp_mu_vmf: self._evolve_tdvp_mu_vmf,
             EvolveMethod.tdvp_vmf: self._evolve_tdvp_mu_vmf,
             EvolveMethod.tdvp_mu_cmf: self._evolve_tdvp_mu_cmf,
             EvolveMethod.tdvp_ps: self._evolve_tdvp_ps,
-            EvolveMethod.tdvp_ps2: self._evolve_tdvp_ps2
+            EvolveMethod.tdvp_ps2: self._evolve_tdvp_ps2,
+            EvolveMethod.tdvp_ps_cbe: self._evolve_tdvp_ps,
         }[self.evolve_config.method]
         new_mps = method(mpo, evolve_dt)
         if normalize:
@@ -602,6 +608,22 @@ class Mps(MatrixProduct):
                 new_mps.normalize("mps_only")
         return new_mps
     
+    def _evolve_single_precision(self, mpo, evolve_dt, normalize) -> "Mps":
+        # the local steps of TDVP-PS in single precision. The normalization is in double precision
+        if self.evolve_config.method not in [EvolveMethod.tdvp_ps, EvolveMethod.tdvp_ps2, EvolveMethod.tdvp_ps_cbe]:
+            raise NotImplementedError(f"Single precision is not implemented for {self.evolve_config.method}")
+        mps = self.astype("fp32")
+        mps.evolve_config.precision = "fp64"
+        new_mps = mps.evolve(_fp32_mpo(mpo), evolve_dt, normalize=False)
+        new_mps = new_mps.astype(np.result_type(self.dtype, new_mps.dtype))
+        new_mps.evolve_config.precision = "fp32"
+        if normalize:
+            if np.iscomplex(evolve_dt):
+                new_mps.normalize("mps_and_coeff")
+            else:
+                new_mps.normalize("mps_only")
+        return new_mps
+
     def _evolve_prop_and_compress_tdrk4(self, mpo, evolve_dt) -> "Mps":
         """
         classical 4th order Runge-Kutta solver for time-dependent Hamiltonian
@@ -824,7 +846,79 @@ class Mps(MatrixProduct):
                     (-1.0j * evolve_dt) ** idx * propagation_c[idx], inplace=True
                 )
             return compressed_sum(termlist)
-    
+
+    def _evolve_krylov(self, mpo, evolve_dt) -> "Mps":
+        r"""
+        The global Krylov evolution scheme only for time-independent Hamiltonian.
+        The Krylov basis :math:`\{\psi, H\psi, H^2\psi, \cdots\}` is built by ``Mpo.contract`` and
+        the Lanczos recursion. Because each basis is compressed, the basis are not exactly orthogonal
+        and the propagator is evaluated in the space orthogonalized by the overlap matrix.
+        The basis size is increased until the propagated state converges.
+        See Phys. Rev. B 72, 020404 (2005) and Ann. Phys. 411, 167998 (2019)
+        """
+        config = self.evolve_config
+        assert evolve_dt is not None
+        if not np.iscomplex(evolve_dt):
+            evolve_dt = evolve_dt.real
+
+        # don't let bond dim grow when contracting
+        orig_compress_config = self.compress_config
+        contract_compress_config = self.compress_config.copy()
+        if contract_compress_config.criteria is CompressCriteria.threshold:
+            contract_compress_config.criteria = CompressCriteria.both
+
+        v_norm = self.mp_norm
+        basis = [self.scale(1 / v_norm)]
+        # overlap and Hamiltonian matrix in the Krylov basis
+        s_mat = np.zeros((config.krylov_max_basis, config.krylov_max_basis), dtype=complex)
+        h_mat = np.zeros_like(s_mat)
+        s_mat[0, 0] = 1
+        coef = old_coef = None
+        for j in range(config.krylov_max_basis):
+            basis[j].compress_config = contract_compress_config
+            h_psi = mpo.contract(basis[j], algo=config.krylov_contract_algo)
+            basis[j].compress_config = orig_compress_config
+            for i in range(j + 1):
+                h_mat[i, j] = basis[i].conj().dot(h_psi)
+                h_mat[j, i] = h_mat[i, j].conjugate()
+            h_mat[j, j] = h_mat[j, j].real
+
+            coef = _expm_projected(h_mat[:j+1, :j+1], s_mat[:j+1, :j+1], v_norm, evolve_dt)
+            if old_coef is not None:
+                # the distance between the last two propagated states in the Krylov space
+                diff = coef.copy()
+                diff[:j] -= old_coef
+                error = np.sqrt(abs(diff.conj() @ s_mat[:j+1, :j+1] @ diff)) / np.linalg.norm(coef)
+                logger.debug(f"Krylov basis size: {j+1}, error: {error}")
+                if error < config.krylov_rtol:
+                    break
+            if j == config.krylov_max_basis - 1:
+                logger.warning(f"Krylov evolution is not converged with {j+1} basis")
+                break
+            old_coef = coef
+
+            # Lanczos recursion
+            term_list = [h_psi, basis[j].scale(-h_mat[j, j] / s_mat[j, j])]
+            if j > 0:
+                term_list.append(basis[j-1].scale(-h_mat[j-1, j] / s_mat[j-1, j-1]))
+            new_basis = compressed_sum(term_list)
+            new_norm = new_basis.mp_norm
+            if new_norm < 1e-10 * abs(h_mat[j, j]) + 1e-14:
+                # the Krylov space is invariant
+                logger.debug(f"Krylov space is exhausted with {j+1} basis")
+                break
+            new_basis.scale(1 / new_norm, inplace=True)
+            basis.append(new_basis)
+            for i in range(j + 2):
+                s_mat[i, j+1] = basis[i].conj().dot(new_basis)
+                s_mat[j+1, i] = s_mat[i, j+1].conjugate()
+            s_mat[j+1, j+1] = s_mat[j+1, j+1].real
+
+        term_list = [b.scale(c) for b, c in zip(basis, coef)]
+        for t in term_list:
+            t.compress_config = orig_compress_config
+        return compressed_sum(term_list)
+
     def _evolve_tdvp_mu_vmf(self, mpo, evolve_dt) -> "Mps":
         """
         variable mean field
@@ -918,26 +1012,18 @@ class Mps(MatrixProduct):
                 S_L_list = [None,] * (mps.site_num + 1)
                 S_L_inv_list = [None,] * (mps.site_num + 1)
 
-            # calculate hop_y: from right to left
-            hop_y = xp.empty_like(y)
+            # the environments and S^-1 of each site: from right to left
+            # the derivatives of the sites are then calculated independently
+            site_tasks = []
 
             for imps in mps.iter_idx_list(full=True):
-                shape = list(mps[imps].shape)
                 ltensor = asxp(environ.read("L", imps - 1))
 
                 if imps == self.site_num - 1:
                     # the coefficient site
                     rtensor = xp.ones((1, 1, 1), dtype=mps.dtype)
-                    hop =hop_expr(ltensor, rtensor, [asxp(mpo[imps])], shape)
-
                     S_inv = xp.diag(xp.ones(1,dtype=mps.dtype))
-                    func = integrand_func_factory(shape, hop, True, S_inv, True,
-                            coef, ovlp_inv1=S_L_inv_list[imps+1],
-                            ovlp_inv0=S_L_inv_list[imps], ovlp0=S_L_list[imps])
-
-                    hop_y[position[imps]:position[imps+1]] = func(0,
-                            mps[imps].array.ravel()).reshape(mps[imps].shape)[qn_mask_list[imps]]
-
+                    site_tasks.append((imps, ltensor, rtensor, S_inv, True))
                     continue
 
                 if self.evolve_config.method == EvolveMethod.tdvp_mu_vmf:
@@ -988,14 +1074,23 @@ class Mps(MatrixProduct):
                     # S_inv is (#.conj, #)
                     S_inv = u.dot(xp.diag(1.0 / w)).dot(u.T.conj()).T
 
+                site_tasks.append((imps, ltensor, rtensor, S_inv, False))
+
+            def calc_site_deriv(task):
+                imps, ltensor, rtensor, S_inv, coefficient_site = task
+                shape = list(mps[imps].shape)
                 hop = hop_expr(ltensor, rtensor, [asxp(mpo[imps])], shape)
 
-                func = integrand_func_factory(shape, hop, False, S_inv, True,
+                func = integrand_func_factory(shape, hop, coefficient_site, S_inv, True,
                         coef, ovlp_inv1=S_L_inv_list[imps+1],
                         ovlp_inv0=S_L_inv_list[imps], ovlp0=S_L_list[imps])
 
-                hop_y[position[imps]:position[imps+1]] = func(0,
-                        asxp(mps[imps].array.ravel())).reshape(mps[imps].shape)[qn_mask_list[imps]]
+                return func(0, asxp(mps[imps].array.ravel())).reshape(shape)[qn_mask_list[imps]]
+
+            hop_y = xp.empty_like(y)
+            site_derivs = thread_map(calc_site_deriv, site_tasks, self.evolve_config.vmf_workers)
+            for (imps, *_), deriv in zip(site_tasks, site_derivs):
+                hop_y[position[imps]:position[imps+1]] = deriv
 
             return hop_y
 
@@ -1225,17 +1320,28 @@ class Mps(MatrixProduct):
         # almost half is not used. Not a big deal.
         environ = Environ(mps, mpo)
 
+        expand = self.evolve_config.method is EvolveMethod.tdvp_ps_cbe
+        if expand and mps.compress_config.bonddim_should_set:
+            mps.compress_config.set_bonddim(len(mps) + 1)
+
         # statistics for debug output
         local_steps = []
         # sweep for 2 rounds
         for i in range(2):
             for imps in mps.iter_idx_list(full=True):
                 system = "L" if mps.to_right else "R"
+                if expand:
+                    mps._expand_bond_cbe(environ, mpo, imps, evolve_dt)
                 l_array = environ.read("L", imps - 1)
                 r_array = environ.read("R", imps + 1)
+                if mps.to_right:
+                    environ.prefetch("R", imps + 2)
+                else:
+                    environ.prefetch("L", imps - 2)
 
                 shape = list(mps[imps].shape)
-                hop = hop_expr(l_array, r_array, [asxp(mpo[imps].array)], shape)
+                hop = hop_expr(l_array, r_array, [asxp(mpo[imps].array)], shape,
+                               sparse_mo=mpo.get_sparse_mo([imps]))
 
                 if self.evolve_config.ivp_solver == "krylov":
                     mps_t, j = expm_krylov(
@@ -1344,6 +1450,99 @@ class Mps(MatrixProduct):
 
         return mps
 
+    def _expand_bond_cbe(self, environ: Environ, mpo, imps: int, evolve_dt):
+        r""" Controlled bond expansion (Phys. Rev. Lett. 130, 246402 (2023))
+        of the bond between the active site ``imps`` and the next site in the sweep.
+
+        The two-site residual :math:`\hat H_{2} \Psi_{2}` is projected onto the orthogonal
+        complement of the next site. Its leading singular vectors, weighted by ``evolve_dt / 2``
+        as the first-order amplitudes in the half step, compete with the current singular values of
+        the bond under ``self.compress_config``. The next site is enlarged with the retained vectors
+        and the active site is padded with zeros, so the state is unchanged while the following one-site
+        step can populate the new basis. The environment of the next site is updated in ``environ``.
+        """
+        if self.to_right:
+            if imps == len(self) - 1:
+                return
+            cidx = [imps, imps + 1]
+            l_array = environ.read("L", imps - 1)
+            r_array = environ.read("R", imps + 2)
+        else:
+            if imps == 0:
+                return
+            cidx = [imps - 1, imps]
+            l_array = environ.read("L", imps - 2)
+            r_array = environ.read("R", imps + 1)
+        ms2 = tensordot(self[cidx[0]], self[cidx[1]], axes=1)
+        hop = hop_expr(l_array, r_array, [mpo[cidx[0]], mpo[cidx[1]]], ms2.shape)
+        x = asnumpy(hop(asxp(ms2)))
+        ms = self[imps].array
+        if self.to_right:
+            # the next site as the row vectors
+            nxt = self[cidx[1]].array.reshape(self[cidx[1]].shape[0], -1)
+            x_mat = x.reshape(-1, nxt.shape[1])
+            x_mat = x_mat - (x_mat @ nxt.T.conj()) @ nxt
+            old_s = scipy.linalg.svdvals(ms.reshape(-1, ms.shape[-1]))
+        else:
+            # the next site as the column vectors
+            nxt = self[cidx[0]].array.reshape(-1, self[cidx[0]].shape[-1])
+            x_mat = x.reshape(nxt.shape[0], -1)
+            x_mat = x_mat - nxt @ (nxt.T.conj() @ x_mat)
+            old_s = scipy.linalg.svdvals(ms.reshape(ms.shape[0], -1))
+
+        qnbigl, qnbigr, _ = self._get_big_qn(cidx)
+        u, su, qnl, v, sv, qnr = svd_qn.svd_qn(
+            x_mat.reshape(x.shape), qnbigl, qnbigr, self.qntot, system="L" if self.to_right else "R"
+        )
+        if self.to_right:
+            new_vec, new_s, new_qn = v, sv, qnr
+        else:
+            new_vec, new_s, new_qn = u, su, qnl
+        # discard the numerical noise of the projection
+        candidate = np.where(new_s > 1e-8 * np.linalg.norm(x))[0]
+        candidate = candidate[np.argsort(-new_s[candidate], kind="stable")]
+        # the bond dimension is limited by the dimension of the both sides
+        if self.to_right:
+            max_new = min(nxt.shape[1], np.prod(ms.shape[:-1])) - nxt.shape[0]
+        else:
+            max_new = min(nxt.shape[0], np.prod(ms.shape[1:])) - nxt.shape[1]
+        candidate = candidate[:max(max_new, 0)]
+        if len(candidate) == 0:
+            return
+        new_amplitude = abs(evolve_dt) / 2 * new_s[candidate]
+        combined = np.concatenate([old_s, new_amplitude])
+        m_trunc = self.compress_config.compute_m_trunc(combined, imps, self.to_right)
+        retained = np.argsort(-combined, kind="stable")[:m_trunc]
+        n_new = int(np.sum(retained >= len(old_s)))
+        if n_new == 0:
+            return
+        selected = candidate[:n_new]
+        new_vec = new_vec[:, selected]
+        # orthogonalize against the next site again to remove the round-off error.
+        # Vectors with different quantum numbers do not overlap, so QR preserves the quantum numbers
+        if self.to_right:
+            new_vec = new_vec - nxt.T @ (nxt.conj() @ new_vec)
+        else:
+            new_vec = new_vec - nxt @ (nxt.T.conj() @ new_vec)
+        new_vec, _ = scipy.linalg.qr(new_vec, mode="economic")
+        new_qn = np.array(new_qn)[selected]
+        logger.debug(f"CBE: site {imps}, {n_new} states added")
+
+        if self.to_right:
+            next_idx = cidx[1]
+            new_next = np.concatenate([nxt, new_vec.T], axis=0)
+            self[next_idx] = new_next.reshape([-1] + list(self[next_idx].shape[1:]))
+            self[imps] = np.concatenate([ms, np.zeros(ms.shape[:-1] + (n_new,), dtype=ms.dtype)], axis=-1)
+            self.qn[imps + 1] = np.concatenate([np.array(self.qn[imps + 1]), new_qn])
+            environ.GetLR("R", next_idx, self, mpo, itensor=None, method="System")
+        else:
+            next_idx = cidx[0]
+            new_next = np.concatenate([nxt, new_vec], axis=1)
+            self[next_idx] = new_next.reshape(list(self[next_idx].shape[:-1]) + [-1])
+            self[imps] = np.concatenate([ms, np.zeros((n_new,) + ms.shape[1:], dtype=ms.dtype)], axis=0)
+            self.qn[imps] = np.concatenate([np.array(self.qn[imps]), new_qn])
+            environ.GetLR("L", next_idx, self, mpo, itensor=None, method="System")
+
     @adaptive_tdvp
     def _evolve_tdvp_ps2(self, mpo, evolve_dt) -> "Mps":
         # PhysRevB.94.165116
@@ -1382,10 +1581,15 @@ class Mps(MatrixProduct):
 
                 l_array = environ.read("L", lidx)
                 r_array = environ.read("R", ridx)
+                if mps.to_right:
+                    environ.prefetch("R", ridx + 1)
+                else:
+                    environ.prefetch("L", lidx - 1)
 
                 # the two-site matrix state
                 ms2 = tensordot(mps[cidx0], mps[cidx1], axes=1)
-                hop = hop_expr(l_array, r_array, [mpo[cidx0], mpo[cidx1]], ms2.shape)
+                hop = hop_expr(l_array, r_array, [mpo[cidx0], mpo[cidx1]], ms2.shape,
+                               sparse_mo=mpo.get_sparse_mo([cidx0, cidx1]))
                 
                 if self.evolve_config.ivp_solver == "krylov":
                     mps_t, j = expm_krylov(
@@ -1485,6 +1689,106 @@ class Mps(MatrixProduct):
             res = np.tensordot(res, mt.array, axes=1).reshape(1, dim1, dim2)
         return res[0, :, 0]
     
+    def _calc_rdm_environ(self):
+        # the left and right environments of each site with the identity operator
+        #       S-a-S-f
+        # L-    |   d
+        #       S-c-S-h
+        anc = "l" if self.is_mpdm else ""
+        l_environ = [xp.ones((1, 1), dtype=self.dtype)]
+        for i in range(self.site_num - 1):
+            ms = asxp(self[i])
+            l_environ.append(oe.contract(f"ac, ad{anc}f, cd{anc}h -> fh", l_environ[-1], ms.conj(), ms))
+        r_environ = [xp.ones((1, 1), dtype=self.dtype)]
+        for i in range(self.site_num - 1, 0, -1):
+            ms = asxp(self[i])
+            r_environ.append(oe.contract(f"fh, ad{anc}f, cd{anc}h -> ac", r_environ[-1], ms.conj(), ms))
+        return l_environ, r_environ[::-1]
+
+    def calc_rdms(self, window: int = None, calc_2site: bool = True, chunk_size: int = 8):
+        r""" Calculate all the 1-site and 2-site reduced density matrices in one pass.
+
+        The environments of the identity operator are calculated once for each site.
+        The open 2-site environments of a chunk of sites are stacked and
+        propagated to the right together, so that the 2-site RDMs of all the site
+        pairs in the chunk ending at the same site are obtained by one contraction.
+
+        Parameters
+        ----------
+        window : int, optional
+            Only calculate the 2-site RDMs of site pairs ``(i, j)`` with ``j - i <= window``.
+            Default is None, which means all the site pairs.
+        calc_2site : bool
+            Whether to calculate the 2-site RDMs. Default is True.
+        chunk_size : int
+            The number of sites whose open environments are stacked together.
+            The memory cost of the stack is proportional to ``chunk_size``. Default is 8.
+
+        Returns
+        -------
+        rdm1: Dict
+            :math:`\{0:\rho_0, 1:\rho_1, \cdots\}`. The key is the index of the site.
+        rdm2: Dict
+            :math:`\{(0,1):\rho_{01}, (0,2):\rho_{02}, \cdots\}`. The key is a tuple of index of the site.
+            Empty if ``calc_2site`` is False.
+        """
+        if window is None:
+            window = self.site_num
+        assert window >= 1 and chunk_size >= 1
+        anc = "l" if self.is_mpdm else ""
+        l_environ, r_environ = self._calc_rdm_environ()
+
+        rdm1 = {}
+        rdm2 = {}
+        for chunk_start in range(0, self.site_num, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, self.site_num)
+            # the open 2-site environments of the sites in the chunk, stacked in the first axis.
+            # The physical bonds of site i are merged into the first axis
+            stack = None
+            stack_sites = []
+            for ims in range(chunk_start, self.site_num):
+                if chunk_end <= ims and not stack_sites:
+                    break
+                ms = asxp(self[ims])
+                pdim = ms.shape[1]
+                if stack is not None:
+                    # f-S-g f-S-a-S
+                    #   y     y
+                    #   z     z
+                    # h-S-k h-S-c-S
+                    r_open = oe.contract(f"fy{anc}g, hz{anc}k, gk -> fhyz", ms.conj(), ms, r_environ[ims])
+                    res = oe.contract("nfh, fhyz -> nyz", stack, r_open)
+                    offset = 0
+                    for isite in stack_sites:
+                        idim = self[isite].shape[1]
+                        block = res[offset:offset+idim**2].reshape(idim, idim, pdim, pdim)
+                        offset += idim**2
+                        rdm2[(isite, ims)] = asnumpy(block.transpose(0, 2, 1, 3).reshape(idim*pdim, idim*pdim))
+                    # propagate the stack through the current site
+                    stack = oe.contract(f"nfh, fx{anc}g, hx{anc}k -> ngk", stack, ms.conj(), ms)
+                if ims < chunk_end:
+                    # S-a-S-f
+                    # |   d
+                    # |   e
+                    # S-c-S-h
+                    l_open = oe.contract(f"ac, ad{anc}f, ce{anc}h -> defh", l_environ[ims], ms.conj(), ms)
+                    rho = oe.contract("defh, fh -> de", l_open, r_environ[ims])
+                    assert xp.allclose(rho, rho.T.conj())
+                    rdm1[ims] = asnumpy(rho)
+                    if calc_2site:
+                        # add the current site to the stack
+                        l_open = l_open.reshape(pdim**2, *l_open.shape[2:])
+                        if stack is None:
+                            stack = l_open
+                        else:
+                            stack = xp.concatenate([stack, l_open])
+                        stack_sites.append(ims)
+                # drop the sites out of the window
+                if stack_sites and window < ims + 1 - stack_sites[0]:
+                    idim = self[stack_sites.pop(0)].shape[1]
+                    stack = stack[idim**2:]
+        return rdm1, rdm2
+
     def calc_1site_rdm(self, idx=None):
         r""" Calculate 1-site reduced density matrix
         
@@ -1502,8 +1806,6 @@ class Mps(MatrixProduct):
             :math:`\{0:\rho_0, 1:\rho_1, \cdots\}`. The key is the index of the site.
         """
 
-        identity = Mpo.identity(self.model)
-        environ = Environ(self, identity, "R")
         if idx is None:
             idx = list(range(self.site_num))
         elif type(idx) is int:
@@ -1513,87 +1815,27 @@ class Mps(MatrixProduct):
         else:
             assert False
 
-        rdm = {}
-        for ims, ms in enumerate(self):
-            ltensor = environ.GetLR(
-                "L", ims-1, self, identity, itensor=None, method="System"
-            )
-            rtensor = environ.GetLR(
-                "R", ims+1, self, identity, itensor=None, method="Enviro"
-            )
-            if ims not in idx:
-                continue
-
-            ltensor = ltensor.reshape(ltensor.shape[0], ltensor.shape[-1])
-            rtensor = rtensor.reshape(rtensor.shape[0], rtensor.shape[-1])
-            
-            tensor = tensordot(ltensor, ms.conj(), ([0],[0]))
-            tensor = tensordot(tensor, rtensor, ([-1],[0]))
-            if ms.ndim == 3:
-                tensor = tensordot(tensor, ms, ([0,-1],[0,-1]))
-            else:
-                tensor = tensordot(tensor, ms, ([0,-1,-2],[0,-1,-2]))
-            assert xp.allclose(tensor, tensor.T.conj())
-            rdm[ims] = asnumpy(tensor)
-
-        return rdm
+        rdm1, _ = self.calc_rdms(calc_2site=False)
+        return {ims: rdm1[ims] for ims in idx}
     
-    def calc_2site_rdm(self):
+    def calc_2site_rdm(self, window: int = None):
         r""" Calculate 2-site reduced density matrix
         
         :math:`\rho_{ij} = \textrm{Tr}_{k \neq i, k \neq j} | \Psi \rangle \langle \Psi |`.
+
+        Parameters
+        ----------
+        window : int, optional
+            Only calculate the RDMs of site pairs ``(i, j)`` with ``j - i <= window``.
+            Default is None, which means all the site pairs.
         
         Returns
         -------
         rdm: Dict
             :math:`\{(0,1):\rho_{01}, (0,2):\rho_{02}, \cdots\}`. The key is a tuple of index of the site.
         """
-        
-        identity = Mpo.identity(self.model)
-        environ_R = Environ(self, identity, "R")
-        environ_L = Environ(self, identity, "L")
-        L_component = []
-        R_component = []
-        rdm = {}
-        # first construct 1-site environment
-        for ims, ms in enumerate(self):
-            ltensor = environ_L.GetLR("L", ims-1, self, identity,
-                    itensor=None, method="Enviro")
-            ltensor = ltensor.reshape(ltensor.shape[0], ltensor.shape[-1])
-            tensor = tensordot(ltensor, ms.conj(), ([0],[0]))
-            if ms.ndim == 3:
-                tensor = tensordot(tensor, ms, ([0],[0]))
-            elif ms.ndim == 4:
-                tensor = tensordot(tensor, ms, ([0,2],[0,2]))
-            L_component.append(tensor.transpose((0,2,1,3)))
-            
-            rtensor = environ_R.GetLR("R", ims+1, self, identity,
-                    itensor=None, method="Enviro")
-            rtensor = rtensor.reshape(rtensor.shape[0], rtensor.shape[-1])
-            tensor = tensordot(ms.conj(), rtensor, ([-1],[0]))
-            if ms.ndim == 3:
-                tensor = tensordot(tensor, ms, ([-1],[-1]))
-            elif ms.ndim == 4:
-                tensor = tensordot(tensor, ms, ([2,-1],[2,-1]))
-            R_component.append(tensor.transpose((0,2,1,3)))
-        
-        # merge two 1-site environment together
-        for ims in range(self.site_num):
-            tensor = L_component[ims]
-            for jms in range(ims+1, self.site_num):
-                if jms != ims+1:
-                    kms = jms - 1
-                    tensor = tensordot(tensor, self[kms].conj(), ([2],[0]))
-                    if self[kms].ndim == 3:
-                        tensor = tensordot(tensor, self[kms], ([2,3],[0,1]))
-                    elif self[kms].ndim == 4:
-                        tensor = tensordot(tensor, self[kms], ([2,3,4],[0,1,2]))
-                
-                rtensor = R_component[jms]
-                res = tensordot(tensor, rtensor,
-                        ([2,3],[0,1])).transpose(0,2,1,3)
-                rdm[(ims, jms)] = asnumpy(res.reshape(res.shape[0]*res.shape[1],-1))
-        return rdm
+        _, rdm2 = self.calc_rdms(window)
+        return rdm2
     
     def calc_edof_rdm(self) -> np.ndarray:
         r"""Calculate the reduced density matrix of electronic DoF
@@ -1673,13 +1915,19 @@ class Mps(MatrixProduct):
             raise ValueError(f"unsupported entropy type {entropy_type}")
         return entropy
     
-    def calc_2site_mutual_entropy(self):
+    def calc_2site_mutual_entropy(self, window: int = None):
         r""" 
         Calculate mutual entropy between two sites.
         
         :math:`m_{ij} = (s_i + s_j - s_{ij})/2`
             
         See Chemical Physics 323 (2006) 519–531
+
+        Parameters
+        ----------
+        window : int, optional
+            Only calculate the mutual entropy of site pairs ``(i, j)`` with ``|j - i| <= window``.
+            The others are set to zero. Default is None, which means all the site pairs.
         
         Returns
         -------
@@ -1687,14 +1935,14 @@ class Mps(MatrixProduct):
             mutual entropy with shape (nsite, nsite)
 
         """
-        entropy_1site = self.calc_entropy("1site")
-        entropy_2site = self.calc_entropy("2site")
+        rdm1, rdm2 = self.calc_rdms(window)
+        entropy_1site = {key: calc_vn_entropy(scipy.linalg.eigvalsh(dm)) for key, dm in rdm1.items()}
         nsites = self.site_num
         mut_entropy = np.zeros((nsites, nsites))
-        for isite, jsite in itertools.combinations(range(nsites),2):
-            key = (isite, jsite) if (isite, jsite) in entropy_2site.keys() else (jsite, isite)
+        for (isite, jsite), dm in rdm2.items():
+            entropy_2site = calc_vn_entropy(scipy.linalg.eigvalsh(dm))
             mut_entropy[isite, jsite] = (entropy_1site[isite] + entropy_1site[jsite] -
-                    entropy_2site[key]) / 2
+                    entropy_2site) / 2
         mut_entropy += mut_entropy.T
         return mut_entropy
 
@@ -1856,6 +2104,19 @@ def _mu_regularize(s, epsilon=1e-10):
     return s + epsilon * np.exp(-s / epsilon)
 
 
+def _expm_projected(h_mat, s_mat, v_norm, evolve_dt, eps=1e-12):
+    # exp(-iHt) in the non-orthogonal basis with overlap s_mat. The initial state is v_norm * basis[0].
+    # The basis is orthogonalized by canonical orthogonalization and
+    # the nearly linearly dependent directions are discarded
+    s_w, s_u = scipy.linalg.eigh(s_mat)
+    mask = s_w > eps * s_w.max()
+    x = s_u[:, mask] / np.sqrt(s_w[mask])
+    h_w, h_u = scipy.linalg.eigh(x.T.conj() @ h_mat @ x)
+    y0 = v_norm * x.T.conj() @ s_mat[:, 0]
+    y = h_u @ (np.exp(-1j * evolve_dt * h_w) * (h_u.T.conj() @ y0))
+    return x @ y
+
+
 def expand_bond_dimension(mps, hint_mpo=None, coef=1e-10, include_ex=True):
     """
     expand bond dimension as required in compress_config
@@ -2014,9 +2275,9 @@ def min_abs(t1, t2):
         return t2
 
 
-def _construct_freq_environ(mpos_hash: List[List[int]], hash_to_obj: Dict[int, Matrix], mps: Mps, domain: str, mps_conj):
+def _freq_environ_keys(mpos_hash: List[List[int]], domain: str, nsite: int) -> List[tuple]:
     """
-    Construct environment tensors that are most frequently shown in the group of MPOs
+    Find the MPO sequences whose environment tensors are most frequently shown in the group of MPOs
     """
     assert domain in ["L", "R"]
     # count mpo sequence frequency
@@ -2034,7 +2295,6 @@ def _construct_freq_environ(mpos_hash: List[List[int]], hash_to_obj: Dict[int, M
     # Note that shorter sequences are not less frequent than longer sequences
     most_common = list(counter.items())
     most_common.sort(key=lambda x: (-x[1], len(x[0])))
-    matrices_list = []
     hash_list = []
     for hashes, n in most_common:
         # discard unique ones because they do not need to be cached
@@ -2042,42 +2302,201 @@ def _construct_freq_environ(mpos_hash: List[List[int]], hash_to_obj: Dict[int, M
             break
         # cache ``len(mps)`` sequences
         # sequences with the same length may be treated differently.
-        if len(mps) < len(matrices_list):
+        if nsite < len(hash_list):
             break
         hash_list.append(hashes)
-        matrices_list.append(list(map(hash_to_obj.get, hashes)))
+    return hash_list
+
 
+def _construct_freq_environ(hash_list: List[tuple], hash_to_obj: Dict[int, Matrix], mps: Mps, domain: str, mps_conj):
+    """
+    Construct environment tensors that are most frequently shown in the group of MPOs
+    """
+    assert domain in ["L", "R"]
     # contract the tensors
     result = {(): xp.ones((1, 1, 1), dtype=backend.real_dtype)}
-    for m_hashes, matrices in zip(hash_list, matrices_list):
+    for m_hashes in hash_list:
         environ = result[tuple(m_hashes[:-1])]
         if domain == "L":
-            idx = len(matrices)-1
+            idx = len(m_hashes)-1
         else:
-            idx = -len(matrices)
+            idx = -len(m_hashes)
         ms, ms_conj = mps[idx], mps_conj[idx]
-        result[tuple(m_hashes)] = contract_one_site(environ, ms, matrices[-1], domain=domain, ms_conj=ms_conj)
+        result[tuple(m_hashes)] = contract_one_site(environ, ms, hash_to_obj[m_hashes[-1]], domain=domain, ms_conj=ms_conj)
     return result
 
 
-def _get_freq_environ(environ_dict, mpo, domain, max_length):
+def _get_freq_environ_key(environ_keys, mpo_hash, domain, max_length):
     assert domain in ["L", "R"]
 
     if domain == "L":
-        it = mpo
+        it = mpo_hash
     else:
-        it = reversed(mpo)
+        it = reversed(mpo_hash)
 
     hashes = []
-    for mo in it:
-        hashes.append(hash(mo))
-        if (not tuple(hashes) in environ_dict) or (max_length < len(hashes)):
+    for m_hash in it:
+        hashes.append(m_hash)
+        if (not tuple(hashes) in environ_keys) or (max_length < len(hashes)):
             hashes.pop()
             break
     if domain == "L":
         i = len(hashes) - 1
     else:
-        i = len(mpo) - len(hashes)
+        i = len(mpo_hash) - len(hashes)
+
+    return tuple(hashes), i
+
+
+def _contract_one_site_stacked(environ, ms, mos, ms_conj):
+    """
+    contract one mps(mpdm) site with a stack of mpo sites from the left.
+    ``environ`` is either shared by the stack or already stacked in the first axis.
+    """
+    ms, ms_conj = asxp(ms), asxp(ms_conj)
+    batch = "" if environ.ndim == 3 else "n"
+    if ms.ndim == 3:
+        expr = f"{batch}abc, adf, nbdeg, ceh -> nfgh"
+    elif ms.ndim == 4:
+        expr = f"{batch}abc, adlf, nbdeg, celh -> nfgh"
+    else:
+        raise ValueError(
+            f"MPS ndim is not 3 or 4, got {ms.ndim}"
+        )
+    return oe.contract(expr, environ, ms_conj, asxp(mos), ms)
+
+
+def _fp32_mpo(mpo: Mpo) -> Mpo:
+    # the single precision copy of a time-independent MPO is cast only once and stored on the MPO
+    cache = getattr(mpo, "_fp32_cache", None)
+    if cache is not None:
+        matrices, mpo_fp32 = cache
+        # the MPO might be modified after the cast, for example by OFS
+        if len(mpo) == len(matrices) and all(m1 is m2 for m1, m2 in zip(mpo, matrices)):
+            return mpo_fp32
+    mpo_fp32 = mpo.astype("fp32")
+    mpo._fp32_cache = (list(mpo), mpo_fp32)
+    return mpo_fp32
 
-    environ = environ_dict[tuple(hashes)]
-    return environ, i
+
+class ExpectationPlan:
+    r"""
+    Contraction plan to calculate the expectation values of a group of MPOs with
+    :meth:`Mps.expectations`. The plan only depends on the MPOs and can be reused
+    for different MPSs, such as the MPS at each time step.
+
+    The matrices of the MPOs are indexed by hash, so that the environments of MPO
+    sequences shared by many MPOs are only contracted once.
+    MPOs sharing the same left and right environments, such as all the on-site operators at the same site,
+    are stacked and contracted at once.
+
+    Parameters
+    ----------
+    mpos : list of :class:`~renormalizer.mps.Mpo`
+        The MPOs.
+    """
+    def __init__(self, mpos: List[Mpo]):
+        self.mpo_refs = [weakref.ref(mpo) for mpo in mpos]
+        self.mpo_matrices = [list(mpo) for mpo in mpos]
+
+        # hash is used as indices of the matrices.
+        # The chance for collision (the same hash for two different matrices) is
+        # about 1-0.99999999999997 in 1000 matrices.
+        # In which case a RuntimeError is raised and rerun the job should solve the problem
+        self.hash_to_obj: Dict[int, Matrix] = dict()
+        mpos_hash: List[List] = []
+        for mpo in self.mpo_matrices:
+            mpo_hash = []
+            for m in mpo:
+                m_hash = hash(m)
+                if m_hash not in self.hash_to_obj:
+                    self.hash_to_obj[m_hash] = m
+                else:
+                    if not np.allclose(self.hash_to_obj[m_hash], m.array):
+                        raise RuntimeError("Rare hash collision")
+                mpo_hash.append(m_hash)
+            mpos_hash.append(mpo_hash)
+
+        nsite = len(mpos[0]) if len(mpos) != 0 else 0
+        self.l_keys = _freq_environ_keys(mpos_hash, "L", nsite)
+        self.r_keys = _freq_environ_keys(mpos_hash, "R", nsite)
+        l_key_set, r_key_set = set(self.l_keys), set(self.r_keys)
+
+        # group the MPOs that share the same environments and the same shapes in between
+        groups = dict()
+        for i, mpo_hash in enumerate(mpos_hash):
+            l_key, l_idx = _get_freq_environ_key(l_key_set, mpo_hash, "L", np.inf)
+            r_key, r_idx = _get_freq_environ_key(r_key_set, mpo_hash, "R", len(mpo_hash)-l_idx-1)
+            shapes = tuple(self.hash_to_obj[h].shape for h in mpo_hash[l_idx+1:r_idx])
+            groups.setdefault((l_key, r_key, l_idx, r_idx, shapes), []).append(i)
+
+        # (l_key, r_key, l_idx, mpo indices, stacked mpo matrices for each site in between)
+        self.groups = []
+        for (l_key, r_key, l_idx, r_idx, shapes), indices in groups.items():
+            stacked = []
+            for j in range(l_idx+1, r_idx):
+                stacked.append(np.stack([self.mpo_matrices[i][j].array for i in indices]))
+            self.groups.append((l_key, r_key, l_idx, indices, stacked))
+
+    def __len__(self):
+        return len(self.mpo_matrices)
+
+    def match(self, mpos) -> bool:
+        """
+        Whether the plan is built for ``mpos``.
+        """
+        if len(mpos) != len(self):
+            return False
+        for ref, mpo, matrices in zip(self.mpo_refs, mpos, self.mpo_matrices):
+            if ref() is not mpo:
+                return False
+            # the MPO might be modified after the plan is built
+            if len(mpo) != len(matrices) or any(m1 is not m2 for m1, m2 in zip(mpo, matrices)):
+                return False
+        return True
+
+    def evaluate(self, mps: Mps, mps_conj: Mps) -> np.ndarray:
+        """
+        Calculate the expectation values of the MPOs.
+
+        Parameters
+        ----------
+        mps : :class:`Mps`
+            The ket.
+        mps_conj : :class:`Mps`
+            The (conjugated) bra.
+
+        Returns
+        -------
+        results : np.ndarray
+            The complex expectation values in the same order as the MPOs.
+        """
+        l_environ_dict = _construct_freq_environ(self.l_keys, self.hash_to_obj, mps, "L", mps_conj)
+        r_environ_dict = _construct_freq_environ(self.r_keys, self.hash_to_obj, mps, "R", mps_conj)
+        results = np.zeros(len(self), dtype=np.complex128)
+        for l_key, r_key, l_idx, indices, stacked in self.groups:
+            l_environ = l_environ_dict[l_key]
+            r_environ = r_environ_dict[r_key]
+            for i, mos in enumerate(stacked):
+                l_environ = _contract_one_site_stacked(l_environ, mps[l_idx+1+i], mos, mps_conj[l_idx+1+i])
+            l_environ = l_environ.reshape(-1, r_environ.size)
+            results[indices] = asnumpy(l_environ @ r_environ.flatten())
+        return results
+
+
+# MPO group -> plan. Plans are reused by later calls with the same MPOs
+_expectation_plans: "OrderedDict[tuple, ExpectationPlan]" = OrderedDict()
+MAX_EXPECTATION_PLANS = 16
+
+
+def _get_expectation_plan(mpos) -> ExpectationPlan:
+    key = tuple(map(id, mpos))
+    plan = _expectation_plans.get(key)
+    if plan is not None and plan.match(mpos):
+        _expectation_plans.move_to_end(key)
+        return plan
+    plan = ExpectationPlan(mpos)
+    _expectation_plans[key] = plan
+    if MAX_EXPECTATION_PLANS < len(_expectation_plans):
+        _expectation_plans.popitem(last=False)
+    return plan
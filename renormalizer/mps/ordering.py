@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Optimize the ordering of the DOFs on the MPS chain before the production calculation.
+
+A cheap DMRG with small bond dimension is performed to obtain the mutual information
+between the sites. The sites are then ordered by the Fiedler vector of the mutual information
+matrix, so that strongly entangled sites are placed close to each other and
+the bond dimension required for a target accuracy is reduced.
+
+For the ab initio Hamiltonian constructed by :func:`~renormalizer.model.h_qc.qc_model`
+the Jordan-Wigner strings are defined by the orbital indices.
+Permute the integrals with :func:`~renormalizer.model.h_qc.permute_integrals` and construct
+the model again instead of :func:`reorder_model`, so that the Jordan-Wigner strings follow the new chain.
+"""
+
+import logging
+from typing import List, Union
+
+import numpy as np
+import scipy.linalg
+
+from renormalizer.model import Model
+from renormalizer.mps.mps import Mps
+from renormalizer.mps.mpo import Mpo
+from renormalizer.mps.gs import optimize_mps
+
+
+logger = logging.getLogger(__name__)
+
+
+def fiedler_ordering(mutual_info: np.ndarray) -> np.ndarray:
+    r"""
+    Order the sites by the Fiedler vector of the mutual information matrix.
+
+    The mutual information matrix :math:`W` is regarded as the weight of a graph. The Fiedler vector is
+    the eigenvector of the second smallest eigenvalue of the graph Laplacian
+    :math:`L = D - W`, where :math:`D` is the diagonal degree matrix.
+
+    Parameters
+    ----------
+    mutual_info : np.ndarray
+        The symmetric mutual information matrix with shape ``(nsite, nsite)``.
+
+    Returns
+    -------
+    ordering : np.ndarray
+        The new ordering. ``ordering[i]`` is the original index of the ``i`` th site.
+    """
+    mutual_info = np.array(mutual_info, dtype=float)
+    assert mutual_info.ndim == 2 and mutual_info.shape[0] == mutual_info.shape[1]
+    nsite = len(mutual_info)
+    if nsite < 3:
+        return np.arange(nsite)
+    weight = np.abs(mutual_info + mutual_info.T) / 2
+    np.fill_diagonal(weight, 0)
+    laplacian = np.diag(weight.sum(axis=1)) - weight
+    _, v = scipy.linalg.eigh(laplacian)
+    fiedler = v[:, 1]
+    # fix the direction so that the result is deterministic
+    if fiedler[0] > fiedler[-1]:
+        fiedler = -fiedler
+    return np.argsort(fiedler, kind="stable")
+
+
+def calc_mutual_info_ordering(model: Model, qntot, m: int = 10, procedure: List = None,
+                              block_size: int = 1, mpo: Mpo = None, init_mps: Mps = None) -> np.ndarray:
+    r"""
+    Optimize the site ordering by the mutual information from a cheap DMRG calculation.
+
+    Parameters
+    ----------
+    model : :class:`~renormalizer.model.Model`
+        The model with the initial ordering.
+    qntot : int or list
+        The total quantum number of the ground state. Passed to :meth:`Mps.random`.
+    m : int
+        The bond dimension of the cheap DMRG calculation. Default is 10.
+    procedure : list, optional
+        The procedure of the cheap DMRG calculation. Default is 4 sweeps with bond dimension ``m``.
+    block_size : int
+        Number of consecutive sites that are kept together, such as the two spin orbitals
+        of a spatial orbital (``block_size=2``) for the ab initio Hamiltonian. The mutual information is
+        summed within each block. Default is 1.
+    mpo : :class:`~renormalizer.mps.Mpo`, optional
+        The Hamiltonian MPO of ``model``. Constructed if not provided.
+    init_mps : :class:`~renormalizer.mps.Mps`, optional
+        The initial guess of the cheap DMRG calculation, such as the Hartree-Fock state
+        for the ab initio Hamiltonian. Default is a random MPS with bond dimension ``m``.
+
+    Returns
+    -------
+    ordering : np.ndarray
+        The new ordering. ``ordering[i]`` is the original index of the ``i`` th site.
+    """
+    nsite = len(model.basis)
+    if nsite % block_size != 0:
+        raise ValueError(f"Number of sites {nsite} is not divisible by the block size {block_size}")
+    if mpo is None:
+        mpo = Mpo(model)
+    if procedure is None:
+        procedure = [[m, 0.4], [m, 0.2], [m, 0.1], [m, 0]]
+
+    if init_mps is None:
+        mps = Mps.random(model, qntot, m, percent=1.0)
+    else:
+        mps = init_mps.copy()
+    mps.optimize_config.procedure = procedure
+    mps.optimize_config.method = "2site"
+    energies, mps = optimize_mps(mps, mpo)
+    logger.info(f"Energy with the initial ordering: {min(energies)}")
+
+    mutual_info = mps.calc_2site_mutual_entropy()
+    nblock = nsite // block_size
+    block_info = mutual_info.reshape(nblock, block_size, nblock, block_size).sum(axis=(1, 3))
+    block_ordering = fiedler_ordering(block_info)
+    ordering = (block_ordering[:, None] * block_size + np.arange(block_size)).ravel()
+    logger.info(f"Optimized ordering: {ordering.tolist()}")
+    return ordering
+
+
+def reorder_model(model: Model, ordering: Union[List[int], np.ndarray]) -> Model:
+    r"""
+    Construct a new model with the basis reordered.
+    The output ordering of the new model is the same as the original model.
+
+    Parameters
+    ----------
+    model : :class:`~renormalizer.model.Model`
+        The original model.
+    ordering : list or np.ndarray
+        ``ordering[i]`` is the original index of the ``i`` th site.
+
+    Returns
+    -------
+    model : :class:`~renormalizer.model.Model`
+        The new model. MPOs should be constructed again with the new model.
+    """
+    ordering = list(ordering)
+    if sorted(ordering) != list(range(len(model.basis))):
+        raise ValueError(f"Invalid ordering: {ordering}")
+    new_basis = [model.basis[i] for i in ordering]
+    return Model(new_basis, model.ham_terms, model.dipole, model.output_ordering)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse representation of MPO site tensors.
+
+Most virtual bond pairs ``(b, f)`` of an MPO site ``W[b, d, e, f]`` constructed by
+:func:`~renormalizer.mps.symbolic_mpo.construct_symbolic_mpo` carry nothing or a
+(scaled) simple local operator such as the identity.
+:class:`SparseMo` keeps only the nonzero ``(b, f, local operator)`` entries, grouped
+by the local operator up to a factor, so that the effective Hamiltonian is applied
+as a few dense matrix multiplications over the virtual bonds.
+"""
+
+import logging
+from typing import List
+
+from renormalizer.mps.backend import np, xp
+from renormalizer.mps.matrix import asnumpy, asxp, tensordot
+
+
+logger = logging.getLogger(__name__)
+
+
+class SparseMo:
+    r"""
+    Sparse MPO site tensor.
+
+    Parameters
+    ----------
+    mo : np.ndarray
+        The dense MPO site tensor with shape ``(l, d, d, r)``.
+
+    Attributes
+    ----------
+    groups : list
+        Each element is a tuple ``(op, lidx, ridx, coef)``. ``op`` is the normalized
+        local operator, ``lidx`` and ``ridx`` are the left and right virtual bond indices
+        where ``op`` appears and ``coef`` with shape ``(len(lidx), len(ridx))`` contains
+        the factor of ``op`` at each virtual bond pair.
+    nnz : int
+        Number of nonzero virtual bond pairs.
+    """
+
+    def __init__(self, mo):
+        mo = asnumpy(mo)
+        assert mo.ndim == 4
+        self.shape = mo.shape
+        self.dtype = mo.dtype
+
+        nonzero = np.any(mo != 0, axis=(1, 2))
+        entries = np.argwhere(nonzero)
+        self.nnz = len(entries)
+
+        # group the entries by the normalized local operator
+        op_dict = {}
+        for b, f in entries:
+            op = mo[b, :, :, f]
+            coef = op.flat[np.argmax(np.abs(op))]
+            op = op / coef
+            key = op.tobytes()
+            if key not in op_dict:
+                op_dict[key] = (op, [])
+            op_dict[key][1].append((b, f, coef))
+
+        self.groups = []
+        for op, items in op_dict.values():
+            lidx = np.unique([b for b, f, coef in items])
+            ridx = np.unique([f for b, f, coef in items])
+            coef = np.zeros((len(lidx), len(ridx)), dtype=self.dtype)
+            for b, f, c in items:
+                coef[np.searchsorted(lidx, b), np.searchsorted(ridx, f)] += c
+            self.groups.append((asxp(op), lidx, ridx, asxp(coef)))
+
+    @property
+    def density(self) -> float:
+        """
+        Ratio of nonzero virtual bond pairs.
+        """
+        return self.nnz / (self.shape[0] * self.shape[-1])
+
+    def todense(self):
+        mo = np.zeros(self.shape, dtype=self.dtype)
+        for op, lidx, ridx, coef in self.groups:
+            mo[np.ix_(lidx, np.arange(self.shape[1]), np.arange(self.shape[2]), ridx)] += \
+                np.einsum("bf, de -> bdef", asnumpy(coef), asnumpy(op))
+        return mo
+
+    def apply(self, x, phys_axis: int):
+        r"""
+        Contract the MPO site with a tensor.
+
+        Parameters
+        ----------
+        x : xp.ndarray
+            The tensor to be contracted. The second axis is the left virtual bond of the MPO
+            and ``phys_axis`` is the physical bond to be contracted with
+            the last but one index of the MPO.
+
+        Returns
+        -------
+        y : xp.ndarray
+            The result tensor. The second axis becomes the right virtual bond of the MPO and
+            ``phys_axis`` becomes the first physical bond of the MPO.
+        """
+        assert x.shape[1] == self.shape[0]
+        assert x.shape[phys_axis] == self.shape[2]
+        y_shape = list(x.shape)
+        y_shape[1] = self.shape[-1]
+        y_shape[phys_axis] = self.shape[1]
+        dtype = np.result_type(x.dtype, self.dtype)
+        y = xp.zeros(y_shape, dtype=dtype)
+        for op, lidx, ridx, coef in self.groups:
+            xo = x[:, lidx]
+            # contract the virtual bond first. The physical bond stays at ``phys_axis``
+            zo = tensordot(coef, xo, axes=([0], [1]))
+            zo = tensordot(zo, op, axes=([phys_axis], [1]))
+            zo = xp.moveaxis(zo, -1, phys_axis)
+            y[:, ridx] += xp.moveaxis(zo, 0, 1)
+        return y
+
+    def __repr__(self):
+        return f"SparseMo(shape={self.shape}, nnz={self.nnz}, ngroups={len(self.groups)})"
+
+
+class SparseMpoHop:
+    r"""
+    Apply the effective Hamiltonian with sparse MPO sites for the 1-site and 2-site algorithms.
+    Has the same calling convention as the expression returned by
+    :func:`~renormalizer.mps.hop_expr.hop_expr`.
+
+    Parameters
+    ----------
+    ltensor : xp.ndarray
+        The left environment.
+    rtensor : xp.ndarray
+        The right environment.
+    sparse_mo : list of :class:`SparseMo`
+        The sparse MPO of the active sites.
+    """
+    def __init__(self, ltensor, rtensor, sparse_mo: List[SparseMo]):
+        assert len(sparse_mo) in [1, 2]
+        self.ltensor = asxp(ltensor)
+        self.rtensor = asxp(rtensor)
+        self.sparse_mo = sparse_mo
+
+    def __call__(self, cstruct):
+        nsite = len(self.sparse_mo)
+        # S-a
+        #
+        # O-b
+        #     e (h)
+        # S-c-C-k
+        x = tensordot(self.ltensor, asxp(cstruct), axes=([2], [0]))
+        for i, smo in enumerate(self.sparse_mo):
+            x = smo.apply(x, 2 + i)
+        # S-a   l-S
+        #   d (g)
+        # O-f  -f-O
+        #
+        #      k-S
+        return tensordot(x, self.rtensor, axes=([1, nsite + 2], [1, 2]))
@@ -4,10 +4,15 @@ import logging
 
 import scipy.linalg
 
-from renormalizer.mps.backend import np, backend
+from renormalizer.mps.backend import np
+from renormalizer.mps.matrix import canonical_tol
 
 logger = logging.getLogger(__name__)
 
+#: The minimum dimension of a quantum number block to be decomposed by randomized SVD
+#: when the target rank is given in :func:`svd_qn`.
+RANDOMIZED_SVD_MIN_DIM = 64
+
 
 def optimized_svd(a, full_matrices, opt_full_matrices):
     # optimize performance when ``full_matrices = opt_full_matrices = True``
@@ -49,17 +54,36 @@ def optimized_svd(a, full_matrices, opt_full_matrices):
     return U, S, Vt
 
 
+def randomized_svd(a, rank, n_oversamples=10, n_iter=2):
+    # the leading ``rank`` singular triplets by randomized range finding with power iterations.
+    # N. Halko, P. G. Martinsson and J. A. Tropp, SIAM Rev. 53, 217 (2011)
+    m, n = a.shape
+    if m < n:
+        v, s, ut = randomized_svd(a.T, rank, n_oversamples, n_iter)
+        return ut.T, s, v.T
+    # a fixed seed for reproducibility
+    rng = np.random.default_rng(2023)
+    omega = rng.standard_normal((n, min(rank + n_oversamples, n))).astype(a.dtype)
+    q, _ = scipy.linalg.qr(a @ omega, mode="economic")
+    for i in range(n_iter):
+        q, _ = scipy.linalg.qr(a.T.conj() @ q, mode="economic")
+        q, _ = scipy.linalg.qr(a @ q, mode="economic")
+    u, s, vt = scipy.linalg.svd(q.T.conj() @ a, full_matrices=False)
+    return (q @ u)[:, :rank], s[:rank], vt[:rank]
+
+
 def add_orthonormal_basis(u):
     # add `n` basis. `n` is empirical
     m, n = u.shape
     assert 2 * n < m
-    assert np.allclose(u.T.conj() @ u, np.eye(n), atol=backend.canonical_atol)
+    _, atol = canonical_tol(u.dtype)
+    assert np.allclose(u.T.conj() @ u, np.eye(n), atol=atol)
     a = np.random.rand(m,n)
     a = a - u @ (u.T.conj() @ a)
     q, _ = scipy.linalg.qr(a, mode='economic')
     res = np.concatenate([u, q], axis=1)
 
-    assert np.allclose(res.T.conj() @ res, np.eye(2 * n), atol=backend.canonical_atol)
+    assert np.allclose(res.T.conj() @ res, np.eye(2 * n), atol=atol)
     return res
 
 
@@ -104,7 +128,8 @@ def svd_qn(
         QR: bool=False,
         system: str=None,
         full_matrices: bool=True,
-        opt_full_matrices: bool=True
+        opt_full_matrices: bool=True,
+        rank: int=None,
 ):
     r""" Block decompose the coefficient array (l, sigmal, sigmar, r) or (l,sigma,r) by SVD/QR according to
     the quantum number.
@@ -137,6 +162,11 @@ def svd_qn(
         The optimized version does not calculate full matrices but adds a limited amount of
         additional orthonormal basis (in contrast to all of the basis when ``full_matrices=True``)
         to the decomposition.
+    rank: int
+        The number of singular values to be kept after the decomposition if known in advance.
+        If set and ``full_matrices=False``, the quantum number blocks much larger than ``rank``
+        are decomposed by randomized SVD and at most ``rank`` singular values are obtained for them.
+        Default is ``None`` which means full SVD for all blocks.
 
     Returns
     -------
@@ -184,7 +214,12 @@ def svd_qn(
             (lset * coef_matrix.shape[1]).reshape(-1, 1) + rset
         )
         dim = min(block.shape)
-        if SVD:
+        if SVD and rank is not None and not full_matrices \
+                and RANDOMIZED_SVD_MIN_DIM <= dim and 2 * rank <= dim:
+            block_u, block_s, block_vt = randomized_svd(block, rank)
+            block_s_list.append(block_s)
+            dim = rank
+        elif SVD:
             block_u, block_s, block_vt = optimized_svd(
                 block,
                 full_matrices=full_matrices,
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
 import itertools
+import os
+import pickle
+import tempfile
 from collections import namedtuple, OrderedDict
 from typing import List, Set, Tuple, Dict
 
@@ -112,18 +116,18 @@ def construct_symbolic_mpo(table, factor, algo="Hopcroft-Karp"):
         mpoqn = [np.zeros((1, qn_size), dtype=int)]
         primary_ops = list(set(table[0]))
         op2idx = dict(zip(primary_ops, range(len(primary_ops))))
-        out_ops_list: List[List[OpTuple]] = [[OpTuple([0], qn=0, factor=1)]]
+        out_ops_list: List[List[List[OpTuple]]] = [[[OpTuple([0], qn=np.zeros(qn_size, dtype=int), factor=1)]]]
         for op in table[0]:
             mo = np.full((1, 1), None)
             mo[0][0] = [op]
             mpo.append(mo)
             qn = mpoqn[-1][0] + op.qn
             mpoqn.append(np.array([qn]))
-            out_ops_list.append([OpTuple([0, op2idx[op]], qn=qn, factor=1)])
+            out_ops_list.append([[OpTuple([0, op2idx[op]], qn=qn, factor=1)]])
 
         mpo[-1][0][0][0] = factor[0] * mpo[-1][0][0][0]
-        last_optuple = out_ops_list[-1][0]
-        out_ops_list[-1][0] = OpTuple(last_optuple.symbol, qn=last_optuple.qn, factor=factor[0]*last_optuple.factor)
+        last_optuple = out_ops_list[-1][0][0]
+        out_ops_list[-1][0][0] = OpTuple(last_optuple.symbol, qn=last_optuple.qn, factor=factor[0]*last_optuple.factor)
         qntot = qn
         mpoqn[-1] = np.zeros((1, qn_size), dtype=int)
         qnidx = len(mpo) - 1
@@ -134,6 +138,12 @@ def construct_symbolic_mpo(table, factor, algo="Hopcroft-Karp"):
     logger.debug(f"Input operator terms: {len(table)}")
 
     table, factor, primary_ops = _transform_table(table, factor)
+    return _construct_symbolic_mpo_transformed(table, factor, primary_ops, algo)
+
+
+def _construct_symbolic_mpo_transformed(table, factor, primary_ops, algo):
+    # the integer table produced by `_transform_table`
+    qn_size = len(primary_ops[0].qn)
 
     # add the first and last column for convenience
     ta = np.zeros((table.shape[0], 1), dtype=np.uint16)
@@ -165,6 +175,141 @@ def construct_symbolic_mpo(table, factor, algo="Hopcroft-Karp"):
     return mpo, mpoqn, qntot, qnidx, out_ops_list, primary_ops
 
 
+def construct_symbolic_mpo_template(table, algo="Hopcroft-Karp"):
+    r"""
+    Construct the symbolic MPO with the factors of the terms as parameters.
+
+    The structure of the symbolic MPO does not depend on the values of the factors.
+    Each factor in ``out_ops_list`` is either 1 or the combined factor of exactly one term,
+    so the construction is performed once with the labels ``-(k+1)`` of the combined terms as the factors and
+    the actual factors are substituted by :func:`evaluate_symbolic_mpo_template`.
+
+    Args:
+
+    table: an operator table with shape (operator nterm, nsite). Same as :func:`construct_symbolic_mpo`.
+    algo: the algorithm used to select local ops.
+
+    Returns:
+
+    symbolic_mpo: the same as the return value of :func:`construct_symbolic_mpo`,
+        with the labels of the combined terms as the factors.
+    term_inverse (np.ndarray): the index of the combined term of each input term.
+    unique_table (np.ndarray): the integer table of the combined terms.
+        The integers are indices of ``primary_ops``.
+    """
+    logger.debug(f"symbolic mpo algorithm: {algo}")
+    logger.debug(f"Input operator terms: {len(table)}")
+
+    unique_table, _, primary_ops, term_inverse = _transform_table(table, np.ones(len(table)), return_inverse=True)
+    labels = -np.arange(1, len(unique_table) + 1, dtype=np.float64)
+    if len(unique_table) == 1:
+        symbolic_mpo = construct_symbolic_mpo([[primary_ops[i] for i in unique_table[0]]], labels, algo)
+        # the fast path defines its own primary ops
+        op2idx = dict(zip(symbolic_mpo[-1], range(len(symbolic_mpo[-1]))))
+        unique_table = np.array([[op2idx[primary_ops[i]] for i in unique_table[0]]], dtype=np.uint16)
+    else:
+        symbolic_mpo = _construct_symbolic_mpo_transformed(unique_table, labels, primary_ops, algo)
+    return symbolic_mpo, term_inverse, unique_table
+
+
+def evaluate_symbolic_mpo_template(out_ops_template, primary_ops, factor, term_inverse):
+    r"""
+    Substitute the factors of the terms into the symbolic MPO template
+    constructed by :func:`construct_symbolic_mpo_template`.
+
+    Args:
+
+    out_ops_template: ``out_ops_list`` of the template.
+    primary_ops: ``primary_ops`` of the template.
+    factor (np.ndarray): the prefactor of each input term.
+    term_inverse (np.ndarray): the index of the combined term of each input term.
+
+    Returns:
+
+    mpo: the symbolic MPO.
+    out_ops_list: ``out_ops_list`` with the combined factors.
+    """
+    factor = np.asarray(factor)
+    assert len(factor) == len(term_inverse)
+    combined_factor = np.zeros(np.max(term_inverse) + 1, dtype=factor.dtype)
+    np.add.at(combined_factor, term_inverse, factor)
+
+    out_ops_list = []
+    for out_ops in out_ops_template:
+        new_out_ops = []
+        for out_op in out_ops:
+            new_out_op = []
+            for op in out_op:
+                if op.factor < 0:
+                    op = op._replace(factor=combined_factor[int(round(-op.factor)) - 1])
+                new_out_op.append(op)
+            new_out_ops.append(new_out_op)
+        out_ops_list.append(new_out_ops)
+
+    mpo = []
+    for i in range(len(out_ops_list) - 1):
+        mpo.append(compose_symbolic_mo(out_ops_list[i], out_ops_list[i+1], primary_ops))
+    return mpo, out_ops_list
+
+
+def table_to_int(table, primary_ops) -> np.ndarray:
+    r"""
+    Translate the operator table to the integer table with the indices of ``primary_ops``.
+    Raises ``ValueError`` if an operator is not in ``primary_ops``.
+    """
+    op2idx = dict(zip(primary_ops, range(len(primary_ops))))
+    try:
+        return np.array([[op2idx[op] for op in row] for row in table], dtype=np.uint16)
+    except KeyError as e:
+        raise ValueError(f"Operator {e} is not in the primary operators of the symbolic MPO")
+
+
+def symbolic_mpo_key(table, algo="Hopcroft-Karp") -> str:
+    """
+    A stable hash of the input of :func:`construct_symbolic_mpo_template`.
+    The table contains the operators of each term on each site (including the identities
+    with the DoF names of each site), so the key covers the ordering of the basis,
+    the ordered terms and whether there is a constant offset.
+    The factors of the terms are not included.
+    """
+    h = hashlib.sha256()
+    h.update(algo.encode())
+    for row in table:
+        row_tuple = [(op.symbol, op.dofs, float(op.factor), np.array(op.qn_list).tolist()) for op in row]
+        h.update(repr(row_tuple).encode())
+    return h.hexdigest()
+
+
+def cached_construct_symbolic_mpo_template(table, cache_dir, algo="Hopcroft-Karp"):
+    """
+    :func:`construct_symbolic_mpo_template` with an on-disk cache in ``cache_dir``, keyed by :func:`symbolic_mpo_key`.
+    Different processes could share the same ``cache_dir``. The cache files are written atomically.
+    """
+    fname = os.path.join(cache_dir, f"symbolic_mpo_{symbolic_mpo_key(table, algo)}.pickle")
+    if os.path.exists(fname):
+        try:
+            with open(fname, "rb") as fin:
+                res = pickle.load(fin)
+            logger.debug(f"symbolic mpo loaded from {fname}")
+            return res
+        except Exception as e:
+            logger.warning(f"Failed to load symbolic mpo from {fname}: {e}. Constructing again.")
+
+    res = construct_symbolic_mpo_template(table, algo)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_fname = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fout:
+            pickle.dump(res, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fname, fname)
+        logger.debug(f"symbolic mpo dumped to {fname}")
+    except OSError as e:
+        logger.warning(f"Failed to dump symbolic mpo to {fname}: {e}")
+        if os.path.exists(tmp_fname):
+            os.remove(tmp_fname)
+    return res
+
+
 def _construct_symbolic_mpo(table, in_ops, factor, primary_ops, algo="Hopcroft-Karp"):
 
     nsite = table.shape[1] - 2
@@ -340,7 +485,7 @@ def _terms_to_table(model: Model, terms: List[Op], const: float):
     return table, factor_list
 
 
-def _transform_table(table, factor):
+def _transform_table(table, factor, return_inverse=False):
     """Transforms the table to integer table and combine duplicate terms."""
 
     # use np.uint32, np.uint16 to save memory
@@ -390,6 +535,8 @@ def _transform_table(table, factor):
     # check the index of interaction could be represented with np.uint32
     assert table.shape[0] < max_uint32
 
+    if return_inverse:
+        return np.array(unique_term), factor, primary_ops, unique_inverse.ravel()
     return np.array(unique_term), factor, primary_ops
 
 
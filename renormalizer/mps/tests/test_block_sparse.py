@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.block_sparse import BlockSparseTensor, BlockSparseHop
+from renormalizer.mps.hop_expr import hop_expr, hop_expr_cache_info, clear_hop_expr_cache
+from renormalizer.mps.lib import Environ
+from renormalizer.mps.matrix import asnumpy, tensordot
+from renormalizer.mps.svd_qn import get_qn_mask
+from renormalizer.tests.parameter import holstein_model
+
+
+def test_block_sparse_tensor():
+    mps = Mps.random(holstein_model, 1, 10)
+    mps.ensure_left_canonical()
+    idx = mps.site_num - 1
+    qn_list = mps._get_qn_list([idx])
+    qnbigl, qnbigr, qnmat = mps._get_big_qn([idx])
+    qn_mask = get_qn_mask(qnmat, mps.qntot)
+    array = mps[idx].array
+    bst = BlockSparseTensor.from_dense(array, qn_list, mps.qntot)
+    assert bst.shape == array.shape
+    assert bst.nnz == qn_mask.sum()
+    assert np.allclose(bst.todense(), np.where(qn_mask, array, 0))
+    assert bst.norm() == pytest.approx(np.linalg.norm(array[qn_mask]))
+
+
+@pytest.mark.parametrize("nsite", (1, 2))
+def test_block_sparse_hop(nsite):
+    mps = Mps.random(holstein_model, 1, 10)
+    mpo = Mpo(holstein_model)
+    mps.ensure_right_canonical()
+    environ = Environ(mps, mpo, "R")
+    cidx = list(range(nsite))
+    ltensor = environ.read("L", -1)
+    rtensor = environ.read("R", nsite)
+    cmo = [mpo[i].array for i in cidx]
+    cms = mps[0].array
+    if nsite == 2:
+        cms = asnumpy(tensordot(cms, mps[1].array, axes=1))
+    qnbigl, qnbigr, qnmat = mps._get_big_qn(cidx)
+    qn_mask = get_qn_mask(qnmat, mps.qntot)
+    cms = np.where(qn_mask, cms, 0)
+    dense = hop_expr(ltensor, rtensor, cmo, cms.shape)(cms)
+    hop = BlockSparseHop(ltensor, rtensor, cmo, mps._get_qn_list(cidx), mps.qntot)
+    sparse = hop(cms)
+    assert np.allclose(asnumpy(dense)[qn_mask], asnumpy(sparse)[qn_mask])
+    assert np.allclose(asnumpy(sparse)[~qn_mask], 0)
+
+
+def test_block_sparse_hop_plan_cache():
+    mps = Mps.random(holstein_model, 1, 10)
+    mpo = Mpo(holstein_model)
+    mps.ensure_right_canonical()
+    environ = Environ(mps, mpo, "R")
+    args = (environ.read("L", -1), environ.read("R", 2), [mpo[0].array, mpo[1].array],
+            mps._get_qn_list([0, 1]), mps.qntot)
+    clear_hop_expr_cache()
+    hop = BlockSparseHop(*args)
+    misses = hop_expr_cache_info().misses
+    # blocks of the same shape share the contraction path
+    assert 0 < misses < len(hop.tasks)
+    BlockSparseHop(*args)
+    assert hop_expr_cache_info().misses == misses
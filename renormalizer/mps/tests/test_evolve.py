@@ -69,9 +69,10 @@ def check_result(mps, mpo, time_step, final_time, atol=1e-4):
 
 
 @pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
-def test_pc(init_state):
+@pytest.mark.parametrize("contract_algo", ("svd", "zipup", "density_matrix"))
+def test_pc(init_state, contract_algo):
     mps = init_state.copy()
-    mps.compress_config  = CompressConfig(CompressCriteria.fixed)
+    mps.compress_config  = CompressConfig(CompressCriteria.fixed, contract_algo=contract_algo)
     check_result(mps, mpo, 0.2, 5)
 
 @pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
@@ -95,6 +96,16 @@ def test_pc_tdrk(init_state, rk_solver):
     mps.compress_config  = CompressConfig(CompressCriteria.fixed)
     check_result(mps, mpo, 0.2, 5)
 
+@pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
+@pytest.mark.parametrize("algo", ("variational", "svd"))
+def test_krylov(init_state, algo):
+    mps = init_state.copy()
+    mps.evolve_config = EvolveConfig(EvolveMethod.krylov)
+    mps.evolve_config.krylov_contract_algo = algo
+    mps.compress_config = CompressConfig(CompressCriteria.fixed)
+    # much larger time step than P&C
+    check_result(mps, mpo, 1, 5)
+
 @pytest.mark.parametrize("init_state, atol", ([init_mps, 1e-4], [init_mpdm, 1e-3]))
 @pytest.mark.parametrize("with_mu", (True, False))
 @pytest.mark.parametrize("force_ovlp", (True, False))
@@ -108,6 +119,19 @@ def test_tdvp_vmf(init_state, with_mu, force_ovlp, atol):
     check_result(mps, mpo, 0.5, 2, atol)
 
 
+@pytest.mark.parametrize("with_mu", (True, False))
+def test_tdvp_vmf_workers(with_mu):
+    method = EvolveMethod.tdvp_mu_vmf if with_mu else EvolveMethod.tdvp_vmf
+    results = []
+    for workers in [1, 2]:
+        mps = init_mps.copy()
+        mps.evolve_config = EvolveConfig(method, ivp_rtol=1e-4, ivp_atol=1e-7)
+        mps.evolve_config.vmf_auto_switch = False
+        mps.evolve_config.vmf_workers = workers
+        results.append(mps.evolve(mpo, 0.5))
+    assert results[0].distance(results[1]) == pytest.approx(0, abs=1e-10)
+
+
 @pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
 @pytest.mark.parametrize("tdvp_cmf_c_trapz", (True, False))
 @pytest.mark.parametrize("solver", ("krylov", "RK45"))
@@ -145,6 +169,58 @@ def test_tdvp_ps2(init_state, mpo, solver):
     assert max(mps.bond_dims) == 5
 
 
+@pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
+def test_tdvp_ps_cbe(init_state):
+    mps = init_state.copy()
+    mps.evolve_config = EvolveConfig(EvolveMethod.tdvp_ps_cbe)
+    check_result(mps, mpo, 0.4, 5)
+
+
+def test_tdvp_ps_cbe_expansion():
+    # a state with too small bond dimension to capture the dynamics
+    init = init_mps.copy()
+    init.compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=2)
+    init.canonicalise().compress()
+    occupations = []
+    for method in [EvolveMethod.tdvp_ps_cbe, EvolveMethod.tdvp_ps2]:
+        mps = init.copy()
+        mps.evolve_config = EvolveConfig(method)
+        mps.compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=10)
+        occupations.append([])
+        for i in range(10):
+            mps = mps.evolve(mpo, 0.4)
+            occupations[-1].append(mps.e_occupations)
+        if method is EvolveMethod.tdvp_ps_cbe:
+            assert max(mps.bond_dims) > max(init.bond_dims)
+    np.testing.assert_allclose(occupations[0], occupations[1], atol=1e-4)
+
+
+@pytest.mark.parametrize("method", (EvolveMethod.tdvp_ps, EvolveMethod.tdvp_ps2))
+def test_tdvp_ps_fp32(method):
+    mps = init_mps.copy()
+    mps.evolve_config = EvolveConfig(method)
+    mps.evolve_config.precision = "fp32"
+    mps = check_result(mps, mpo, 0.4, 5)
+    assert mps.dtype == np.complex128 and mps[0].dtype == np.complex128
+
+
+def test_tdvp_ps_fp32_mpo_cache():
+    mps = init_mps.copy()
+    mps.evolve_config = EvolveConfig(EvolveMethod.tdvp_ps)
+    mps.evolve_config.precision = "fp32"
+    mpo_copy = mpo.copy()
+    mps = mps.evolve(mpo_copy, 0.4)
+    mpo_fp32 = mpo_copy._fp32_cache[1]
+    assert mpo_fp32[0].dtype == np.float32
+    # the single precision MPO is reused in the following steps
+    mps = mps.evolve(mpo_copy, 0.4)
+    assert mpo_copy._fp32_cache[1] is mpo_fp32
+    # and recast if the MPO is modified
+    mpo_copy[0] = mpo_copy[0].copy()
+    mps = mps.evolve(mpo_copy, 0.4)
+    assert mpo_copy._fp32_cache[1] is not mpo_fp32
+
+
 @pytest.mark.parametrize("init_state, mpo", (
         [init_mps, mpo],
         [init_mpdm, mpo],
@@ -161,6 +237,19 @@ def test_ofs(init_state, mpo):
     mps = check_result(mps, mpo, 0.4, 5, atol=1e-4)
     assert max(mps.bond_dims) == 5
 
+def test_ofs_with_offset():
+    mps = init_mps.copy()
+    mps.model = Model(mps.model.basis, mps.model.ham_terms)
+    mpo_with_offset = Mpo(mps.model).with_offset(Quantity(mpo.offset))
+    assert np.allclose(mpo_with_offset.todense(), mpo.todense())
+    mps.evolve_config = EvolveConfig(EvolveMethod.tdvp_ps2)
+    mps.compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=5, ofs=OFS.ofs_s)
+    mps = check_result(mps, mpo_with_offset, 0.4, 5, atol=1e-4)
+    assert [b.dofs for b in mpo_with_offset.model.basis] != [b.dofs for b in model.basis]
+    # the site tensors are consistent with the swapped model
+    assert np.allclose(mpo_with_offset.todense(), Mpo(mpo_with_offset.model, offset=Quantity(mpo.offset)).todense())
+
+
 # used for debugging
 def compare():
     dt_list = [0.01, 0.02, 0.05, 0.1, 0.2, 0.4]
@@ -147,6 +147,35 @@ def test_qc(with_ofs, stacked):
     assert np.allclose(gs_e, fci_e, atol=5e-3)
 
 
+def test_subspace_expansion():
+    np.random.seed(2023)
+    mps = Mps.random(holstein_model, nexciton, 2)
+    mps.optimize_config.procedure = procedure
+    mps.optimize_config.method = "1site"
+    mps.optimize_config.expansion_alpha = 1e-3
+    mpo = Mpo(holstein_model)
+    energies, mps_opt = optimize_mps(mps.copy(), mpo)
+    assert energies[-1] == pytest.approx(GS_E, rel=1e-5)
+    assert mps_opt.expectation(mpo) == pytest.approx(GS_E, rel=1e-5)
+    # the bond dimension grows from 2 to the target of the last sweep with the perturbation
+    assert max(mps_opt.bond_dims) >= procedure[2][0]
+
+
+@pytest.mark.parametrize("stacked", (True, False))
+def test_mixed_precision(stacked):
+    mps, mpo = construct_mps_mpo(holstein_model, procedure[0][0], nexciton)
+    mps.optimize_config.procedure = [[10, 0.4, "fp32"], [20, 0.2, "fp32"], [30, 0.1, "fp32"], [40, 0], [40, 0]]
+    if stacked:
+        mpo = StackedMpo([mpo, mpo])
+    energies, mps_opt = optimize_mps(mps.copy(), mpo)
+    if stacked:
+        energies = np.array(energies) / 2
+        mpo = mpo.mpos[0]
+    assert energies[-1] == pytest.approx(GS_E, rel=1e-5)
+    assert mps_opt.dtype == np.float64 and mps_opt[0].dtype == np.float64
+    assert mps_opt.expectation(mpo) == pytest.approx(GS_E, rel=1e-5)
+
+
 def test_stackedmpo():
     scheme = 1
     method = '1site'
@@ -193,3 +222,17 @@ def test_pyscf_solver():
     assert casci.e_tot == pytest.approx(e_ref, abs=1e-2)
     np.testing.assert_allclose(rdm1, rdm1_ref, atol=1e-2)
     np.testing.assert_allclose(rdm2, rdm2_ref, atol=1e-2)
+
+
+def test_hop_expr_cache():
+    from renormalizer.mps.hop_expr import clear_hop_expr_cache, hop_expr_cache_info
+    clear_hop_expr_cache()
+    np.random.seed(2023)
+    mps = Mps.random(holstein_model, nexciton, 10)
+    mps.optimize_config.procedure = [[10, 0]] * 6
+    energies, _ = optimize_mps(mps, Mpo(holstein_model))
+    assert min(energies) == pytest.approx(GS_E, rel=1e-3)
+    info = hop_expr_cache_info()
+    # the path is found once for each distinct shape
+    assert info.misses == info.currsize
+    assert info.hits > info.misses
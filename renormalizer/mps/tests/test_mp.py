@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import os
+import weakref
 
 import numpy as np
 import pytest
 
 from renormalizer.mps import Mps, Mpo, MpDm
 from renormalizer.mps.matrix import tensordot, asnumpy
-from renormalizer.mps.lib import Environ
+from renormalizer.mps.lib import Environ, DiskEnvironStore
+from renormalizer.mps.gs import optimize_mps
+from renormalizer.mps.mp import flush_dump, _pending_writes, _prefetched
 from renormalizer.tests.parameter import custom_model, holstein_model
 from renormalizer.utils import CompressCriteria
 
@@ -59,6 +62,68 @@ def test_environ():
         e = complex(tensordot(l, r, axes=((0, 1, 2), (0, 1, 2)))).real
         assert pytest.approx(e) == mps.expectation(mpo)
 
+def test_environ_disk(tmp_path):
+    mps = Mps.random(holstein_model, 1, 10)
+    mpo = Mpo(holstein_model)
+    mps = mps.evolve(mpo, 10)
+    environ = Environ(mps, mpo)
+    store = DiskEnvironStore(1, tmp_path)
+    environ_disk = Environ(mps, mpo, store=store)
+    # only the most recent block is kept in memory
+    assert len(store._data) == 1
+    for i in range(len(mps)-1):
+        environ_disk.prefetch("R", i+2)
+        for domain, idx in [("L", i), ("R", i+1)]:
+            assert np.allclose(asnumpy(environ.read(domain, idx)), asnumpy(environ_disk.read(domain, idx)))
+    store.close()
+    assert not os.path.exists(store._dump_dir)
+
+    # the memory limit from compress config
+    mps.compress_config.environ_memory_limit = "1 kb"
+    mps.compress_config.dump_matrix_dir = str(tmp_path)
+    mps.optimize_config.procedure = [[10, 0.4], [20, 0.2], [30, 0.1], [40, 0], [40, 0]]
+    energies, _ = optimize_mps(mps, mpo)
+    assert energies[-1] == pytest.approx(0.08401412 + holstein_model.gs_zpe, rel=1e-5)
+
+def test_environ_disk_memory(tmp_path):
+    limit = 2500
+    store = DiskEnvironStore(limit, tmp_path)
+    refs = []
+    for i in range(10):
+        array = np.full(125, i, dtype=np.float64)
+        refs.append(weakref.ref(array))
+        store.write(("L", i), array)
+        del array
+    # wait for the pending writing
+    store._executor.submit(lambda: None).result()
+    assert not store._spilling
+    held = sum(ref().nbytes for ref in refs if ref() is not None)
+    assert held <= limit
+    for i in range(10):
+        assert np.allclose(store.read(("L", i)), i)
+    store.close()
+
+
+def test_dump_write_behind_prefetch(tmp_path):
+    mps = Mps.random(holstein_model, 1, 10)
+    arrays = [mt.array.copy() for mt in mps]
+    mps.compress_config.dump_matrix_size = 1
+    mps.compress_config.dump_matrix_dir = str(tmp_path)
+    for i, array in enumerate(arrays):
+        mps[i] = array
+    flush_dump()
+    assert all(isinstance(mt, str) and os.path.exists(mt) for mt in mps._mp)
+    assert not any(path in _pending_writes for path in mps._mp)
+    mps.to_right = True
+    assert np.allclose(mps[0].array, arrays[0])
+    # the next sites are loaded in the background
+    assert mps._mp[1] in _prefetched and mps._mp[2] in _prefetched
+    for i, array in enumerate(arrays):
+        assert np.allclose(mps[i].array, array)
+    dump_dir = os.path.dirname(mps._mp[0])
+    del mps
+    assert not os.path.exists(dump_dir)
+
 # multi_mpo routine for single mpo calculation
 @pytest.mark.parametrize("mpdm", (True, False))
 def test_environ_multi_mpo(mpdm):
@@ -114,6 +179,86 @@ def test_svd_compress(comp, mp):
     assert np.allclose(svd_mps.mp_norm, std_mps.mp_norm, atol=1e-4)
     
     
+def test_randomized_svd_qn():
+    from renormalizer.mps.svd_qn import svd_qn
+    np.random.seed(2023)
+    # low rank blocks with a tail of small singular values
+    qnbigl = np.random.randint(0, 2, (200, 1))
+    qnbigr = np.random.randint(0, 2, (300, 1))
+    a = np.random.rand(200, 8) @ np.random.rand(8, 300) + 1e-6 * np.random.rand(200, 300)
+    a[(qnbigl + qnbigr.T != 1)] = 0
+    u1, s1, _, v1, _, _ = svd_qn(a, qnbigl, qnbigr, np.array([1]), full_matrices=False)
+    u2, s2, _, v2, _, _ = svd_qn(a, qnbigl, qnbigr, np.array([1]), full_matrices=False, rank=10)
+    assert len(s2) == 20
+    np.testing.assert_allclose(s2[:10], s1[:10], rtol=1e-8)
+    np.testing.assert_allclose((u2 * s2) @ v2.T, a, atol=1e-4)
+
+
+@pytest.mark.parametrize("mp", ("mps", "mpdm"))
+def test_randomized_svd_compress(mp, monkeypatch):
+    from renormalizer.mps import svd_qn
+    monkeypatch.setattr(svd_qn, "RANDOMIZED_SVD_MIN_DIM", 8)
+    calls = []
+    randomized_svd = svd_qn.randomized_svd
+    def wrapped_randomized_svd(*args, **kwargs):
+        calls.append(args[0].shape)
+        return randomized_svd(*args, **kwargs)
+    monkeypatch.setattr(svd_qn, "randomized_svd", wrapped_randomized_svd)
+    mps = Mps.random(holstein_model, 1, 20)
+    if mp == "mpdm":
+        mps = MpDm.from_mps(mps)
+    mps.canonicalise().normalize("mps_only")
+    mpo = Mpo(holstein_model)
+    std_mps = mpo.apply(mps, canonicalise=True).canonicalise()
+    mps.compress_config.bond_dim_max_value = 10
+    mps.compress_config.criteria = CompressCriteria.fixed
+    svd_mps = mpo.contract(mps)
+    assert not calls
+    mps.compress_config.randomized_svd = True
+    rsvd_mps = mpo.contract(mps)
+    assert calls
+    assert rsvd_mps.bond_dims == svd_mps.bond_dims
+    dis1 = svd_mps.distance(std_mps)
+    dis2 = rsvd_mps.distance(std_mps)
+    assert dis2 == pytest.approx(dis1, rel=1e-3)
+
+
+@pytest.mark.parametrize("comp", (True, False))
+@pytest.mark.parametrize("mp", ("mps", "mpdm", "mpo"))
+@pytest.mark.parametrize("algo", ("zipup", "density_matrix"))
+def test_sweep_contract(comp, mp, algo):
+    if mp == "mpo":
+        mps = Mpo(holstein_model)
+        M = 22
+    else:
+        mps = Mps.random(holstein_model, 1, 10)
+        if mp == "mpdm":
+            mps = MpDm.from_mps(mps)
+        mps.canonicalise().normalize("mps_only")
+        M = 36
+    if comp:
+        mps = mps.to_complex(inplace=True)
+
+    mpo = Mpo(holstein_model)
+    if comp:
+        mpo = mpo.scale(-1.0j)
+
+    std_mps = mpo.apply(mps, canonicalise=True).canonicalise()
+    mps.compress_config.bond_dim_max_value = M
+    mps.compress_config.criteria = CompressCriteria.fixed
+    mps.compress_config.contract_algo = algo
+    new_mps = mpo.contract(mps)
+    dis = new_mps.distance(std_mps)/std_mps.mp_norm
+    assert np.allclose(dis, 0.0, atol=1e-3)
+    assert np.allclose(new_mps.mp_norm, std_mps.mp_norm, atol=1e-4)
+    assert max(new_mps.bond_dims) <= M
+    # the quantum numbers are consistent. Otherwise the symmetry-allowed blocks are lost in compression
+    assert new_mps.qntot == std_mps.qntot
+    new_mps.canonicalise().compress()
+    dis = new_mps.distance(std_mps)/std_mps.mp_norm
+    assert np.allclose(dis, 0.0, atol=1e-3)
+
+
 @pytest.mark.parametrize("comp", (True, False))
 @pytest.mark.parametrize("mp", ("mps", "mpdm", "mpo" ))
 def test_variational_compress(comp, mp):
@@ -10,7 +10,7 @@ import pytest
 
 from renormalizer.model import Mol, Phonon, HolsteinModel, Model, Op
 from renormalizer.model.basis import BasisHalfSpin
-from renormalizer.mps import Mpo, Mps
+from renormalizer.mps import Mpo, Mps, StackedMpo
 from renormalizer.mps.tests import cur_dir
 from renormalizer.tests.parameter import holstein_model
 from renormalizer.utils import Quantity
@@ -95,12 +95,77 @@ def test_offset(scheme):
     assert np.allclose(evals1 - offset.as_au(), evals2)
 
 
+@pytest.mark.parametrize("scheme", (1, 4))
+def test_with_offset(scheme):
+    ph = Phonon.simple_phonon(Quantity(3.33), Quantity(1), 2)
+    m = Mol(Quantity(0), [ph] * 2)
+    mlist = HolsteinModel([m] * 2, Quantity(17), scheme=scheme)
+    mpo1 = Mpo(mlist, offset=Quantity(0.1))
+    for offset in [Quantity(0.123), Quantity(0)]:
+        mpo2 = mpo1.with_offset(offset)
+        assert mpo2.offset == offset.as_au()
+        assert mpo2.bond_dims == mpo1.bond_dims
+        assert np.allclose(mpo2.todense(), Mpo(mlist, offset=offset).todense())
+    # the original MPO is not changed
+    assert np.allclose(mpo1.todense(), Mpo(mlist, offset=Quantity(0.1)).todense())
+    mpo1.with_offset(Quantity(0.2), inplace=True)
+    assert np.allclose(mpo1.todense(), Mpo(mlist, offset=Quantity(0.2)).todense())
+
+    stacked_mpo = StackedMpo([Mpo(mlist), Mpo(mlist, offset=Quantity(0.1))])
+    stacked_mpo2 = stacked_mpo.with_offset(Quantity(0.5))
+    assert stacked_mpo2.offset == pytest.approx(0.5)
+    dense = sum(mpo.todense() for mpo in stacked_mpo2.mpos)
+    assert np.allclose(dense, 2 * Mpo(mlist, offset=Quantity(0.25)).todense())
+
+
 def test_identity():
     identity = Mpo.identity(holstein_model)
     mps = Mps.random(holstein_model, qntot=1, m_max=5)
     assert mps.expectation(identity) == pytest.approx(mps.mp_norm) == pytest.approx(1)
 
 
+def test_mpo_cache(tmp_path, monkeypatch):
+    mpo1 = Mpo(holstein_model, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    # the symbolic mpo is loaded from the cache
+    import renormalizer.mps.mpo
+    def fail(*args, **kwargs):
+        raise AssertionError("Symbolic MPO constructed again")
+    monkeypatch.setattr(renormalizer.mps.mpo, "construct_symbolic_mpo_template", fail)
+    monkeypatch.setattr(renormalizer.mps.symbolic_mpo, "construct_symbolic_mpo_template", fail)
+    mpo2 = Mpo(holstein_model, cache_dir=str(tmp_path))
+    assert mpo1 == mpo2
+    assert all(np.all(qn1 == qn2) for qn1, qn2 in zip(mpo1.qn, mpo2.qn))
+    # the factors are not part of the key
+    terms = [term * 2 for term in holstein_model.ham_terms]
+    mpo3 = Mpo(holstein_model, terms, cache_dir=str(tmp_path))
+    assert mpo3.distance(mpo1.scale(2)) == pytest.approx(0, abs=1e-8)
+    monkeypatch.undo()
+    # different offset has different key
+    Mpo(holstein_model, offset=Quantity(1), cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+@pytest.mark.parametrize("offset", (0, 0.1))
+def test_refresh_factors(offset):
+    mpo = Mpo(holstein_model, offset=Quantity(offset))
+    # scan the electron-phonon coupling strength
+    for scale in [0.5, 2]:
+        terms = [term * scale if len(term.dofs) > 1 else term for term in holstein_model.ham_terms]
+        mpo1 = mpo.refresh_factors(terms=terms)
+        mpo2 = Mpo(holstein_model, terms, offset=Quantity(offset))
+        assert mpo1.distance(mpo2) == pytest.approx(0, abs=1e-8)
+        assert all(np.all(qn1 == qn2) for qn1, qn2 in zip(mpo1.qn, mpo2.qn))
+    if offset != 0:
+        mpo1 = mpo.refresh_factors(offset=Quantity(offset + 1))
+        assert mpo1.distance(Mpo(holstein_model, offset=Quantity(offset + 1))) == pytest.approx(0, abs=1e-8)
+    # the structure of the terms is different
+    with pytest.raises(ValueError):
+        mpo.refresh_factors(offset=Quantity(0) if offset != 0 else Quantity(1))
+    with pytest.raises(ValueError):
+        mpo.refresh_factors(terms=holstein_model.ham_terms[:-1])
+
+
 def test_scheme4():
     ph = Phonon.simple_phonon(Quantity(3.33), Quantity(1), 2)
     m1 = Mol(Quantity(0), [ph])
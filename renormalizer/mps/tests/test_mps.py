@@ -6,7 +6,7 @@ import pytest
 from renormalizer.model import Model
 from renormalizer.model.basis import BasisSHO, BasisMultiElectronVac, BasisMultiElectron, BasisSimpleElectron
 from renormalizer.model.op import Op
-from renormalizer.mps import Mps, Mpo
+from renormalizer.mps import Mps, Mpo, ExpectationPlan
 from renormalizer.tests import parameter
 
 
@@ -43,6 +43,27 @@ def test_expectations(mpos):
     assert np.allclose(e1, e2)
 
 
+def test_expectation_plan():
+    model = parameter.holstein_model
+    mpos = [Mpo.onsite(model, r"a^\dagger a", dof_set={i}) for i in range(model.mol_num)] \
+        + [Mpo.intersite(model, {i: "a", i + 1: r"a^\dagger"}, {}) for i in range(model.mol_num - 1)]
+    plan = ExpectationPlan(mpos)
+    assert plan.match(mpos)
+    # the on-site operators at the same site are stacked
+    assert len(plan.groups) < len(mpos)
+    for i in range(2):
+        mps = Mps.random(model, 1, 20)
+        assert np.allclose(mps.expectations(plan), mps.expectations(mpos, opt=False))
+    # modified MPO is detected
+    mpos[0].scale(2, inplace=True)
+    assert not plan.match(mpos)
+    assert np.allclose(mps.expectations(mpos), mps.expectations(mpos, opt=False))
+
+    e_occupations, ph_occupations = mps.calc_occupations()
+    assert np.allclose(e_occupations, mps.e_occupations)
+    assert np.allclose(ph_occupations, mps.ph_occupations)
+
+
 def check_reduced_density_matrix(basis):
     model = Model(basis, [])
     mps = Mps.random(model, 1, 20)
@@ -86,6 +107,33 @@ def test_site_entropy():
             (entropy_1site[0]+entropy_1site[1]-entropy_2site[(0,1)])/2)
 
 
+def test_rdms_window():
+    mps = Mps.random(parameter.holstein_model, 1, 20)
+    rdm1, rdm2 = mps.calc_rdms()
+    assert len(rdm2) == mps.site_num * (mps.site_num - 1) // 2
+    for key, dm in rdm2.items():
+        # tracing out one site of the 2-site rdm gives the 1-site rdm
+        d0, d1 = rdm1[key[0]].shape[0], rdm1[key[1]].shape[0]
+        assert np.allclose(np.einsum("ijkj->ik", dm.reshape(d0, d1, d0, d1)), rdm1[key[0]])
+    _, rdm2_window = mps.calc_rdms(window=2)
+    assert set(rdm2_window.keys()) == {key for key in rdm2.keys() if key[1] - key[0] <= 2}
+    for key, dm in rdm2_window.items():
+        assert np.allclose(dm, rdm2[key])
+    # the stack is processed in chunks of sites
+    for chunk_size in [1, 3]:
+        rdm1_chunk, rdm2_chunk = mps.calc_rdms(chunk_size=chunk_size)
+        assert rdm2_chunk.keys() == rdm2.keys()
+        for key, dm in rdm2_chunk.items():
+            assert np.allclose(dm, rdm2[key])
+        for key, dm in rdm1_chunk.items():
+            assert np.allclose(dm, rdm1[key])
+    mutual = mps.calc_2site_mutual_entropy()
+    mutual_window = mps.calc_2site_mutual_entropy(window=2)
+    mask = np.abs(np.subtract.outer(np.arange(mps.site_num), np.arange(mps.site_num))) <= 2
+    assert np.allclose(mutual_window[mask], mutual[mask])
+    assert np.allclose(mutual_window[~mask], 0)
+
+
 def test_load_from_dense_wfn():
     model = Model(basis=[BasisSimpleElectron(i) for i in range(5)], ham_terms=[])
     ref_mps = Mps.random(model, 1, 20)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from renormalizer.model import Model, h_qc
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.gs import optimize_mps
+from renormalizer.mps.ordering import fiedler_ordering, calc_mutual_info_ordering, reorder_model
+from renormalizer.mps.tests import cur_dir
+from renormalizer.tests.parameter import holstein_model
+
+
+def test_fiedler_ordering():
+    # mutual information decays with the distance on a chain
+    nsite = 10
+    dist = np.abs(np.subtract.outer(np.arange(nsite), np.arange(nsite)))
+    mutual_info = np.exp(-dist)
+    np.fill_diagonal(mutual_info, 0)
+    shuffle = np.random.permutation(nsite)
+    ordering = fiedler_ordering(mutual_info[np.ix_(shuffle, shuffle)])
+    recovered = shuffle[ordering]
+    assert np.all(recovered == np.arange(nsite)) or np.all(recovered == np.arange(nsite)[::-1])
+
+
+def test_permute_integrals():
+    h1e, h2e, nuc = h_qc.read_fcidump(os.path.join(cur_dir, "H6.txt"), 6)
+    # see `test_gs.test_qc`
+    fci_e = -3.23747673055271 - nuc
+    # permute the spatial orbitals
+    ordering = (np.array([2, 0, 5, 1, 4, 3])[:, None] * 2 + np.arange(2)).ravel()
+    h1e2, h2e2 = h_qc.permute_integrals(h1e, h2e, ordering)
+    occupied = [0, 1, 2, 3, 4, 5]
+    hf_energies = []
+    for sh, aseri, occ in [(h1e, h2e, occupied), (h1e2, h2e2, [i for i, j in enumerate(ordering) if j in occupied])]:
+        basis, ham_terms = h_qc.qc_model(sh, aseri)
+        model = Model(basis, ham_terms)
+        mpo = Mpo(model)
+        hf = Mps.hartree_product_state(model, {i: 1 for i in occ})
+        hf_energies.append(hf.expectation(mpo))
+        # the correlation energy is sensitive to all the two-electron integrals
+        M = 40
+        np.random.seed(2023)
+        mps = Mps.random(model, [3, 3], M, percent=1.0).scale(1e-8) + hf
+        mps.optimize_config.procedure = [[M, 0.4], [M, 0.2], [M, 0.1], [M, 0], [M, 0], [M, 0]]
+        mps.optimize_config.method = "2site"
+        energies, _ = optimize_mps(mps, mpo)
+        assert min(energies) == pytest.approx(fci_e, abs=1e-6)
+    assert hf_energies[0] == pytest.approx(hf_energies[1])
+
+
+def test_mutual_info_ordering():
+    ordering = calc_mutual_info_ordering(holstein_model, 1, m=5)
+    assert sorted(ordering) == list(range(len(holstein_model.basis)))
+    model = reorder_model(holstein_model, ordering)
+    assert [b.dof for b in model.output_ordering] == [b.dof for b in holstein_model.basis]
+
+    energies = []
+    for m in [holstein_model, model]:
+        mps = Mps.random(m, 1, 10)
+        mps.optimize_config.procedure = [[10, 0.4], [20, 0.2], [30, 0.1], [40, 0], [40, 0]]
+        mps.optimize_config.method = "2site"
+        e, _ = optimize_mps(mps, Mpo(m))
+        energies.append(min(e))
+    assert energies[0] == pytest.approx(energies[1], rel=1e-5)
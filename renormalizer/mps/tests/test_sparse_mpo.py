@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from renormalizer.model import Model, h_qc
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.gs import optimize_mps
+from renormalizer.mps.hop_expr import hop_expr
+from renormalizer.mps.lib import Environ
+from renormalizer.mps.matrix import asnumpy, tensordot
+from renormalizer.mps.sparse_mpo import SparseMo, SparseMpoHop
+from renormalizer.mps.tests import cur_dir
+from renormalizer.tests.parameter import holstein_model
+
+
+def test_sparse_mo():
+    mpo = Mpo(holstein_model)
+    for mo in mpo:
+        smo = SparseMo(mo.array)
+        assert smo.density <= 1
+        assert np.allclose(smo.todense(), mo.array)
+
+
+@pytest.mark.parametrize("nsite", (1, 2))
+def test_sparse_mpo_hop(nsite):
+    mps = Mps.random(holstein_model, 1, 10)
+    mpo = Mpo(holstein_model)
+    mps.ensure_right_canonical()
+    environ = Environ(mps, mpo, "R")
+    cidx = list(range(nsite))
+    ltensor = environ.read("L", -1)
+    rtensor = environ.read("R", nsite)
+    cmo = [mpo[i].array for i in cidx]
+    cms = mps[0].array
+    if nsite == 2:
+        cms = asnumpy(tensordot(cms, mps[1].array, axes=1))
+    dense = hop_expr(ltensor, rtensor, cmo, cms.shape)(cms)
+    sparse = SparseMpoHop(ltensor, rtensor, [SparseMo(mo) for mo in cmo])(cms)
+    assert np.allclose(asnumpy(dense), asnumpy(sparse))
+
+
+def test_sparse_mpo_qc():
+    spatial_norbs = 6
+    h1e, h2e, nuc = h_qc.read_fcidump(os.path.join(cur_dir, "H6.txt"), spatial_norbs)
+    basis, ham_terms = h_qc.qc_model(h1e, h2e)
+    model = Model(basis, ham_terms)
+    mpo = Mpo(model).to_sparse()
+    assert np.mean([smo.density for smo in mpo.get_sparse_mo(range(len(mpo)))]) < 0.5
+
+    fci_e = -3.23747673055271 - nuc
+    nelec = [3, 3]
+    M = 30
+    procedure = [[M, 0.4], [M, 0.2], [M, 0.1], [M, 0], [M, 0], [M, 0], [M, 0]]
+    np.random.seed(2023)
+    mps = Mps.random(model, nelec, M, percent=1.0)
+    hf = Mps.hartree_product_state(model, {i:1 for i in range(sum(nelec))})
+    mps = mps.scale(1e-8)+hf
+    mps.optimize_config.procedure = procedure
+    mps.optimize_config.method = "2site"
+    energies, mps = optimize_mps(mps.copy(), mpo)
+    assert np.allclose(min(energies), fci_e, atol=5e-3)
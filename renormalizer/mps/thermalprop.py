@@ -103,7 +103,7 @@ class ThermalProp(TdMpsJob):
         return new_mpdm
 
     def evolve_prop(self, old_mpdm, evolve_dt):
-        h_mpo = Mpo(self.h_mpo.model, offset=Quantity(self.energies[-1]))
+        h_mpo = self.h_mpo.with_offset(Quantity(self.energies[-1]))
         return old_mpdm.evolve(h_mpo, evolve_dt)
 
     def evolve_single_step(self, evolve_dt):
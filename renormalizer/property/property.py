@@ -1,5 +1,6 @@
 from typing import Union, List, Dict
 from renormalizer.mps import Mpo, Mps, MpDm
+from renormalizer.mps.backend import np
 
 class Property():
     '''
@@ -52,6 +53,23 @@ class Property():
         or 
         calculate each property with different {prop_str:mps}, {prop_str:mps_conj}
         '''
+        # the expectations of all the MPO lists are calculated in one pass
+        grouped_res = {}
+        if mps_conj is None:
+            grouped_strs = [prop_str for prop_str in self.prop_strs if prop_str != "e_rdm"
+                            and isinstance(self.prop_mpos.get(prop_str), list)]
+            grouped_mpos = [mpo for prop_str in grouped_strs for mpo in self.prop_mpos[prop_str]]
+            if grouped_mpos:
+                res = mps.expectations(grouped_mpos)
+                offset = 0
+                for prop_str in grouped_strs:
+                    n = len(self.prop_mpos[prop_str])
+                    prop_res = res[offset:offset+n]
+                    if np.iscomplexobj(prop_res) and np.allclose(prop_res.imag, 0):
+                        prop_res = prop_res.real
+                    grouped_res[prop_str] = prop_res
+                    offset += n
+
         for prop_str in self.prop_strs:
             
             # todo: 
@@ -68,7 +86,7 @@ class Property():
                 elif isinstance(mpo, list):
                     # mpos
                     assert mps_conj is None
-                    self.prop_res[prop_str].append(mps.expectations(mpo))
+                    self.prop_res[prop_str].append(grouped_res[prop_str])
                 else:
                     assert False
             else:
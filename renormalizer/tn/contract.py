@@ -0,0 +1,87 @@
+"""
+Cached ``opt_einsum`` contractions for the tree tensor network.
+
+The index labels of the environment and effective Hamiltonian contractions are
+built from the DoF names of the nodes. For a given tree, operator tree and node,
+the contraction only depends on the shapes of the tensors. The einsum equation
+and the contraction path are therefore cached on the :class:`~renormalizer.tn.treebase.BasisTree`
+of the state, and the labels and the path are built once for each distinct set of bond dimensions.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, List, Tuple, Sequence
+
+import opt_einsum as oe
+
+from renormalizer.mps.matrix import asxp
+from renormalizer.tn.treebase import BasisTree
+
+
+#: Maximum number of the cached contractions of a basis tree.
+TN_CONTRACT_CACHE_SIZE = 1024
+
+_cache_lock = Lock()
+
+
+def _get_eq_and_path(basis: BasisTree, key: Tuple, shapes: Tuple, build_indices: Callable[[], Tuple[List, Sequence]]):
+    # (key, shapes) -> (equation, path). LRU.
+    # Different operators on the same basis tree, such as the Hamiltonian and the identity in VMF,
+    # share the key but have different bond dimensions. So the shapes are part of the cache key
+    cache_key = (key, shapes)
+    with _cache_lock:
+        cache = basis.__dict__.setdefault("_contract_cache", OrderedDict())
+        entry = cache.get(cache_key)
+        if entry is not None:
+            cache.move_to_end(cache_key)
+            return entry
+    indices, output_indices = build_indices()
+    assert len(indices) == len(shapes)
+    args = []
+    for idx in indices:
+        args.extend([None, idx])
+    args.append(output_indices)
+    eq, _ = oe.parser.convert_interleaved_input(args)
+    path, _ = oe.contract_path(eq, *shapes, shapes=True)
+    with _cache_lock:
+        cache[cache_key] = (eq, path)
+        while len(cache) > TN_CONTRACT_CACHE_SIZE:
+            cache.popitem(last=False)
+    return eq, path
+
+
+def cached_contract(basis: BasisTree, key: Tuple, tensors: List, build_indices: Callable[[], Tuple[List, Sequence]]):
+    r"""
+    Contract ``tensors`` with the cached equation and path.
+
+    Parameters
+    ----------
+    basis : :class:`~renormalizer.tn.treebase.BasisTree`
+        The basis tree that holds the cache.
+    key : tuple
+        The key of the contraction, which should determine the labels of the indices
+        up to the shapes of the tensors, such as the kind of the contraction, the index of the node
+        and the identity of the operator basis tree.
+    tensors : list
+        The tensors to be contracted.
+    build_indices : callable
+        Return the indices of each tensor and the output indices in the ``opt_einsum``
+        interleaved format. Only called when the cache misses.
+    """
+    shapes = tuple(tuple(t.shape) for t in tensors)
+    eq, path = _get_eq_and_path(basis, key, shapes, build_indices)
+    return oe.contract(eq, *[asxp(t) for t in tensors], optimize=path)
+
+
+def cached_contract_expression(basis: BasisTree, key: Tuple, tensors: List, x_shape,
+                               build_indices: Callable[[], Tuple[List, Sequence]]):
+    r"""
+    Build the ``opt_einsum`` expression that contracts the constant ``tensors`` with
+    a tensor of shape ``x_shape``, with the cached equation and path.
+    ``build_indices`` returns the indices of ``tensors`` and ``x`` and the output indices.
+    See :func:`cached_contract` for the other parameters.
+    """
+    shapes = tuple(tuple(t.shape) for t in tensors) + (tuple(x_shape),)
+    eq, path = _get_eq_and_path(basis, key, shapes, build_indices)
+    args = [asxp(t) for t in tensors] + [tuple(x_shape)]
+    return oe.contract_expression(eq, *args, constants=list(range(len(tensors))), optimize=path)
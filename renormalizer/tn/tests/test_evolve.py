@@ -1,6 +1,7 @@
 import os
 from  typing import List
 
+import opt_einsum as oe
 import pytest
 
 from renormalizer import Op, Quantity
@@ -10,7 +11,8 @@ from renormalizer.mps.tests.test_evolve import QUTIP_STEP, qutip_expectations, i
 from renormalizer.tests.parameter_exact import model
 from renormalizer.tests import parameter
 from renormalizer.tn import BasisTree, TTNO, TTNS
-from renormalizer.tn.tree import from_mps
+from renormalizer.tn.tree import TTNEnviron, from_mps
+from renormalizer.tn.time_evolution import time_derivative_vmf
 from renormalizer.tn.node import TreeNodeBasis
 from renormalizer.tn.utils_eph import max_entangled_ex
 from renormalizer.utils import EvolveConfig, EvolveMethod, CompressConfig, CompressCriteria
@@ -89,6 +91,31 @@ def test_tdvp_vmf(ttns_and_ttno):
     check_result(ttns, ttno, 0.5, 2, op_n_list)
 
 
+def test_time_derivative_vmf_workers():
+    ttns, ttno, _ = init_tree_mctdh
+    ttns = ttns + ttns.random(ttns.basis, 1, 5).scale(1e-5, inplace=True)
+    ttns.canonicalise()
+    deriv = time_derivative_vmf(ttns, ttno)
+    ttns.evolve_config.vmf_workers = 2
+    np.testing.assert_allclose(time_derivative_vmf(ttns, ttno), deriv)
+
+
+def test_time_derivative_vmf_contract_cache(monkeypatch):
+    ttns, ttno, _ = construct_ttns_and_ttno_tree()
+    ttns = ttns + ttns.random(ttns.basis, 1, 5).scale(1e-5, inplace=True)
+    ttns.canonicalise()
+    deriv = time_derivative_vmf(ttns, ttno)
+    TTNEnviron(ttns, ttno)
+    # the Hamiltonian and the identity share the cache of the basis tree.
+    # No more path searches with the same bond dimensions
+    def fail(*args, **kwargs):
+        raise AssertionError("Contraction path searched again")
+    monkeypatch.setattr(oe, "contract_path", fail)
+    for i in range(2):
+        np.testing.assert_allclose(time_derivative_vmf(ttns, ttno), deriv)
+        TTNEnviron(ttns, ttno)
+
+
 @pytest.mark.parametrize("ttns_and_ttno", [init_chain, init_tree, init_tree_mctdh])
 def test_pc(ttns_and_ttno):
     ttns, ttno, op_n_list = ttns_and_ttno
@@ -76,6 +76,40 @@ def test_ttns(basis):
             np.testing.assert_allclose(e3, e2)
 
 
+@pytest.mark.parametrize("basis", [basis_binary, basis_multi_basis])
+def test_environ_workers(basis):
+    ttns = TTNS.random(basis, 0, 5, 1)
+    ttno = TTNO(basis, heisenberg_ops(nspin))
+    env1 = TTNEnviron(ttns, ttno, workers=1)
+    env2 = TTNEnviron(ttns, ttno, workers=4)
+    for node1, node2 in zip(env1.node_list, env2.node_list):
+        np.testing.assert_allclose(node1.environ_parent, node2.environ_parent)
+        assert len(node1.environ_children) == len(node2.environ_children) == len(node1.children)
+        for environ_child1, environ_child2 in zip(node1.environ_children, node2.environ_children):
+            np.testing.assert_allclose(environ_child1, environ_child2)
+
+
+def test_contract_cache(monkeypatch):
+    ttns = TTNS.random(basis_binary, 0, 5, 1)
+    ttno = TTNO(basis_binary, heisenberg_ops(nspin))
+    TTNEnviron(ttns, ttno)
+    # the indices are not built again if the shapes are the same
+    def fail(*args, **kwargs):
+        raise AssertionError("Indices built again")
+    monkeypatch.setattr(TTNEnviron, "get_child_indices", fail)
+    ttns2 = ttns.copy()
+    for node in ttns2:
+        node.tensor = node.tensor + 0.1
+    env1 = TTNEnviron(ttns2, ttno)
+    monkeypatch.undo()
+    # the bond dimension is changed
+    TTNEnviron(TTNS.random(basis_binary, 0, 3, 1), ttno)
+    basis_binary.__dict__.pop("_contract_cache")
+    env2 = TTNEnviron(ttns2, ttno)
+    for node1, node2 in zip(env1.node_list, env2.node_list):
+        np.testing.assert_allclose(node1.environ_parent, node2.environ_parent)
+
+
 @pytest.mark.parametrize("basis", [basis_binary, basis_multi_basis])
 def test_push_cano(basis):
     ttns = TTNS.random(basis, 0, 5, 1)
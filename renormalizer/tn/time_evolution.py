@@ -11,6 +11,7 @@ from renormalizer.mps.backend import np, xp
 from renormalizer.mps.matrix import asxp
 from renormalizer.lib import solve_ivp, expm_krylov
 from renormalizer.utils.configs import EvolveMethod
+from renormalizer.utils.utils import thread_map
 from renormalizer.tn.node import TreeNodeTensor
 from renormalizer.tn.tree import TTNO, TTNS, TTNEnviron, EVOLVE_METHODS
 from renormalizer.tn.hop_expr import hop_expr0, hop_expr1, hop_expr2
@@ -21,12 +22,12 @@ logger = logging.getLogger(__name__)
 
 def time_derivative_vmf(ttns: TTNS, ttno: TTNO):
     # todo: benchmark and optimize
-    # parallel over multiple processors?
     environ_s = TTNEnviron(ttns, TTNO.identity(ttns.basis))
     environ_h = TTNEnviron(ttns, ttno)
 
-    deriv_list = []
-    for inode, node in enumerate(ttns.node_list):
+    # the derivatives of the nodes are independent once the environments are built
+    def node_derivative(inode):
+        node = ttns.node_list[inode]
         hop = hop_expr1(node, ttns, ttno, environ_h)
         # idx1: children+physical, idx2: parent
         dim_parent = node.shape[-1]
@@ -41,7 +42,9 @@ def time_derivative_vmf(ttns: TTNS, ttno: TTNO):
             ovlp_inv = regularized_inversion(ovlp, ttns.evolve_config.reg_epsilon)
             deriv = oe.contract("bf, bg, fh -> gh", deriv, xp.eye(proj.shape[0]) - proj, asxp(ovlp_inv.T))
         qnmask = ttns.get_qnmask(node).reshape(deriv.shape)
-        deriv_list.append(deriv[qnmask].ravel())
+        return deriv[qnmask].ravel()
+
+    deriv_list = thread_map(node_derivative, range(len(ttns.node_list)), ttns.evolve_config.vmf_workers)
     return np.concatenate(deriv_list)
 
 
@@ -1,6 +1,7 @@
 from typing import List, Dict, Tuple, Union, Callable
 from numbers import Number
 import logging
+import os
 
 import scipy
 import opt_einsum as oe
@@ -14,14 +15,19 @@ from renormalizer.mps.svd_qn import add_outer, svd_qn, blockrecover, get_qn_mask
 from renormalizer.mps.lib import select_basis
 from renormalizer.mps.mps import normalize
 from renormalizer.utils.configs import CompressConfig, OptimizeConfig, EvolveConfig, EvolveMethod
-from renormalizer.utils import calc_vn_entropy
+from renormalizer.utils import calc_vn_entropy, thread_map
 from renormalizer.tn.node import TreeNodeTensor, TreeNodeBasis, copy_connection, TreeNodeEnviron
 from renormalizer.tn.treebase import Tree, BasisTree
+from renormalizer.tn.contract import cached_contract
 from renormalizer.tn.symbolic_mpo import construct_symbolic_mpo, symbolic_mo_to_numeric_mo_general
 
 
 logger = logging.getLogger(__name__)
 
+#: The default number of threads to build the environments of independent subtrees in :class:`TTNEnviron`,
+#: set by the environment variable ``RENO_TTN_ENVIRON_WORKERS``.
+TTN_ENVIRON_WORKERS = int(os.environ.get("RENO_TTN_ENVIRON_WORKERS", 1))
+
 
 class TTNBase(Tree):
     # A tree whose tree node is TreeNodeTensor
@@ -1080,7 +1086,7 @@ class TTNS(TTNBase):
 
 
 class TTNEnviron(Tree):
-    def __init__(self, ttns: TTNS, ttno: TTNO, build_environ=True):
+    def __init__(self, ttns: TTNS, ttno: TTNO, build_environ=True, workers: int = None):
         self.basis_ttns = ttns.basis
         self.basis_ttno = ttno.basis
         enodes: List[TreeNodeEnviron] = [TreeNodeEnviron() for _ in range(ttns.size)]
@@ -1091,6 +1097,10 @@ class TTNEnviron(Tree):
         # tensor node to basis node. todo: remove duplication?
         self.tn2dofs_ttns = {tn: bn.dofs for tn, bn in zip(self.node_list, self.basis_ttns.node_list)}
         self.tn2dofs_ttno = {tn: bn.dofs for tn, bn in zip(self.node_list, self.basis_ttno.node_list)}
+        # number of threads for the environments of the independent subtrees
+        if workers is None:
+            workers = TTN_ENVIRON_WORKERS
+        self.workers = workers
         if build_environ:
             self.build_children_environ(ttns, ttno)
             self.build_parent_environ(ttns, ttno)
@@ -1098,17 +1108,29 @@ class TTNEnviron(Tree):
     def build_children_environ(self, ttns, ttno):
         # first run, children environment to the parent.
         # set enode.environ_children
-        snodes: List[TreeNodeTensor] = ttns.postorder_list()
-        for snode in snodes:
-            self.build_children_environ_node(snode, ttns, ttno)
+        for enode in self.node_list:
+            enode.environ_children = [None] * len(enode.children)
+        # nodes with the same height (the distance to the farthest leaf) are independent
+        height = {}
+        levels: List[List[TreeNodeTensor]] = []
+        for snode in ttns.postorder_list():
+            h = max([height[child] + 1 for child in snode.children], default=0)
+            height[snode] = h
+            if h == len(levels):
+                levels.append([])
+            levels[h].append(snode)
+        for level in levels:
+            thread_map(lambda snode: self.build_children_environ_node(snode, ttns, ttno), level, self.workers)
 
     def build_parent_environ(self, ttns, ttno):
         # second run, parent environment to children
         # set enode.environ_parent
-        snodes: List[TreeNodeTensor] = ttns.node_list
-        for snode in snodes:
-            for ichild in range(len(snode.children)):
-                self.build_parent_environ_node(snode, ichild, ttns, ttno)
+        # the environments to the children of the nodes with the same depth are independent
+        level = [ttns.root]
+        while level:
+            tasks = [(snode, ichild) for snode in level for ichild in range(len(snode.children))]
+            thread_map(lambda task: self.build_parent_environ_node(task[0], task[1], ttns, ttno), tasks, self.workers)
+            level = [child for snode in level for child in snode.children]
 
     def update_1bond(self, snode: TreeNodeTensor, ttns: TTNS, ttno: TTNO):
         # update environ for the bond between snode and snode.parent
@@ -1134,64 +1156,46 @@ class TTNEnviron(Tree):
         # build the environment from snode to its parent and store the environment in its parent
         if snode.parent is None:
             return
-        enode = self.node_list[ttns.node_idx[snode]]
-        onode = ttno.node_list[ttns.node_idx[snode]]
-        args = []
-        for i, child_tensor in enumerate(enode.environ_children):
-            indices = self.get_child_indices(enode, i, ttns, ttno)
-            args.extend([child_tensor, indices])
-
-        args.append(snode.tensor.conj())
-        args.append(ttns.get_node_indices(snode, conj=True))
-
-        args.append(onode.tensor)
-        args.append(ttno.get_node_indices(onode))
-
-        args.append(snode.tensor)
-        args.append(ttns.get_node_indices(snode, ttno=ttno))
-
-        # indices for the resulting tensor
-        indices = self.get_parent_indices(enode, ttns, ttno)
-        args.append(indices)
-        res = oe.contract(*asxp_oe_args(args))
+        inode = ttns.node_idx[snode]
+        enode = self.node_list[inode]
+        onode = ttno.node_list[inode]
+        tensors = list(enode.environ_children) + [snode.tensor.conj(), onode.tensor, snode.tensor]
+
+        def build_indices():
+            indices = [self.get_child_indices(enode, i, ttns, ttno) for i in range(len(enode.environ_children))]
+            indices.append(ttns.get_node_indices(snode, conj=True))
+            indices.append(ttno.get_node_indices(onode))
+            indices.append(ttns.get_node_indices(snode, ttno=ttno))
+            # indices for the resulting tensor
+            return indices, self.get_parent_indices(enode, ttns, ttno)
+
+        res = cached_contract(ttns.basis, ("children_environ", inode, ttno.basis), tensors, build_indices)
         if len(enode.parent.environ_children) != len(enode.parent.children):
-            # first run
-            enode.parent.environ_children.append(asnumpy(res))
-        else:
-            # updating
-            ichild = snode.parent.children.index(snode)
-            enode.parent.environ_children[ichild] = asnumpy(res)
+            enode.parent.environ_children = [None] * len(enode.parent.children)
+        enode.parent.environ_children[snode.idx_as_child] = asnumpy(res)
 
     def build_parent_environ_node(self, snode: TreeNodeTensor, ichild: int, ttns: TTNS, ttno: TTNO):
         # build the environment from snode to the ith child of snode and store the environment in the child
-        enode = self.node_list[ttns.node_idx[snode]]
-        onode = ttno.node_list[ttns.node_idx[snode]]
-        args = []
+        inode = ttns.node_idx[snode]
+        enode = self.node_list[inode]
+        onode = ttno.node_list[inode]
         # children tensor
-        for j, child_tensor in enumerate(enode.environ_children):
-            if j == ichild:
-                continue
-            indices = self.get_child_indices(enode, j, ttns, ttno)
-            args.extend([child_tensor, indices])
-
+        tensors = [child_tensor for j, child_tensor in enumerate(enode.environ_children) if j != ichild]
         # parent tensor
-        indices = self.get_parent_indices(enode, ttns, ttno)
-        args.extend([enode.environ_parent, indices])
-
-        args.append(snode.tensor.conj())
-        args.append(ttns.get_node_indices(snode, conj=True))
-
-        args.append(onode.tensor)
-        args.append(ttno.get_node_indices(onode))
-
-        args.append(snode.tensor)
-        args.append(ttns.get_node_indices(snode, ttno=ttno))
-
-        # indices for the resulting tensor
-        indices = self.get_child_indices(enode, ichild, ttns, ttno)
-
-        args.append(indices)
-        res = oe.contract(*asxp_oe_args(args))
+        tensors.append(enode.environ_parent)
+        tensors.extend([snode.tensor.conj(), onode.tensor, snode.tensor])
+
+        def build_indices():
+            indices = [self.get_child_indices(enode, j, ttns, ttno)
+                       for j in range(len(enode.environ_children)) if j != ichild]
+            indices.append(self.get_parent_indices(enode, ttns, ttno))
+            indices.append(ttns.get_node_indices(snode, conj=True))
+            indices.append(ttno.get_node_indices(onode))
+            indices.append(ttns.get_node_indices(snode, ttno=ttno))
+            # indices for the resulting tensor
+            return indices, self.get_child_indices(enode, ichild, ttns, ttno)
+
+        res = cached_contract(ttns.basis, ("parent_environ", inode, ichild, ttno.basis), tensors, build_indices)
         enode.children[ichild].environ_parent = asnumpy(res)
 
     def get_child_indices(self, enode, i, ttns, ttno):
@@ -188,7 +188,7 @@ class ChargeDiffusionDynamics(TdMpsJob):
                     gs_mp.dump(self.thermal_dump_path)
         init_mp = self.create_electron(gs_mp)
         energy = Quantity(init_mp.expectation(tentative_mpo))
-        self.mpo = Mpo(self.model, offset=energy)
+        self.mpo = tentative_mpo.with_offset(energy)
         logger.info(f"mpo bond dims: {self.mpo.bond_dims}")
         logger.info(f"mpo physical dims: {self.mpo.pbond_list}")
         init_mp.evolve_config = self.evolve_config
@@ -227,11 +227,12 @@ class ChargeDiffusionDynamics(TdMpsJob):
 
         if rdm is not None:
             e_occupations = np.diag(rdm).real
+            ph_occupations = mps.ph_occupations
         else:
-            e_occupations = mps.e_occupations
+            e_occupations, ph_occupations = mps.calc_occupations()
         self.e_occupations_array.append(e_occupations)
         self.r_square_array.append(calc_r_square(e_occupations))
-        self.ph_occupations_array.append(mps.ph_occupations)
+        self.ph_occupations_array.append(ph_occupations)
         logger.info(f"e occupations: {self.e_occupations_array[-1]}")
 
         bond_vn_entropy = mps.calc_bond_entropy()
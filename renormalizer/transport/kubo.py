@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import importlib.util
 import logging
+import multiprocessing
 import os
 
 import scipy.integrate
@@ -14,6 +16,19 @@ from renormalizer.property import Property
 
 logger = logging.getLogger(__name__)
 
+_h_mpo = None
+
+
+def _init_worker(h_mpo):
+    # the Hamiltonian is passed to each worker once and shared by all the steps
+    global _h_mpo
+    _h_mpo = h_mpo
+
+
+def _evolve_mpdm(args):
+    mpdm, evolve_dt = args
+    return mpdm.evolve(_h_mpo, evolve_dt)
+
 
 class TransportKubo(TdMpsJob):
     r"""
@@ -92,11 +107,15 @@ class TransportKubo(TdMpsJob):
             to the path joined by ``dump_dir`` and ``job_name``.
         properties (:class:`~renormalizer.property.property.Property`): other properties to calculate during real time evolution.
             Currently only supports Holstein model.
+        workers (int): number of processes to propagate the bra and the ket(s) concurrently.
+            The bra and the ket are independent within a time step, so at most 2 (3 if the
+            Peierls current is present) processes are useful.
+            The default value is 1, in which case the propagation is carried out serially.
     """
     def __init__(self, model: Model, temperature: Quantity, distance_matrix: np.ndarray = None,
                  insteps: int=1, ievolve_config=None, compress_config=None,
                  evolve_config=None, dump_dir: str=None, job_name: str=None,
-                 thermal_dump_path: str=None, properties: Property = None):
+                 thermal_dump_path: str=None, properties: Property = None, workers: int = 1):
         self.model = model
         self.distance_matrix = distance_matrix
         self.h_mpo = Mpo(model)
@@ -132,6 +151,9 @@ class TransportKubo(TdMpsJob):
             self.thermal_dump_path = None
 
         self.properties = properties
+        assert workers >= 1
+        self.workers = workers
+        self._pool = None
         self._auto_corr = []
         self._auto_corr_deomposition = []
         super().__init__(evolve_config=evolve_config, dump_dir=dump_dir,
@@ -237,7 +259,7 @@ class TransportKubo(TdMpsJob):
                 mpdm.dump(self.thermal_dump_path)
         mpdm.compress_config = self.compress_config
         e = mpdm.expectation(self.h_mpo)
-        self.h_mpo = Mpo(self.model, offset=Quantity(e))
+        self.h_mpo = self.h_mpo.with_offset(Quantity(e))
         mpdm.evolve_config = self.evolve_config
         logger.debug("Applying current operator")
         ket_mpdm = self.j_oper.contract(mpdm).normalize("mps_norm_to_coeff")
@@ -276,15 +298,42 @@ class TransportKubo(TdMpsJob):
         else:
             (prev_bra_mpdm, prev_ket_mpdm), (prev_bra_mpdm, prev_ket_mpdm2) = self.latest_mps
 
-        latest_ket_mpdm = prev_ket_mpdm.evolve(self.h_mpo, evolve_dt)
-        latest_bra_mpdm = prev_bra_mpdm.evolve(self.h_mpo, evolve_dt)
         if self.j_oper2 is None:
+            latest_ket_mpdm, latest_bra_mpdm = self._evolve_mpdms([prev_ket_mpdm, prev_bra_mpdm], evolve_dt)
             return BraKetPair(latest_bra_mpdm, latest_ket_mpdm, self.j_oper)
         else:
-            latest_ket_mpdm2 = prev_ket_mpdm2.evolve(self.h_mpo, evolve_dt)
+            latest_ket_mpdm, latest_bra_mpdm, latest_ket_mpdm2 = \
+                self._evolve_mpdms([prev_ket_mpdm, prev_bra_mpdm, prev_ket_mpdm2], evolve_dt)
             return BraKetPair(latest_bra_mpdm, latest_ket_mpdm, self.j_oper), \
                    BraKetPair(latest_bra_mpdm, latest_ket_mpdm2, self.j_oper2)
 
+    def _evolve_mpdms(self, mpdms, evolve_dt):
+        if self.workers == 1:
+            return [mpdm.evolve(self.h_mpo, evolve_dt) for mpdm in mpdms]
+        if self._pool is None:
+            if importlib.util.find_spec("cupy"):
+                context = multiprocessing.get_context("forkserver")
+            else:
+                context = multiprocessing.get_context()
+            processes = min(self.workers, len(mpdms))
+            logger.info(f"{processes} multiprocess parallelization activated")
+            self._pool = context.Pool(processes=processes, initializer=_init_worker, initargs=(self.h_mpo,))
+        return self._pool.map(_evolve_mpdm, [(mpdm, evolve_dt) for mpdm in mpdms])
+
+    def evolve(self, evolve_dt=None, nsteps=None, evolve_time=None):
+        try:
+            return super().evolve(evolve_dt, nsteps, evolve_time)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_pool"] = None
+        return state
+
     def stop_evolve_criteria(self):
         corr = self.auto_corr
         if len(corr) < 10:
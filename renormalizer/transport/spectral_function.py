@@ -94,7 +94,8 @@ class SpectralFunctionZT(TdMpsJob):
     def init_mps(self):
         creation_oper = Mpo.onsite(self.model, r"a^\dagger", dof_set={self.model.e_dofs[0]})
         gs = Mps.ground_state(self.model, False)
-        self.h_mpo = Mpo(self.model, offset=Quantity(gs.expectation(Mpo(self.model))))
+        h_mpo = Mpo(self.model)
+        self.h_mpo = h_mpo.with_offset(Quantity(gs.expectation(h_mpo)))
         a_ket = creation_oper.apply(gs, canonicalise=True)
         a_ket.compress_config = self.compress_config
         a_ket.evolve_config = self.evolve_config
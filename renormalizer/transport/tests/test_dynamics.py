@@ -143,6 +143,19 @@ def test_evolve(
     os.remove("test.npz")
 
 
+def test_checkpoint(tmpdir):
+    evolve_dt, nsteps = 2, 10
+    ct1 = ChargeDiffusionDynamics(band_limit_model, stop_at_edge=False, dump_dir=tmpdir, job_name="test")
+    ct1.checkpoint_interval = 5
+    ct1.evolve(evolve_dt, nsteps)
+    ct2 = ChargeDiffusionDynamics.load_checkpoint(ct1.checkpoint_path)
+    assert len(ct2.evolve_times) == nsteps + 1
+    assert ct2.evolve_config.guess_dt == ct1.evolve_config.guess_dt
+    ct1.evolve(evolve_dt, nsteps)
+    ct2.evolve(evolve_dt, nsteps)
+    assert ct1.is_similar(ct2)
+
+
 @pytest.mark.parametrize(
     "mol_num, j_constant_value, elocalex_value, ph_info, ph_phys_dim, evolve_dt, nsteps",
     ([3, 1, 3.87e-3, [[1e-5, 1e-5]], 2, 2, 50],),
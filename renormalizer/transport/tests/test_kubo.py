@@ -135,3 +135,20 @@ def get_qutip_peierls_kubo(J, nsites, ph_levels, omega, g, temperature, time_ser
     corr4 = -qutip.correlation_2op_2t(H, init_state, [0], time_series, [], j_oper2, j_oper2)[0]
     corr = corr1 + corr2 + corr3 + corr4
     return corr, np.array([corr1, corr2, corr3, corr4]).T
+
+
+def test_parallel_propagation():
+    ph = Phonon.simple_phonon(Quantity(1), Quantity(1), 2)
+    model = HolsteinModel([Mol(Quantity(0), [ph])] * 4, Quantity(1), 3)
+    temperature = Quantity(50000, 'K')
+    auto_corr = []
+    for workers in [1, 2]:
+        compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=16)
+        evolve_config = EvolveConfig(EvolveMethod.tdvp_ps, adaptive=True, guess_dt=0.5, adaptive_rtol=1e-3)
+        ievolve_config = EvolveConfig(EvolveMethod.tdvp_ps, adaptive=True, guess_dt=-0.1j)
+        kubo = TransportKubo(model, temperature, compress_config=compress_config, ievolve_config=ievolve_config,
+                             evolve_config=evolve_config, workers=workers)
+        kubo.evolve(nsteps=3, evolve_time=3)
+        assert kubo._pool is None
+        auto_corr.append(kubo.auto_corr)
+    np.testing.assert_allclose(auto_corr[0], auto_corr[1])
@@ -2,7 +2,7 @@
 # Author: Jiajun Ren <jiajunren0522@gmail.com>
 
 from renormalizer.utils.quantity import Quantity
-from renormalizer.utils.utils import sizeof_fmt, cached_property, calc_vn_entropy
+from renormalizer.utils.utils import sizeof_fmt, cached_property, calc_vn_entropy, thread_map
 from renormalizer.utils.configs import (
     BondDimDistri,
     CompressCriteria,
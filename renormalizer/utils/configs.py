@@ -123,6 +123,12 @@ class CompressConfig:
 
     dump_matrix_dir : str, optional
         The directory to dump matrix when matrix is larger than ``dump_matrix_size``.
+        The matrices are written to the disk by a background thread and loaded back
+        as memory maps.
+
+    dump_matrix_prefetch : int, optional
+        The number of dumped matrices to be loaded in the background ahead of the current
+        site in the sweep direction. Default is 2.
 
     ofs : `OFS`, optional
         Whether optimize the DOF ordering by OFS. The default value is ``None`` which means does not perform OFS.
@@ -132,6 +138,25 @@ class CompressConfig:
         for and only for ab initio Hamiltonian constructed by the experimental
         ``renormalizer.model.h_qc.qc_model``. Default is ``False``.
 
+    environ_memory_limit : int or float or str, optional
+        The memory budget in bytes for the environment blocks in :class:`~renormalizer.mps.lib.Environ`.
+        Strings such as ``"2 GB"`` are also accepted.
+        The least recently used blocks beyond the budget are spilled to
+        a temporary directory in ``dump_matrix_dir`` by a background thread
+        and the blocks needed next in the sweep are loaded back in advance.
+        Default is ``None`` which means all of the blocks are kept in memory.
+
+    randomized_svd : bool, optional
+        Whether use randomized SVD in compression for the quantum number blocks much larger than
+        the maximum bond dimension. Only effective when ``criteria`` is
+        `CompressCriteria.fixed` or `CompressCriteria.both`. Default is ``False``.
+
+    contract_algo : str, optional
+        The default algorithm of `renormalizer.mps.Mpo.contract` to compress ``mpo @ mps``.
+        Possible values are ``svd``, ``variational``, ``zipup`` and ``density_matrix``.
+        The last two algorithms do not form the full product and save the memory.
+        Default is ``svd``.
+
     See Also
     --------
     CompressCriteria : Compression criteria
@@ -152,7 +177,11 @@ class CompressConfig:
         dump_matrix_size = np.inf,
         dump_matrix_dir = "./",
         ofs: OFS = None,
-        ofs_swap_jw: bool = False
+        ofs_swap_jw: bool = False,
+        environ_memory_limit = None,
+        dump_matrix_prefetch: int = 2,
+        contract_algo: str = "svd",
+        randomized_svd: bool = False,
     ):
         # two sets of criteria here: threshold and max_bonddimension
         # `criteria` is to determine which to use
@@ -183,9 +212,13 @@ class CompressConfig:
 
         self.dump_matrix_size = dump_matrix_size
         self.dump_matrix_dir = dump_matrix_dir
+        self.dump_matrix_prefetch = dump_matrix_prefetch
+        self.environ_memory_limit = environ_memory_limit
 
         self.ofs: OFS = ofs
         self.ofs_swap_jw: bool = ofs_swap_jw
+        self.contract_algo: str = contract_algo
+        self.randomized_svd: bool = randomized_svd
 
     @property
     def threshold(self):
@@ -222,10 +255,12 @@ class CompressConfig:
             assert not (self.max_dims == 0).any()
         self.min_dims = np.full(length, self.bond_dim_min_value, dtype=int)
 
-    def _threshold_m_trunc(self, sigma: np.ndarray) -> int:
+    def _threshold_m_trunc(self, sigma: np.ndarray, sigma_norm: float = None) -> int:
         assert 0 < self.threshold < 1
+        if sigma_norm is None:
+            sigma_norm = scipy.linalg.norm(sigma)
         # count how many sing vals < trunc
-        normed_sigma = sigma / scipy.linalg.norm(sigma)
+        normed_sigma = sigma / sigma_norm
         return int(np.sum(normed_sigma > self.threshold))
 
     def _fixed_m_trunc(self, sigma: np.ndarray, idx: int, left: bool) -> int:
@@ -233,15 +268,28 @@ class CompressConfig:
         bond_idx = idx + 1 if left else idx
         return min(self.max_dims[bond_idx], len(sigma))
 
-    def compute_m_trunc(self, sigma: np.ndarray, idx: int, left: bool) -> int:
+    def max_m_trunc(self, idx: int, left: bool):
+        """
+        The upper bound of the number of the retained singular values. ``None`` if unknown.
+        """
+        if self.criteria is CompressCriteria.threshold:
+            return None
+        if self.bonddim_should_set:
+            return None
+        bond_idx = idx + 1 if left else idx
+        return int(self.max_dims[bond_idx])
+
+    def compute_m_trunc(self, sigma: np.ndarray, idx: int, left: bool, sigma_norm: float = None) -> int:
+        # ``sigma_norm`` is the norm of all of the singular values
+        # in case only the largest singular values are in ``sigma``
         if self.criteria is CompressCriteria.threshold:
-            trunc = self._threshold_m_trunc(sigma)
+            trunc = self._threshold_m_trunc(sigma, sigma_norm)
         elif self.criteria is CompressCriteria.fixed:
             trunc = self._fixed_m_trunc(sigma, idx, left)
         elif self.criteria is CompressCriteria.both:
             # use the smaller one
             trunc = min(
-                self._threshold_m_trunc(sigma), self._fixed_m_trunc(sigma, idx, left)
+                self._threshold_m_trunc(sigma, sigma_norm), self._fixed_m_trunc(sigma, idx, left)
             )
         else:
             assert False
@@ -308,6 +356,11 @@ class OptimizeConfig:
         CompressCriteria.fixed with the int as the max_bonddim.
         The second element is the percent to choose the renormalied basis from
         each symmetry block to avoid trapping into local minimum.
+        The optional third element is the precision of the sweep, ``"fp64"`` (default)
+        or ``"fp32"``. In the ``"fp32"`` sweeps the site tensors, the MPO and the environments are
+        stored in single precision, which halves the memory and the memory bandwidth.
+        The energy convergence is only checked with the ``"fp64"`` sweeps,
+        e.g., ``[[10, 0.4, "fp32"], [20, 0.2, "fp32"], [30, 0, "fp64"], [30, 0, "fp64"]]``.
     """
 
     def __init__(self, procedure=None):
@@ -327,6 +380,12 @@ class OptimizeConfig:
         # inverse = 1.0 or -1.0
         # -1.0 to get the largest eigenvalue
         self.inverse = 1.0
+        # the mixing factor of the subspace expansion (DMRG3S) for the 1site method.
+        # The bond dimension grows adaptively at the one-site cost in the sweeps with nonzero percent.
+        # The perturbation P P^\dagger added to the reduced density matrix is normalized to trace alpha,
+        # rather than alpha times the unnormalized P P^\dagger, so alpha does not depend on the scale of H.
+        # 0 to disable. 1e-4 ~ 1e-2 are typical values
+        self.expansion_alpha = 0
 
     def copy(self):
         new = self.__class__.__new__(self.__class__)
@@ -344,10 +403,14 @@ class EvolveMethod(Enum):
     prop_and_compress_tdrk4 = "P&C TD RK4"
     # propagation and compression with RK propagator and time dependent/independent H
     prop_and_compress_tdrk = "P&C TD RK"
+    # global Krylov subspace propagator and time independent H
+    krylov = "Global Krylov"
     # TDVP with projector splitting - one site
     tdvp_ps = "TDVP PS one-site"
     # TDVP with projector splitting - two site
     tdvp_ps2 = "TDVP PS two-site"
+    # TDVP with projector splitting - one site with controlled bond expansion
+    tdvp_ps_cbe = "TDVP PS one-site CBE"
     # TDVP with variable mean field (VMF)
     tdvp_vmf = "TDVP Variable Mean Field"
     # TDVP with constant mean field (CMF) and matrix unfolding (MU) regularization
@@ -416,12 +479,26 @@ class EvolveConfig:
         self.force_ovlp: bool = force_ovlp
         # auto switch between mu_vmf and vmf for a higher efficiency
         self.vmf_auto_switch: bool = True
+        # number of threads to calculate the time derivatives of the sites/nodes in the VMF methods.
+        # the BLAS threads should be reduced accordingly to avoid oversubscription
+        self.vmf_workers: int = 1
+        # precision of the local Krylov steps in the TDVP-PS methods, "fp64" or "fp32".
+        # With "fp32" the site tensors, the MPO and the environments are in single precision during
+        # the step and the evolved MPS is promoted to double precision after each step
+        self.precision: str = "fp64"
+        # the global Krylov method. The maximum size of the Krylov basis,
+        # the relative tolerance of the propagated state between successive basis sizes
+        # and the algorithm of ``Mpo.contract`` to build the basis
+        self.krylov_max_basis: int = 20
+        self.krylov_rtol: float = 1e-8
+        self.krylov_contract_algo: str = "variational"
 
     @property
     def is_tdvp(self):
         return self.method not in [EvolveMethod.prop_and_compress,
                 EvolveMethod.prop_and_compress_tdrk4,
-                EvolveMethod.prop_and_compress_tdrk]
+                EvolveMethod.prop_and_compress_tdrk,
+                EvolveMethod.krylov]
 
     def check_valid_dt(self, evolve_dt: complex):
         info_str = f"in config: {self.guess_dt}, in arg: {evolve_dt}"
@@ -3,19 +3,80 @@
 #         Weitang Li <liwt31@163.com>
 
 
+import copy
 import json
 import os
 import logging
+import pickle
+import queue
+import signal
+import threading
 from datetime import datetime
 
 import numpy as np
 
 # this file shouldn't import anything from the `mps` module. IOW it's mps agnostic
 from renormalizer.utils.configs import EvolveConfig
+from renormalizer.utils.trajectory import TrajectoryStore, atomic_save
 
 logger = logging.getLogger(__name__)
 
 
+class BackgroundWriter:
+    r"""
+    Carry out dumping tasks sequentially in a background thread.
+    Writing files with NumPy releases the GIL, so the evolution continues during dumping.
+
+    Parameters
+    ----------
+    max_queue_size : int
+        The maximum number of pending tasks. :meth:`submit` blocks when the queue is full,
+        which bounds the memory consumed by the snapshots waiting to be dumped.
+    """
+
+    def __init__(self, max_queue_size: int = 1):
+        self.queue = queue.Queue(max_queue_size)
+        self.thread = threading.Thread(target=self._run, name="renormalizer-dump", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None:
+                    return
+                func, args = task
+                try:
+                    func(*args)
+                except Exception:  # never quit calculation because of dumping
+                    logger.exception("background dumping failed")
+            finally:
+                self.queue.task_done()
+
+    def submit(self, func, *args):
+        if not self.thread.is_alive():
+            raise RuntimeError("The background writer is closed")
+        self.queue.put((func, args))
+
+    def flush(self):
+        """
+        Wait until all submitted tasks are done.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Finish all submitted tasks and stop the thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(f"Received signal {signum}")
+
+
 class TdMpsJob(object):
     def __init__(self, evolve_config: EvolveConfig = None, dump_mps: str=None, dump_dir: str=None, job_name: str=None):
         logger.info(f"Creating TDMPS job. dump_dir: {dump_dir}. job_name: {job_name}")
@@ -37,6 +98,19 @@ class TdMpsJob(object):
             raise ValueError(f"dump_mps should be None, 'all', 'one'. Got {dump_mps}")
 
         self._dump_mps = None
+        # format of the dumped properties, "npz": rewrite the whole dict to a npz file after every step,
+        # "trajectory": append the new rows of the time series to a chunked trajectory directory.
+        # See `renormalizer.utils.trajectory`
+        self.dump_format = "npz"
+        self._trajectory_store = None
+        # dump in a background thread. The properties and the mps are copied
+        # and the evolution continues while the snapshot is written
+        self.async_dump = False
+        # maximum number of snapshots waiting to be dumped
+        self.async_dump_queue_size = 1
+        self._writer = None
+        # dump the state of the job every x steps to resume the evolution. See `load_checkpoint`
+        self.checkpoint_interval = None
         self.dump_dir = dump_dir
         self.job_name = job_name
         mps = self.init_mps()
@@ -111,50 +185,60 @@ class TdMpsJob(object):
 
         wall_times = [datetime.now()]
 
-        for i in range(nsteps):
+        self._start_background_writer()
+        try:
+            for i in range(nsteps):
 
-            if self.stop_evolve_criteria():
-                logger.info(
-                    "Criteria to stop the evolution has met. Stop the evolution"
-                )
-                break
+                if self.stop_evolve_criteria():
+                    logger.info(
+                        "Criteria to stop the evolution has met. Stop the evolution"
+                    )
+                    break
 
-            step_str = "step {}/{}, at time {}/{}".format(
-                len(self.evolve_times), target_steps, self.latest_evolve_time, target_time
-            )
-            logger.info("{} begin.".format(step_str))
+                step_str = "step {}/{}, at time {}/{}".format(
+                    len(self.evolve_times), target_steps, self.latest_evolve_time, target_time
+                )
+                logger.info("{} begin.".format(step_str))
             
-            # evolve
-            new_mps = self.evolve_single_step(evolve_dt)
+                # evolve
+                new_mps = self.evolve_single_step(evolve_dt)
             
-            # process
-            self.evolve_times.append(self.latest_evolve_time + evolve_dt)
-            self.process_mps(new_mps)
-            self.latest_mps = new_mps
+                # process
+                self.evolve_times.append(self.latest_evolve_time + evolve_dt)
+                self.process_mps(new_mps)
+                self.latest_mps = new_mps
             
-            # wall time
-            evolution_wall_time = datetime.now()
-            time_cost = evolution_wall_time - wall_times[-1]
-            wall_times.append(evolution_wall_time)
+                # wall time
+                evolution_wall_time = datetime.now()
+                time_cost = evolution_wall_time - wall_times[-1]
+                wall_times.append(evolution_wall_time)
             
-            # output information
-            if self.info_interval is not None and i % self.info_interval == 0:
-                mps_abstract = str(new_mps)
-                self._dump_mps = self.dump_mps
-            else:
-                mps_abstract = ""
-                self._dump_mps = None
+                # output information
+                if self.info_interval is not None and i % self.info_interval == 0:
+                    mps_abstract = str(new_mps)
+                    self._dump_mps = self.dump_mps
+                else:
+                    mps_abstract = ""
+                    self._dump_mps = None
             
-            logger.info(f"step {len(self.evolve_times)-1} complete, time cost {time_cost}. {mps_abstract}")
+                logger.info(f"step {len(self.evolve_times)-1} complete, time cost {time_cost}. {mps_abstract}")
             
-            # dump
-            if self._defined_output_path:
-                try:
-                    self.dump_dict()
-                except IOError:  # never quit calculation because of IOError
-                    logger.exception("dumping dict failed with IOError")
-                dump_wall_time = datetime.now()
-                logger.info(f"Dumping time cost {dump_wall_time - evolution_wall_time}")
+                # dump
+                if self._defined_output_path:
+                    try:
+                        self.dump_dict()
+                    except IOError:  # never quit calculation because of IOError
+                        logger.exception("dumping dict failed with IOError")
+                    if self.checkpoint_interval is not None \
+                            and (len(self.evolve_times) - 1) % self.checkpoint_interval == 0:
+                        try:
+                            self.dump_checkpoint()
+                        except IOError:
+                            logger.exception("dumping checkpoint failed with IOError")
+                    dump_wall_time = datetime.now()
+                    logger.info(f"Dumping time cost {dump_wall_time - evolution_wall_time}")
+        finally:
+            self._stop_background_writer()
 
         logger.info(f"{len(wall_times)-1} steps of evolution complete!")
         logger.info(
@@ -183,6 +267,118 @@ class TdMpsJob(object):
             raise ValueError("Dump dir or job name not set")
         d = self.get_dump_dict()
         os.makedirs(self.dump_dir, exist_ok=True)
+
+        # dump_mps
+        if self._dump_mps is None:
+            mps_path = None
+        elif self._dump_mps == "all":
+            mps_path = os.path.join(self.dump_dir,
+                    self.job_name+"_mps_"+str(len(self.evolve_times)-1) + ".npz")
+        else:
+            mps_path = os.path.join(self.dump_dir,
+                    self.job_name+"_mps" + ".npz")
+
+        nrows = len(self.evolve_times)
+        if self._writer is None:
+            self._dump_properties(d, nrows)
+            if mps_path is not None:
+                self.latest_mps.dump(mps_path)
+        else:
+            # snapshot. The lists of the time series are appended in the following steps
+            d = {k: copy.copy(v) for k, v in d.items()}
+            self._writer.submit(self._dump_properties, d, nrows)
+            if mps_path is not None:
+                self._writer.submit(self.latest_mps.copy().dump, mps_path)
+
+    def _dump_properties(self, d, nrows):
+        if self.dump_format == "npz":
+            self._dump_npz(d)
+        elif self.dump_format == "trajectory":
+            if self._trajectory_store is None:
+                self._trajectory_store = TrajectoryStore(self.trajectory_path)
+            self._trajectory_store.append(d, nrows)
+        else:
+            raise ValueError(f"dump_format should be 'npz' or 'trajectory'. Got {self.dump_format}")
+
+    def dump_checkpoint(self):
+        r"""
+        Dump the full state of the job, including ``evolve_times``, the calculated properties,
+        ``evolve_config`` and the latest mps, to :attr:`checkpoint_path`.
+        The evolution can be resumed by :meth:`load_checkpoint`.
+        """
+        if not self._defined_output_path:
+            raise ValueError("Dump dir or job name not set")
+        os.makedirs(self.dump_dir, exist_ok=True)
+        # serialize in the current thread to obtain a snapshot
+        data = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._writer is None:
+            atomic_save(self.checkpoint_path, lambda f: f.write(data))
+        else:
+            self._writer.submit(atomic_save, self.checkpoint_path, lambda f: f.write(data))
+
+    @classmethod
+    def load_checkpoint(cls, fname: str):
+        r"""
+        Load a job dumped by :meth:`dump_checkpoint`.
+        Call :meth:`evolve` on the returned job to continue the evolution, for example::
+
+            job = ChargeDiffusionDynamics.load_checkpoint("dump/job_checkpoint.pkl")
+            job.evolve(evolve_dt, nsteps - (len(job.evolve_times) - 1))
+
+        The trajectory and the npz file are dumped to the same ``dump_dir`` and ``job_name`` as before.
+        If the checkpoint is older than the trajectory, the extra steps in the trajectory are discarded.
+
+        Parameters
+        ----------
+        fname : str
+            The path of the checkpoint.
+
+        Returns
+        -------
+        job : TdMpsJob
+            The restored job.
+        """
+        with open(fname, "rb") as f:
+            job = pickle.load(f)
+        if not isinstance(job, cls):
+            raise TypeError(f"The checkpoint is a {job.__class__}, not {cls}")
+        logger.info(f"Resuming {job.__class__.__name__} from step {len(job.evolve_times) - 1}, "
+                    f"at time {job.latest_evolve_time}")
+        if job.dump_format == "trajectory" and job._defined_output_path \
+                and os.path.exists(job.trajectory_path):
+            # discard the steps after the checkpoint, otherwise a series with as many rows
+            # as committed would not be rewritten
+            job._trajectory_store = TrajectoryStore(job.trajectory_path)
+            job._trajectory_store.truncate(len(job.evolve_times))
+        return job
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # runtime objects that are not part of the state of the job
+        state["_writer"] = None
+        state["_trajectory_store"] = None
+        return state
+
+    def _start_background_writer(self):
+        if not (self.async_dump and self._defined_output_path):
+            return
+        self._writer = BackgroundWriter(self.async_dump_queue_size)
+        # make sure the pending snapshots are flushed when the job is terminated
+        self._sigterm_handled = threading.current_thread() is threading.main_thread() \
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+        if self._sigterm_handled:
+            signal.signal(signal.SIGTERM, _raise_system_exit)
+
+    def _stop_background_writer(self):
+        if self._writer is None:
+            return
+        logger.info("Waiting for the background dumping to finish")
+        self._writer.close()
+        self._writer = None
+        if self._sigterm_handled:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    def _dump_npz(self, d):
         file_path = os.path.join(self.dump_dir, self.job_name + ".npz")
         bak_path = file_path + ".bak"
         if os.path.exists(file_path):
@@ -196,16 +392,6 @@ class TdMpsJob(object):
         if os.path.exists(bak_path):
             os.remove(bak_path)
 
-        # dump_mps
-        if self._dump_mps is not None:
-            if self._dump_mps == "all":
-                mps_path = os.path.join(self.dump_dir,
-                        self.job_name+"_mps_"+str(len(self.evolve_times)-1) + ".npz")
-            else:
-                mps_path = os.path.join(self.dump_dir,
-                        self.job_name+"_mps" + ".npz")
-            self.latest_mps.dump(mps_path)
-            
 
     def stop_evolve_criteria(self):
         return False
@@ -218,6 +404,14 @@ class TdMpsJob(object):
     def evolve_times_array(self):
         return np.array(self.evolve_times)
 
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.dump_dir, self.job_name + "_checkpoint.pkl")
+
+    @property
+    def trajectory_path(self):
+        return os.path.join(self.dump_dir, self.job_name + "_traj")
+
     @property
     def _defined_output_path(self):
         return self.dump_dir is not None and self.job_name is not None
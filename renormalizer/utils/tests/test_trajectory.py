@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from renormalizer.utils import TdMpsJob
+from renormalizer.utils.trajectory import TrajectoryStore, load_trajectory
+
+
+class DummyJob(TdMpsJob):
+
+    def init_mps(self):
+        self.occupations = []
+        return np.ones(3)
+
+    def process_mps(self, mps):
+        self.occupations.append(mps * len(self.evolve_times))
+
+    def evolve_single_step(self, evolve_dt):
+        return self.latest_mps + evolve_dt
+
+    def get_dump_dict(self):
+        dump_dict = dict()
+        dump_dict["info"] = {"name": "dummy"}
+        dump_dict["total time"] = self.evolve_times[-1]
+        dump_dict["occupations"] = self.occupations
+        dump_dict["time series"] = self.evolve_times
+        return dump_dict
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 1000))
+def test_trajectory_store(tmpdir, chunk_size):
+    path = os.path.join(tmpdir, "traj")
+    store = TrajectoryStore(path, chunk_size)
+    rows = []
+    for i in range(10):
+        rows.append(np.full((2, 2), i, dtype=complex))
+        store.append({"rows": rows, "n": i, "times": list(range(i+1))}, i + 1)
+        assert store.nrows("rows") == i + 1
+        d = load_trajectory(path)
+        assert d["n"] == i
+        np.testing.assert_allclose(d["rows"], rows)
+        np.testing.assert_allclose(d["times"], np.arange(i+1))
+    # at most `chunk_size` rows in a chunk
+    assert max(store.index["series"]["rows"]["chunks"]) <= chunk_size
+    # truncate in the middle of a chunk
+    store.truncate(8)
+    assert store.nrows("rows") == 8
+    np.testing.assert_allclose(load_trajectory(path)["rows"], rows[:8])
+    store.append({"rows": rows, "n": 9, "times": list(range(10))}, 10)
+    np.testing.assert_allclose(load_trajectory(path)["rows"], rows)
+    # reopen and restart from an earlier step
+    store = TrajectoryStore(path, chunk_size)
+    assert store.nrows("rows") == 10
+    store.append({"rows": rows[:5], "n": 4, "times": list(range(5))}, 5)
+    np.testing.assert_allclose(load_trajectory(path, mmap=False)["rows"], rows[:5])
+
+
+def test_trajectory_uncommitted(tmpdir):
+    path = os.path.join(tmpdir, "traj")
+    store = TrajectoryStore(path, 4)
+    store.append({"rows": np.arange(6)}, 6)
+    # simulate a job killed after the last chunk is rewritten but before the index is committed
+    np.save(os.path.join(path, "0.1.npy"), np.arange(4, 9))
+    np.save(os.path.join(path, "0.2.npy"), np.arange(9, 10))
+    np.testing.assert_allclose(load_trajectory(path)["rows"], np.arange(6))
+
+
+def test_dump_format(tmpdir):
+    job_npz = DummyJob(dump_dir=tmpdir, job_name="npz")
+    job_npz.evolve(0.1, 5)
+    job_traj = DummyJob(dump_dir=tmpdir, job_name="traj")
+    job_traj.dump_format = "trajectory"
+    job_traj.evolve(0.1, 5)
+    d_npz = np.load(os.path.join(tmpdir, "npz.npz"), allow_pickle=True)
+    d_traj = load_trajectory(job_traj.trajectory_path)
+    assert set(d_npz.keys()) == set(d_traj.keys())
+    assert d_traj["info"] == {"name": "dummy"}
+    assert isinstance(d_traj["occupations"], np.memmap)
+    for key in ["total time", "occupations", "time series"]:
+        np.testing.assert_allclose(d_npz[key], d_traj[key])
+
+
+@pytest.mark.parametrize("dump_format", ("npz", "trajectory"))
+def test_async_dump(tmpdir, dump_format):
+    jobs = []
+    for async_dump in [False, True]:
+        job = DummyJob(dump_mps="all", dump_dir=tmpdir, job_name=f"{dump_format}_{async_dump}")
+        job.dump_format = dump_format
+        job.async_dump = async_dump
+        job.evolve(0.1, 5)
+        assert job._writer is None
+        jobs.append(job)
+    for i in range(1, 6):
+        mps_paths = [os.path.join(tmpdir, f"{job.job_name}_mps_{i}.npz") for job in jobs]
+        np.testing.assert_allclose(*[np.load(path, allow_pickle=True) for path in mps_paths])
+    if dump_format == "npz":
+        d_sync, d_async = [np.load(os.path.join(tmpdir, f"{job.job_name}.npz"), allow_pickle=True) for job in jobs]
+    else:
+        d_sync, d_async = [load_trajectory(job.trajectory_path) for job in jobs]
+    for key in ["total time", "occupations", "time series"]:
+        np.testing.assert_allclose(d_sync[key], d_async[key])
+
+
+@pytest.mark.parametrize("dump_format", ("npz", "trajectory"))
+# the checkpoint is one or two steps behind the trajectory
+@pytest.mark.parametrize("nsteps", (5, 6))
+def test_checkpoint(tmpdir, dump_format, nsteps):
+    # a different time step after resuming, so that the stale steps are distinguishable
+    job_std = DummyJob()
+    job_std.evolve(0.1, 4)
+    job_std.evolve(0.2, 6)
+
+    job = DummyJob(dump_dir=tmpdir, job_name="job")
+    job.dump_format = dump_format
+    job.checkpoint_interval = 4
+    job.evolve(0.1, nsteps)
+    # resume from step 4. The following steps are evolved again
+    job = DummyJob.load_checkpoint(job.checkpoint_path)
+    assert len(job.evolve_times) == 5
+    assert job.dump_format == dump_format
+    if dump_format == "trajectory":
+        assert len(load_trajectory(job.trajectory_path)["occupations"]) == 5
+    job.evolve(0.2, 6)
+    np.testing.assert_allclose(job.evolve_times, job_std.evolve_times)
+    np.testing.assert_allclose(job.latest_mps, job_std.latest_mps)
+    if dump_format == "npz":
+        d = np.load(os.path.join(tmpdir, "job.npz"), allow_pickle=True)
+    else:
+        d = load_trajectory(job.trajectory_path)
+    np.testing.assert_allclose(d["occupations"], job_std.occupations)
+    np.testing.assert_allclose(d["time series"], job_std.evolve_times)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""
+Append-only on-disk storage of the properties calculated along a time evolution.
+
+A trajectory is a directory with the following layout::
+
+    index.json        # the committed state of the store
+    static.npz        # entries that are not time series, rewritten at every commit
+    0.0.npy           # chunk 0 of series 0
+    0.1.npy           # chunk 1 of series 0
+    1.0.npy           # chunk 0 of series 1
+    ...
+
+Each series is split into chunks of at most ``chunk_size`` rows. Only the last
+(partially filled) chunk is rewritten when new rows are appended,
+so the cost of a commit does not grow with the length of the trajectory.
+The files are always written to a temporary path and then atomically renamed,
+and ``index.json`` is replaced last. Therefore the index always refers to
+complete chunk files, and a crash during a commit leaves the previous commit readable.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+STATIC_NAME = "static.npz"
+
+
+def atomic_save(path, save_func):
+    """
+    Write a file by ``save_func(f)`` to a temporary path and then rename it to ``path``,
+    so that ``path`` is either the old file or the complete new file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        save_func(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _is_series(value, nrows) -> bool:
+    if isinstance(value, (str, bytes, dict)) or np.ndim(value) == 0:
+        return False
+    try:
+        return len(value) == nrows
+    except TypeError:
+        return False
+
+
+class TrajectoryStore:
+    r"""
+    Append-only, chunked store of a trajectory.
+    See the module docstring for the on-disk format.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the trajectory. If an index already exists in the directory,
+        new rows are appended to the stored series.
+    chunk_size : int
+        The maximum number of rows in a chunk file.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1000):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size should be positive. Got {chunk_size}")
+        self.path = path
+        self.chunk_size = chunk_size
+        index_path = os.path.join(path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+            if self.index["chunk_size"] != chunk_size:
+                logger.info(f"Using the chunk size of the existing trajectory: {self.index['chunk_size']}")
+                self.chunk_size = self.index["chunk_size"]
+        else:
+            self.index = {"chunk_size": chunk_size, "series": {}, "static": []}
+
+    def _chunk_path(self, series_id, chunk_id):
+        return os.path.join(self.path, f"{series_id}.{chunk_id}.npy")
+
+    def nrows(self, key) -> int:
+        """
+        Number of committed rows of the series ``key``.
+        """
+        if key not in self.index["series"]:
+            return 0
+        return sum(self.index["series"][key]["chunks"])
+
+    def append(self, d: Dict, nrows: int):
+        r"""
+        Commit the dict ``d`` to the store.
+        Entries with ``nrows`` rows (usually the number of time steps) are stored as series
+        and only the rows that have not been committed are written.
+        If a series has fewer rows than committed, for example when a job is restarted
+        from an earlier step, the series is truncated.
+        The other entries are stored in ``static.npz``.
+
+        Parameters
+        ----------
+        d : dict
+            The dict to dump, typically obtained from :meth:`TdMpsJob.get_dump_dict`.
+        nrows : int
+            The number of rows of a series.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        series = self.index["series"]
+        static = {}
+        for key, value in d.items():
+            if key not in series and not _is_series(value, nrows):
+                static[key] = value
+                continue
+            committed = self.nrows(key)
+            if len(value) == committed:
+                continue
+            if key not in series:
+                series[key] = {"id": len(series), "chunks": []}
+            if len(value) < committed:
+                # restarted from an earlier step
+                logger.warning(f"Series {key} has {len(value)} rows, "
+                               f"less than the {committed} committed rows. Truncating the series.")
+                self._truncate(series[key], len(value))
+            self._append_rows(series[key], value)
+
+        atomic_save(os.path.join(self.path, STATIC_NAME), lambda f: np.savez(f, **static))
+        self.index["static"] = list(static.keys())
+        self._commit_index()
+
+    def truncate(self, nrows: int):
+        r"""
+        Truncate all series to at most ``nrows`` rows and commit the index.
+        Used when a job is resumed from a checkpoint that is older than the trajectory,
+        so that the rows after the checkpoint are rewritten by the following :meth:`append`.
+
+        Parameters
+        ----------
+        nrows : int
+            The number of rows to keep.
+        """
+        for key, entry in self.index["series"].items():
+            if nrows < self.nrows(key):
+                logger.info(f"Truncating series {key} from {self.nrows(key)} rows to {nrows} rows")
+                self._truncate(entry, nrows)
+        if os.path.exists(os.path.join(self.path, INDEX_NAME)):
+            self._commit_index()
+
+    def _commit_index(self):
+        index_str = json.dumps(self.index)
+        atomic_save(os.path.join(self.path, INDEX_NAME), lambda f: f.write(index_str.encode()))
+
+    def _truncate(self, entry, nrows):
+        chunks = entry["chunks"]
+        while chunks and sum(chunks) > nrows:
+            chunks.pop()
+        # keep the leading rows of the last chunk. The extra rows in the file are not committed
+        if sum(chunks) < nrows:
+            chunks.append(nrows - sum(chunks))
+
+    def _append_rows(self, entry, value: Sequence):
+        chunks = entry["chunks"]
+        # the last chunk is not full. Rewrite it with the new rows
+        if chunks and chunks[-1] < self.chunk_size:
+            chunks.pop()
+        start = sum(chunks)
+        while start < len(value):
+            rows = np.asarray(value[start:start+self.chunk_size])
+            if rows.dtype == object:
+                raise ValueError(f"Rows with dtype object can't be stored as a series. Got {rows}")
+            chunk_path = self._chunk_path(entry["id"], len(chunks))
+            atomic_save(chunk_path, lambda f: np.save(f, rows))
+            chunks.append(len(rows))
+            start += len(rows)
+
+    def load(self, mmap: bool = True) -> Dict:
+        """
+        Load the committed trajectory.
+        See :func:`load_trajectory`.
+        """
+        return load_trajectory(self.path, mmap)
+
+
+def load_trajectory(path: str, mmap: bool = True) -> Dict:
+    r"""
+    Load a trajectory dumped by :class:`TrajectoryStore`.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the trajectory.
+    mmap : bool
+        Whether to memory-map the chunk files. If a series consists of only one chunk,
+        the returned array is a read-only memory-mapped array.
+        Otherwise, the chunks are concatenated in memory.
+
+    Returns
+    -------
+    d : dict
+        The committed entries. Series are ``np.ndarray`` with the rows stacked along the first axis.
+    """
+    with open(os.path.join(path, INDEX_NAME)) as f:
+        index = json.load(f)
+    mmap_mode = "r" if mmap else None
+    d = {}
+    with np.load(os.path.join(path, STATIC_NAME), allow_pickle=True) as static:
+        for key in index["static"]:
+            if key not in static:
+                # killed between the commit of static.npz and index.json
+                continue
+            value = static[key]
+            # restore python objects pickled by `np.savez`
+            if value.dtype == object and value.ndim == 0:
+                value = value.item()
+            d[key] = value
+    for key, entry in index["series"].items():
+        arrays = []
+        for chunk_id, nrows in enumerate(entry["chunks"]):
+            array = np.load(os.path.join(path, f"{entry['id']}.{chunk_id}.npy"), mmap_mode=mmap_mode)
+            # the file may contain more rows than committed if the job is killed during a commit
+            arrays.append(array[:nrows])
+        if len(arrays) == 1:
+            d[key] = arrays[0]
+        else:
+            d[key] = np.concatenate(arrays)
+    return d
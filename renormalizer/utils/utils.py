@@ -5,6 +5,8 @@
 useful utilities
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 
@@ -43,3 +45,22 @@ def calc_vn_entropy(p):
     assert np.allclose(p.sum(), 1)
     p = p[0 < p]
     return - (p* np.log(p)).sum()
+
+
+# workers -> ThreadPoolExecutor. Reused by `thread_map` to avoid creating threads on every call.
+_thread_pools = {}
+
+
+def thread_map(func, iterable, workers: int = 1) -> list:
+    """
+    ``list(map(func, iterable))`` with a thread pool of ``workers`` threads.
+    Suitable for the tasks dominated by NumPy/BLAS routines that release the GIL.
+    The tasks are carried out serially if ``workers`` is 1.
+    ``func`` should not call ``thread_map`` with the same number of workers.
+    """
+    if workers <= 1:
+        return list(map(func, iterable))
+    pool = _thread_pools.get(workers)
+    if pool is None:
+        pool = _thread_pools[workers] = ThreadPoolExecutor(max_workers=workers)
+    return list(pool.map(func, iterable))